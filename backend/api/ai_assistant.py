@@ -3,17 +3,28 @@ AI 智能助手 API 端點 v2.7
 增強的 API 端點支援批量處理、翻譯、進階優化等功能
 """
 
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
 from functools import wraps
 import logging
 import asyncio
 import json
+import os
+import tempfile
 from typing import Dict, List
 
 # 導入服務
 from services.ai_assistant import AIAssistantService
-from services.batch_processor import BatchProcessor
+from services.batch_processor import BatchProcessor, ExecutionLane, InvalidTaskError
+from services.batch_journal import BatchJournal
+from services.batch_events import BatchEventBroker, BATCH_EVENTS_CHANNEL
+from services.cache_service import cache_service, RedisInvalidationBus
+from services.batch_ingest import detect_format, IngestError
+from services.deadline_scheduling import InvalidDeadlineError, parse_deadline
+from services.batch_budget import BudgetManager
+from services.result_store import ResultStore
+from services.image_utils import post_process_image
 from models.user import user_model
+from models.api_key_manager import api_key_manager
 from services.database import DatabaseService
 
 # 錯誤處理增強
@@ -39,9 +50,42 @@ ai_assistant_bp = Blueprint('ai_assistant', __name__)
 
 # 初始化服務
 ai_assistant_service = AIAssistantService()
-batch_processor = BatchProcessor(max_workers=5, max_concurrent_jobs=3)
+batch_processor = BatchProcessor(
+    max_workers=5, max_concurrent_jobs=3, journal=BatchJournal(),
+    budget_manager=BudgetManager(
+        cost_history=api_key_manager.get_average_request_cost,
+        spend_history=api_key_manager.get_user_spend
+    ),
+    result_store=ResultStore()
+)
 db_service = DatabaseService()
 
+# 批量任務處理器
+async def prompt_optimization_processor(task_data):
+    return await ai_assistant_service.enhance_prompt(
+        task_data.get('prompt', ''),
+        task_data.get('style'),
+        task_data.get('target_language', 'en'),
+        task_data.get('complexity', 'moderate')
+    )
+
+batch_processor.register_task_processor('prompt_optimization', prompt_optimization_processor)
+# CPU 密集的圖片後處理在進程池中執行，以檔案路徑傳遞圖片
+batch_processor.register_task_processor('image_post_processing', post_process_image, lane=ExecutionLane.PROCESS)
+
+# 批量事件廣播（SSE）；Redis 可用時經 pub/sub 交換各工作進程的事件，
+# 否則每個進程的事件流只包含本進程執行的作業
+batch_event_broker = BatchEventBroker()
+batch_event_broker.attach(batch_processor)
+if cache_service.l2_available:
+    batch_event_broker.attach_relay(
+        RedisInvalidationBus(cache_service.redis_cache.redis_client, channel=BATCH_EVENTS_CHANNEL)
+    )
+
+# 處理器註冊後再從日誌恢復中斷的批量作業（多個工作進程共用日誌時，
+# 只恢復沒有租約或租約已過期的作業，其他存活進程正在執行的作業不會重複執行）
+batch_processor.recover_from_journal()
+
 def login_required(f):
     """登入驗證裝飾器 (開發模式兼容)"""
     @wraps(f)
@@ -535,6 +579,15 @@ def create_batch_job():
         concurrent_limit = data.get('concurrent_limit', 3)
         auto_retry_failed = data.get('auto_retry_failed', True)
         pause_on_error = data.get('pause_on_error', False)
+        deadline = data.get('deadline')
+        budget = data.get('budget')
+        
+        if budget is not None and (not isinstance(budget, (int, float)) or budget < 0):
+            return jsonify({
+                'success': False,
+                'error': '預算必須為非負數',
+                'error_code': 'INVALID_BUDGET'
+            }), 400
         
         if not tasks_data:
             return jsonify({
@@ -550,21 +603,12 @@ def create_batch_job():
                 'error_code': 'TOO_MANY_TASKS'
             }), 400
         
-        # 註冊任務處理器（如果尚未註冊）
-        if 'prompt_optimization' not in batch_processor.task_processors:
-            async def prompt_optimization_processor(task_data):
-                return await ai_assistant_service.enhance_prompt(
-                    task_data.get('prompt', ''),
-                    task_data.get('style'),
-                    task_data.get('target_language', 'en'),
-                    task_data.get('complexity', 'moderate')
-                )
-            
-            batch_processor.register_task_processor('prompt_optimization', prompt_optimization_processor)
-        
         # 創建批量作業
         job_id = batch_processor.create_job(
-            name, tasks_data, concurrent_limit, auto_retry_failed, pause_on_error
+            name, tasks_data, concurrent_limit, auto_retry_failed, pause_on_error,
+            deadline=deadline,
+            budget=budget,
+            user_id=request.current_user['id']
         )
         
         # 記錄用戶活動
@@ -584,6 +628,27 @@ def create_batch_job():
             'message': f'批量作業已創建，包含 {len(tasks_data)} 個任務'
         })
         
+    except InvalidDeadlineError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'error_code': 'INVALID_DEADLINE'
+        }), 400
+        
+    except InvalidTaskError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'error_code': 'INVALID_TASK'
+        }), 400
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': f'任務依賴無效: {str(e)}',
+            'error_code': 'INVALID_DEPENDENCIES'
+        }), 400
+        
     except Exception as e:
         logger.error(f"創建批量作業錯誤: {str(e)}")
         return jsonify({
@@ -592,6 +657,123 @@ def create_batch_job():
             'error_code': 'CREATE_JOB_ERROR'
         }), 500
 
+# 伺服器端串流匯入檔案所在目錄（只允許讀取此目錄下的檔案）
+BATCH_INGEST_DIR = os.getenv(
+    'BATCH_INGEST_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data', 'batch_ingest')
+)
+
+# 串流匯入的分塊大小與未結束任務窗口上限（超過時截斷為上限）
+MAX_INGEST_CHUNK_SIZE = 2000
+MAX_INGEST_WINDOW = 20000
+
+@ai_assistant_bp.route('/batch/ingest-job', methods=['POST'])
+@login_required
+def ingest_batch_job():
+    """
+    以串流方式從 JSONL/CSV 創建大型批量作業（上傳檔案或伺服器端路徑）
+    
+    chunk_size 最大 MAX_INGEST_CHUNK_SIZE，window 最大 MAX_INGEST_WINDOW，超過時截斷為上限
+    """
+    source_path = None
+    delete_source = False
+    try:
+        params = request.form if request.files else (request.get_json(silent=True) or {})
+        name = params.get('name', f"匯入作業_{request.current_user['username']}")
+        task_type = params.get('task_type', 'prompt_optimization')
+        concurrent_limit = int(params.get('concurrent_limit', 3))
+        chunk_size = min(int(params.get('chunk_size', 500)), MAX_INGEST_CHUNK_SIZE)
+        window = min(int(params.get('window', 5000)), MAX_INGEST_WINDOW)
+        auto_start = str(params.get('auto_start', 'true')).lower() == 'true'
+        # 在保存上傳檔案前驗證參數，避免留下暫存檔
+        deadline = parse_deadline(params.get('deadline'))
+        budget = float(params['budget']) if params.get('budget') not in (None, '') else None
+        
+        if budget is not None and budget < 0:
+            return jsonify({
+                'success': False,
+                'error': '預算必須為非負數',
+                'error_code': 'INVALID_BUDGET'
+            }), 400
+        
+        if 'file' in request.files:
+            upload = request.files['file']
+            fmt = detect_format(upload.filename, params.get('format'))
+            # 先以串流方式落盤，匯入結束後刪除
+            with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{fmt}') as temp_file:
+                upload.save(temp_file)
+                source_path = temp_file.name
+            delete_source = True
+        elif params.get('path'):
+            source_path = os.path.realpath(os.path.join(BATCH_INGEST_DIR, params['path']))
+            if os.path.commonpath([source_path, os.path.realpath(BATCH_INGEST_DIR)]) != os.path.realpath(BATCH_INGEST_DIR):
+                return jsonify({
+                    'success': False,
+                    'error': '匯入路徑必須位於匯入目錄內',
+                    'error_code': 'INVALID_INGEST_PATH'
+                }), 400
+            if not os.path.isfile(source_path):
+                return jsonify({
+                    'success': False,
+                    'error': f"匯入檔案不存在: {params['path']}",
+                    'error_code': 'INGEST_FILE_NOT_FOUND'
+                }), 404
+            fmt = detect_format(source_path, params.get('format'))
+            delete_source = False
+        else:
+            return jsonify({
+                'success': False,
+                'error': '請上傳檔案或提供伺服器端路徑',
+                'error_code': 'MISSING_SOURCE'
+            }), 400
+        
+        job_id = batch_processor.ingest_job(
+            name, source_path, fmt,
+            default_task_type=task_type,
+            concurrent_limit=concurrent_limit,
+            chunk_size=chunk_size,
+            window=window,
+            auto_start=auto_start,
+            delete_source=delete_source,
+            deadline=deadline,
+            budget=budget,
+            user_id=request.current_user['id']
+        )
+        # 匯入線程已接管暫存檔，由其在匯入結束後刪除
+        delete_source = False
+        
+        user_model.log_activity(
+            request.current_user['id'],
+            'batch_job_ingested',
+            {'job_id': job_id, 'format': fmt}
+        )
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'message': '串流匯入已開始，可透過作業狀態或事件流追蹤進度'
+        })
+        
+    except (IngestError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'error': f'匯入參數無效: {str(e)}',
+            'error_code': 'INVALID_INGEST_REQUEST'
+        }), 400
+        
+    except Exception as e:
+        logger.error(f"串流匯入作業錯誤: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'串流匯入作業失敗: {str(e)}',
+            'error_code': 'INGEST_JOB_ERROR'
+        }), 500
+    
+    finally:
+        # 匯入作業未能接管的上傳暫存檔
+        if delete_source and source_path and os.path.exists(source_path):
+            os.unlink(source_path)
+
 @ai_assistant_bp.route('/batch/jobs', methods=['GET'])
 @login_required
 def get_batch_jobs():
@@ -664,6 +846,36 @@ def get_batch_job_status(job_id):
             'error_code': 'JOB_STATUS_ERROR'
         }), 500
 
+@ai_assistant_bp.route('/batch/task-result/<task_id>', methods=['GET'])
+@login_required
+def get_batch_task_result(task_id):
+    """下載已完成任務的結果（寫入磁碟的大型結果以分塊串流返回）"""
+    try:
+        chunks = batch_processor.iter_task_result(task_id)
+    except KeyError:
+        return jsonify({
+            'success': False,
+            'error': f'任務不存在或尚未完成: {task_id}',
+            'error_code': 'TASK_RESULT_NOT_FOUND'
+        }), 404
+    
+    try:
+        # 先讀取首塊，使檔案已被清理等錯誤在回應開始前返回
+        first = next(chunks, b'')
+    except OSError as e:
+        logger.error(f"讀取任務結果錯誤: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'讀取任務結果失敗: {str(e)}',
+            'error_code': 'TASK_RESULT_ERROR'
+        }), 500
+    
+    def generate():
+        yield first
+        yield from chunks
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
 @ai_assistant_bp.route('/batch/pause-job/<job_id>', methods=['POST'])
 @login_required
 def pause_batch_job(job_id):
@@ -714,6 +926,70 @@ def resume_batch_job(job_id):
             'error_code': 'RESUME_JOB_ERROR'
         }), 500
 
+@ai_assistant_bp.route('/batch/job-budget/<job_id>', methods=['POST'])
+@login_required
+def set_batch_job_budget(job_id):
+    """調整批量作業預算（因預算暫停的作業調整後需再恢復）"""
+    try:
+        budget = (request.get_json(silent=True) or {}).get('budget')
+        if budget is not None and (not isinstance(budget, (int, float)) or budget < 0):
+            return jsonify({
+                'success': False,
+                'error': '預算必須為非負數',
+                'error_code': 'INVALID_BUDGET'
+            }), 400
+        
+        result = batch_processor.set_job_budget(job_id, budget)
+        
+        if result['success']:
+            user_model.log_activity(
+                request.current_user['id'],
+                'batch_job_budget_updated',
+                {'job_id': job_id, 'budget': budget}
+            )
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        logger.error(f"調整作業預算錯誤: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'調整作業預算失敗: {str(e)}',
+            'error_code': 'JOB_BUDGET_ERROR'
+        }), 500
+
+@ai_assistant_bp.route('/batch/budget', methods=['GET', 'POST'])
+@login_required
+def batch_user_budget():
+    """查看或設定當前用戶的批量作業預算（POST budget=null 取消限制）"""
+    try:
+        user_id = request.current_user['id']
+        budget_manager = batch_processor.budget
+        
+        if request.method == 'POST':
+            budget = (request.get_json(silent=True) or {}).get('budget')
+            if budget is not None and (not isinstance(budget, (int, float)) or budget < 0):
+                return jsonify({
+                    'success': False,
+                    'error': '預算必須為非負數',
+                    'error_code': 'INVALID_BUDGET'
+                }), 400
+            budget_manager.set_user_budget(user_id, budget)
+            user_model.log_activity(user_id, 'batch_budget_updated', {'budget': budget})
+        
+        return jsonify({
+            'success': True,
+            'budget': budget_manager.get_user_budget(user_id)
+        })
+        
+    except Exception as e:
+        logger.error(f"批量作業預算錯誤: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'批量作業預算操作失敗: {str(e)}',
+            'error_code': 'USER_BUDGET_ERROR'
+        }), 500
+
 @ai_assistant_bp.route('/batch/cancel-job/<job_id>', methods=['POST'])
 @login_required
 def cancel_batch_job(job_id):
@@ -739,6 +1015,44 @@ def cancel_batch_job(job_id):
             'error_code': 'CANCEL_JOB_ERROR'
         }), 500
 
+def _batch_event_stream(job_id=None):
+    """建立批量事件 SSE 響應，支援 Last-Event-ID 續傳"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    subscription = batch_event_broker.subscribe(job_id, last_event_id)
+    return Response(
+        stream_with_context(batch_event_broker.stream(subscription)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@ai_assistant_bp.route('/batch/events/<job_id>', methods=['GET'])
+@login_required
+def stream_batch_job_events(job_id):
+    """訂閱單個批量作業的進度事件 (SSE)"""
+    # 有跨進程轉發時，作業可能由其他工作進程執行
+    if job_id not in batch_processor.jobs and batch_event_broker.relay is None:
+        return jsonify({
+            'success': False,
+            'error': f'作業不存在: {job_id}',
+            'error_code': 'JOB_NOT_FOUND'
+        }), 404
+    
+    return _batch_event_stream(job_id)
+
+@ai_assistant_bp.route('/batch/events', methods=['GET'])
+@login_required
+def stream_all_batch_events():
+    """訂閱所有批量作業的進度事件 (SSE)"""
+    return _batch_event_stream()
+
 @ai_assistant_bp.route('/batch/system-stats', methods=['GET'])
 @login_required
 def get_batch_system_stats():
@@ -9,6 +9,7 @@ from datetime import datetime
 
 # 導入監控服務
 from services.monitoring import performance_monitor
+from services.adaptive_limiter import provider_limiters
 
 logger = logging.getLogger(__name__)
 
@@ -104,6 +105,27 @@ def get_current_resource_usage():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@monitoring_bp.route('/adaptive-limits', methods=['GET'])
+def get_adaptive_limits():
+    """獲取各服務商的自適應併發上限、延遲與調整記錄"""
+    try:
+        provider = request.args.get('provider', None)
+        limits = provider_limiters.get_stats(provider)
+        
+        return jsonify({
+            'success': True,
+            'providers': limits,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"獲取自適應併發上限失敗: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
 @monitoring_bp.route('/performance-summary', methods=['GET'])
 def get_performance_summary():
     """獲取性能總結報告"""
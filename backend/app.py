@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, send_file, abort
 from flask_cors import CORS
 import google.generativeai as genai
 import openai
@@ -11,6 +11,7 @@ import time
 import logging
 from datetime import datetime
 import json
+import hashlib
 
 # 配置日誌
 logging.basicConfig(level=logging.INFO)
@@ -49,6 +50,16 @@ from services.openai_service import OpenAIService
 from services.gemini_service import GeminiService
 from services.stability_service import StabilityService
 from services.factory import get_image_generation_service
+from services.singleflight import SingleFlight, generation_request_key
+from services.adaptive_limiter import provider_limiters
+from services.cache_service import image_blob_store
+
+# 監控 API 依賴 psutil（可選依賴）
+try:
+    from api.monitoring_api import monitoring_bp
+    MONITORING_AVAILABLE = True
+except ImportError:
+    MONITORING_AVAILABLE = False
 
 app.register_blueprint(image_bp)
 app.register_blueprint(image_processing_bp)
@@ -62,6 +73,10 @@ app.register_blueprint(cloud_storage_bp)
 app.register_blueprint(creative_workflow_bp)
 app.register_blueprint(analytics_bp)
 app.register_blueprint(user_api)
+if MONITORING_AVAILABLE:
+    app.register_blueprint(monitoring_bp, url_prefix='/api/monitoring')
+else:
+    logger.warning("psutil 未安裝，跳過監控 API")
 
 # 初始化資料庫服務
 db_service = DatabaseService()
@@ -112,6 +127,29 @@ def static_files(filename):
     """提供靜態文件"""
     return send_from_directory(FRONTEND_DIR, filename)
 
+# 進行中的相同生成請求合併
+generation_flight = SingleFlight()
+
+def save_shared_image_records(generation_id, images, prompt, api_provider, model_name, image_size):
+    """為共用其他請求結果的生成記錄寫入圖片記錄"""
+    for image in images:
+        filename = image.get('filename')
+        if not filename:
+            continue
+        file_path = os.path.join(GENERATED_IMAGES_DIR, filename)
+        db_service.save_generated_image(
+            generation_id=generation_id,
+            filename=filename,
+            original_prompt=prompt,
+            api_provider=api_provider,
+            model_name=model_name,
+            image_size=image_size,
+            file_path=file_path,
+            file_size=os.path.getsize(file_path) if os.path.exists(file_path) else None,
+            mime_type=image.get('mime_type', 'image/png'),
+            metadata={'shared': True}
+        )
+
 @app.route('/api/generate-image', methods=['POST'])
 def generate_image():
     """生成圖片的API端點"""
@@ -125,6 +163,7 @@ def generate_image():
             return jsonify({'success': False, 'error': '無效的請求數據'}), 400
         
         prompt = data.get('prompt', '').strip()
+        negative_prompt = data.get('negative_prompt', '')
         image_size = data.get('image_size', '1024x1024')
         image_count = int(data.get('image_count', 1))
         api_provider = data.get('api_provider', 'gemini')
@@ -166,18 +205,40 @@ def generate_image():
         if not service:
             return jsonify({'success': False, 'error': f'不支持的API提供商: {api_provider}'}), 400
 
+        # 相同請求進行中時共用其結果（coalesce=false 或指定 seed 時不合併）；
+        # 鍵包含 API 金鑰的雜湊，只有使用同一金鑰的請求會合併，費用不會計入他人的金鑰
+        flight_key = generation_request_key('generate_image', {
+            'prompt': prompt,
+            'negative_prompt': negative_prompt,
+            'image_size': image_size,
+            'api_provider': api_provider,
+            'model': model_name,
+            'image_count': image_count,
+            'credential': hashlib.sha256(api_key.encode('utf-8')).hexdigest(),
+            'coalesce': data.get('coalesce', True),
+            'seed': data.get('seed')
+        })
+
         # Midjourney 是一個特例，暫時保留
         if api_provider == 'midjourney':
-            images = generate_images_with_midjourney(prompt, image_size, image_count, generation_id)
+            images, coalesced = generation_flight.do(
+                flight_key, generate_images_with_midjourney, prompt, image_size, image_count, generation_id
+            )
         else:
             service.set_db_service(db_service)
-            images = service.generate_images(
+            images, coalesced = generation_flight.do(
+                flight_key, service.generate_images,
                 prompt=prompt,
                 image_size=image_size,
                 image_count=image_count,
                 model_name=model_name,
                 generation_id=generation_id
             )
+            if coalesced:
+                # 圖片記錄只寫入了執行請求的生成ID，為本次生成記錄寫入指向相同檔案的記錄
+                save_shared_image_records(generation_id, images, prompt, api_provider, model_name, image_size)
+        if coalesced:
+            logger.info(f"共用進行中的相同生成請求結果 - 生成ID: {generation_id}")
 
         # 更新生成結果統計
         total_time = time.time() - start_time
@@ -197,6 +258,7 @@ def generate_image():
             'prompt': prompt,
             'generated_at': datetime.now().isoformat(),
             'generation_id': generation_id,
+            'coalesced': coalesced,
             'statistics': {
                 'success_count': success_count,
                 'failed_count': failed_count,
@@ -237,6 +299,19 @@ def serve_generated_image(filename):
     """提供生成的圖片文件"""
     return send_from_directory(GENERATED_IMAGES_DIR, filename)
 
+@app.route('/cache_blobs/<digest>')
+def serve_cache_blob(digest):
+    """提供緩存的圖片內容（按內容雜湊定址，內容不變，可長期快取）"""
+    if not image_blob_store.exists(digest):
+        abort(404)
+    return send_file(
+        image_blob_store.path(digest),
+        mimetype=image_blob_store.guess_mime_type(digest),
+        conditional=True,
+        etag=digest,
+        max_age=365 * 86400
+    )
+
 @app.route('/assets/images/<filename>')
 def serve_asset_image(filename):
     """提供資源圖片文件"""
@@ -248,7 +323,11 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'api_key_configured': GEMINI_API_KEY != 'YOUR_GEMINI_API_KEY_HERE'
+        'api_key_configured': GEMINI_API_KEY != 'YOUR_GEMINI_API_KEY_HERE',
+        'request_coalescing': generation_flight.get_stats(),
+        'adaptive_limits': {
+            provider: stats['limit'] for provider, stats in provider_limiters.get_stats().items()
+        }
     })
 
 if __name__ == '__main__':
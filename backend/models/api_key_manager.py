@@ -527,5 +527,61 @@ class APIKeyManager:
         finally:
             conn.close()
 
+    def get_average_request_cost(self, platform_name: str, days: int = 30) -> Optional[float]:
+        """
+        獲取平台近期的平均單次請求成本（所有用戶）
+        
+        Args:
+            platform_name: 平台名稱
+            days: 統計天數
+            
+        Returns:
+            Optional[float]: 平均成本，沒有記錄時返回 None
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            start_date = (datetime.now() - timedelta(days=days)).date()
+            cursor.execute('''
+                SELECT SUM(total_cost), SUM(total_requests)
+                FROM api_usage_stats
+                WHERE platform_name = ? AND date >= ?
+            ''', (platform_name, start_date))
+            total_cost, total_requests = cursor.fetchone()
+            if not total_requests:
+                return None
+            return (total_cost or 0.0) / total_requests
+        except Exception as e:
+            logger.error(f"獲取平均請求成本失敗: {str(e)}")
+            return None
+        finally:
+            conn.close()
+    
+    def get_user_spend(self, user_id: int, days: int = 1) -> float:
+        """
+        獲取用戶近期已記錄的花費
+        
+        Args:
+            user_id: 用戶ID
+            days: 統計天數（1 表示當日）
+            
+        Returns:
+            float: 總成本
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            start_date = (datetime.now() - timedelta(days=days - 1)).date()
+            cursor.execute('''
+                SELECT SUM(total_cost) FROM api_usage_stats
+                WHERE user_id = ? AND date >= ?
+            ''', (user_id, start_date))
+            return cursor.fetchone()[0] or 0.0
+        except Exception as e:
+            logger.error(f"獲取用戶花費失敗: {str(e)}")
+            return 0.0
+        finally:
+            conn.close()
+
 # 全局 API 金鑰管理器實例
 api_key_manager = APIKeyManager() 
\ No newline at end of file
@@ -0,0 +1,330 @@
+"""
+自適應併發限制 v2.7
+按服務商維護 AIMD（加性增、乘性減）併發上限：延遲與錯誤率正常且上限被用滿時緩慢增加，
+遇到 429/503、超時或 p95 延遲明顯上升時按比例削減，以持續逼近服務商實際允許的最大吞吐
+"""
+
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .retry_policy import RetryableError, get_retry_after
+
+logger = logging.getLogger(__name__)
+
+# 表示服務商過載的 HTTP 狀態碼
+OVERLOAD_STATUS_CODES = (429, 503)
+
+def is_overload_error(error: Optional[BaseException]) -> bool:
+    """判斷錯誤是否表示服務商過載（429/503、Retry-After、超時）"""
+    if error is None:
+        return False
+    if isinstance(error, TimeoutError):
+        return True
+    if isinstance(error, RetryableError) and error.status_code in OVERLOAD_STATUS_CODES:
+        return True
+
+    status = getattr(error, 'status_code', None) or getattr(error, 'status', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status in OVERLOAD_STATUS_CODES:
+        return True
+    if get_retry_after(error) is not None:
+        return True
+
+    # 服務封裝後只剩錯誤訊息的情況
+    message = str(error).lower()
+    return '429' in message or 'rate limit' in message
+
+def _percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+class _Waiter:
+    """等待名額的協程"""
+
+    __slots__ = ("loop", "future", "granted")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, future: asyncio.Future):
+        self.loop = loop
+        self.future = future
+        self.granted = False
+
+class LimiterSlot:
+    """slot() 產出的名額，調用方可設置 error 回報以返回值表示的失敗"""
+
+    __slots__ = ("error",)
+
+    def __init__(self):
+        self.error: Optional[BaseException] = None
+
+def _grant(future: asyncio.Future):
+    if not future.done():
+        future.set_result(True)
+
+class AdaptiveLimiter:
+    """
+    單個服務商的 AIMD 併發限制器
+
+    線程安全；協程可在不同事件循環中等待名額，名額釋放時直接移交給等待者。
+    """
+
+    def __init__(self, key: str, initial_limit: int = 2, min_limit: int = 1, max_limit: int = 32,
+                 increase: float = 1.0, decrease_factor: float = 0.5,
+                 latency_window: int = 50, check_interval: int = 10,
+                 latency_tolerance: float = 2.0, error_threshold: float = 0.2,
+                 cooldown: float = 1.0, history_size: int = 100):
+        """
+        Args:
+            key: 服務商鍵
+            initial_limit: 初始併發上限
+            min_limit / max_limit: 併發上限範圍
+            increase: 每個「上限輪次」（約 limit 個成功請求）增加的名額
+            decrease_factor: 削減時的乘數
+            latency_window: 計算 p95 與錯誤率的最近樣本數
+            check_interval: 每累計多少個成功樣本檢查一次 p95
+            latency_tolerance: p95 超過基準的倍數時視為延遲上升
+            error_threshold: 最近錯誤率超過此值時停止增加
+            cooldown: 兩次削減的最短間隔（秒），實際取此值與平均延遲的較大者
+            history_size: 保留的上限變化記錄數
+        """
+        self.key = key
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.check_interval = check_interval
+        self.latency_tolerance = latency_tolerance
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+
+        self._limit = float(min(self.max_limit, max(self.min_limit, initial_limit)))
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self._waiters: Deque[_Waiter] = deque()
+        self._listeners: List[Callable[[], None]] = []
+
+        self.latencies: Deque[float] = deque(maxlen=latency_window)
+        self.outcomes: Deque[bool] = deque(maxlen=latency_window)  # True 表示失敗
+        self.baseline_p95: Optional[float] = None
+        self.mean_latency: Optional[float] = None
+        self._samples_since_check = 0
+        self._last_decrease = 0.0
+
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self.stats = {
+            "acquired": 0,
+            "waited": 0,
+            "successes": 0,
+            "errors": 0,
+            "overloads": 0,
+            "increases": 0,
+            "decreases": 0
+        }
+
+    @property
+    def limit(self) -> int:
+        """當前併發上限"""
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def available(self) -> int:
+        """當前空閒名額"""
+        return max(0, self.limit - self.in_flight)
+
+    def add_listener(self, callback: Callable[[], None]):
+        """登記名額釋放時的通知（在釋放名額的線程中調用，不可阻塞）"""
+        with self.lock:
+            self._listeners.append(callback)
+
+    # 名額
+
+    def try_acquire(self) -> bool:
+        """非阻塞地取得名額"""
+        with self.lock:
+            if self._waiters or self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            self.stats["acquired"] += 1
+            return True
+
+    async def acquire(self):
+        """等待並取得名額"""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if not self._waiters and self.in_flight < self.limit:
+                self.in_flight += 1
+                self.stats["acquired"] += 1
+                return
+            waiter = _Waiter(loop, loop.create_future())
+            self._waiters.append(waiter)
+            self.stats["waited"] += 1
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self.lock:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted:
+                self.release()
+            raise
+
+    def release(self, latency: Optional[float] = None, error: Optional[BaseException] = None):
+        """
+        釋放名額並記錄本次請求的結果
+
+        Args:
+            latency: 請求耗時（秒），None 表示不計入樣本（如未實際調用服務商）
+            error: 請求失敗的異常；取消不計入樣本
+        """
+        with self.lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if not isinstance(error, asyncio.CancelledError) and (latency is not None or error is not None):
+                self._observe(latency, error)
+
+            granted = []
+            while self._waiters and self.in_flight < self.limit:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                self.in_flight += 1
+                self.stats["acquired"] += 1
+                granted.append(waiter)
+            listeners = list(self._listeners)
+
+        for waiter in granted:
+            waiter.loop.call_soon_threadsafe(_grant, waiter.future)
+        for callback in listeners:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"併發限制通知失敗 {self.key}: {str(e)}")
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """取得名額並在結束時以耗時與異常（或 LimiterSlot.error）釋放"""
+        await self.acquire()
+        slot = LimiterSlot()
+        started = time.monotonic()
+        try:
+            yield slot
+        except BaseException as e:
+            self.release(time.monotonic() - started, e)
+            raise
+        self.release(time.monotonic() - started, slot.error)
+
+    # AIMD
+
+    def _observe(self, latency: Optional[float], error: Optional[BaseException]):
+        """記錄結果並調整上限（持有鎖）"""
+        now = time.monotonic()
+        if error is not None and is_overload_error(error):
+            self.stats["overloads"] += 1
+            self.outcomes.append(True)
+            self._decrease(now, "overload")
+            return
+
+        self.outcomes.append(error is not None)
+        if error is not None:
+            self.stats["errors"] += 1
+            return
+
+        self.stats["successes"] += 1
+        self.latencies.append(latency)
+        self.mean_latency = latency if self.mean_latency is None else self.mean_latency + 0.1 * (latency - self.mean_latency)
+
+        self._samples_since_check += 1
+        if self._samples_since_check >= self.check_interval and len(self.latencies) >= self.check_interval:
+            self._samples_since_check = 0
+            p95 = _percentile(self.latencies, 0.95)
+            if self.baseline_p95 is None or p95 < self.baseline_p95:
+                self.baseline_p95 = p95
+            elif p95 > self.baseline_p95 * self.latency_tolerance:
+                self._decrease(now, "latency", p95)
+                return
+            else:
+                # 基準緩慢跟隨服務商的正常延遲變化
+                self.baseline_p95 += 0.1 * (p95 - self.baseline_p95)
+
+        # 只有上限被用滿時才增加，避免低負載時虛增
+        error_rate = sum(self.outcomes) / len(self.outcomes)
+        if error_rate <= self.error_threshold and self.in_flight + 1 >= self.limit and self._limit < self.max_limit:
+            previous = self.limit
+            self._limit = min(float(self.max_limit), self._limit + self.increase / self.limit)
+            if self.limit != previous:
+                self.stats["increases"] += 1
+                self._record("increase")
+
+    def _decrease(self, now: float, reason: str, p95: Optional[float] = None):
+        """乘性削減（冷卻期內只削減一次）"""
+        cooldown = max(self.cooldown, self.mean_latency or 0.0)
+        if now - self._last_decrease < cooldown:
+            return
+        self._last_decrease = now
+        self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+        self.latencies.clear()
+        self._samples_since_check = 0
+        self.stats["decreases"] += 1
+        self._record(reason, p95)
+        logger.warning(f"服務商 {self.key} 併發上限削減至 {self.limit}（{reason}）")
+
+    def _record(self, reason: str, p95: Optional[float] = None):
+        self.history.append({
+            "time": datetime.now().isoformat(),
+            "limit": self.limit,
+            "reason": reason,
+            "p95_seconds": round(p95, 3) if p95 is not None else None
+        })
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取當前上限、延遲、錯誤率與變化記錄"""
+        with self.lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiters),
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "p95_seconds": round(_percentile(self.latencies, 0.95), 3) if self.latencies else None,
+                "baseline_p95_seconds": round(self.baseline_p95, 3) if self.baseline_p95 is not None else None,
+                "error_rate": round(sum(self.outcomes) / len(self.outcomes), 3) if self.outcomes else 0.0,
+                **self.stats,
+                "history": list(self.history)
+            }
+
+class AdaptiveLimiterRegistry:
+    """按服務商鍵建立與查詢限制器"""
+
+    def __init__(self, **defaults):
+        """
+        Args:
+            defaults: 新建限制器的預設參數（見 AdaptiveLimiter）
+        """
+        self.defaults = defaults
+        self.limiters: Dict[str, AdaptiveLimiter] = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: str, **options) -> AdaptiveLimiter:
+        """獲取服務商的限制器，不存在時以預設參數及 options 建立"""
+        with self.lock:
+            limiter = self.limiters.get(key)
+            if limiter is None:
+                limiter = self.limiters[key] = AdaptiveLimiter(key, **{**self.defaults, **options})
+            return limiter
+
+    def get_stats(self, key: Optional[str] = None) -> Dict[str, Any]:
+        """獲取所有（或指定）服務商的限制器狀態"""
+        with self.lock:
+            limiters = dict(self.limiters)
+        if key is not None:
+            return {key: limiters[key].get_stats()} if key in limiters else {}
+        return {name: limiter.get_stats() for name, limiter in limiters.items()}
+
+# 全局服務商限制器（批量與異步處理器、AI 助手共用，使同一服務商的併發在進程內統一控制）
+provider_limiters = AdaptiveLimiterRegistry()
@@ -20,6 +20,9 @@ import hashlib
 import concurrent.futures
 from dataclasses import dataclass
 
+from .adaptive_limiter import provider_limiters
+from .task_cost import chat_completion_cost, record_task_cost
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -57,7 +60,8 @@ class AIAssistantService:
         self.optimization_history = []  # 優化歷史記錄
         self.language_cache = {}  # 翻譯緩存
         self.style_templates = {}  # 風格模板緩存
-        self.max_concurrent_tasks = 3  # 最大並發任務數
+        self.max_concurrent_tasks = 3  # 初始並發任務數（之後由自適應限制器調整）
+        self.limiter = provider_limiters.get('openai', initial_limit=self.max_concurrent_tasks)
         
         if api_key:
             self.configure(api_key)
@@ -78,7 +82,7 @@ class AIAssistantService:
             self.client = openai.OpenAI(api_key=api_key)
             
             # 測試 API 連接
-            response = self.client.chat.completions.create(
+            response = self._create_completion(
                 model="gpt-3.5-turbo",
                 messages=[{"role": "user", "content": "Hello"}],
                 max_tokens=10
@@ -91,6 +95,12 @@ class AIAssistantService:
             logger.error(f"AI 助手服務配置失敗: {str(e)}")
             return False
     
+    def _create_completion(self, **kwargs):
+        """調用對話補全，並按 token 用量將費用記錄到當前任務（在批量任務中執行時）"""
+        response = self.client.chat.completions.create(**kwargs)
+        record_task_cost(chat_completion_cost(kwargs.get("model"), getattr(response, "usage", None)))
+        return response
+    
     def _wait_for_rate_limit(self):
         """處理請求速率限制"""
         current_time = time.time()
@@ -182,7 +192,7 @@ class AIAssistantService:
 }}
 """
             
-            response = self.client.chat.completions.create(
+            response = self._create_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {
@@ -289,34 +299,34 @@ class AIAssistantService:
                 tasks.append(task)
                 self.batch_tasks[task.id] = task
             
-            # 並行處理任務
-            semaphore = asyncio.Semaphore(self.max_concurrent_tasks)
-            
+            # 並行處理任務（併發數由 OpenAI 的自適應限制器控制）
             async def process_single_task(task):
-                async with semaphore:
-                    try:
-                        task.status = "processing"
+                try:
+                    task.status = "processing"
+                    async with self.limiter.slot() as slot:
                         result = await self.enhance_prompt(
                             task.original_prompt,
                             task.style,
                             task.target_language,
                             task.complexity
                         )
-                        
-                        if result["success"]:
-                            task.status = "completed"
-                            task.result = result
-                        else:
-                            task.status = "failed"
-                            task.error = result.get("error", "未知錯誤")
-                        
-                        task.completed_at = datetime.now()
-                        
-                    except Exception as e:
+                        if not result["success"]:
+                            slot.error = RuntimeError(result.get("error", "未知錯誤"))
+                    
+                    if result["success"]:
+                        task.status = "completed"
+                        task.result = result
+                    else:
                         task.status = "failed"
-                        task.error = str(e)
-                        task.completed_at = datetime.now()
-                        logger.error(f"批量任務處理失敗 {task.id}: {str(e)}")
+                        task.error = result.get("error", "未知錯誤")
+                    
+                    task.completed_at = datetime.now()
+                    
+                except Exception as e:
+                    task.status = "failed"
+                    task.error = str(e)
+                    task.completed_at = datetime.now()
+                    logger.error(f"批量任務處理失敗 {task.id}: {str(e)}")
             
             # 並行執行所有任務
             await asyncio.gather(*[process_single_task(task) for task in tasks])
@@ -404,7 +414,7 @@ class AIAssistantService:
 }}
 """
             
-            response = self.client.chat.completions.create(
+            response = self._create_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {
@@ -528,7 +538,7 @@ class AIAssistantService:
 }}
 """
             
-            response = self.client.chat.completions.create(
+            response = self._create_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {
@@ -646,7 +656,7 @@ class AIAssistantService:
 }}
 """
             
-            response = self.client.chat.completions.create(
+            response = self._create_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {
@@ -769,7 +779,7 @@ class AIAssistantService:
                     }
                 ]
             
-            response = self.client.chat.completions.create(
+            response = self._create_completion(
                 model="gpt-4o-mini",
                 messages=messages,
                 max_tokens=600
@@ -844,7 +854,7 @@ class AIAssistantService:
 }}
 """
             
-            response = self.client.chat.completions.create(
+            response = self._create_completion(
                 model="gpt-3.5-turbo",
                 messages=[
                     {
@@ -1188,7 +1198,7 @@ class AIAssistantService:
                 ]
                 model = "gpt-4o-mini"
             
-            response = self.client.chat.completions.create(
+            response = self._create_completion(
                 model=model,
                 messages=messages,
                 max_tokens=1000,
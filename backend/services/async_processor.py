@@ -5,6 +5,10 @@ AI 批量圖片生成器 - 異步處理服務
 """
 
 import asyncio
+import contextlib
+import contextvars
+import functools
+import itertools
 import uuid
 import time
 import logging
@@ -12,9 +16,16 @@ from typing import Dict, List, Any, Optional, Callable, Coroutine
 from datetime import datetime, timedelta
 from enum import Enum
 from dataclasses import dataclass, field
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
 import threading
 
+from .retry_policy import RetryPolicy, RetryDelayStats, get_retry_after
+from .task_cost import bind_task, unbind_task, result_cost
+from .adaptive_limiter import AdaptiveLimiter, AdaptiveLimiterRegistry, provider_limiters
+from .task_archive import TaskArchive
+from .result_store import ResultStore
+
 logger = logging.getLogger(__name__)
 
 class TaskStatus(Enum):
@@ -52,6 +63,7 @@ class AsyncTask:
     retry_count: int = 0
     max_retries: int = 3
     metadata: dict = field(default_factory=dict)
+    cost: float = 0.0  # 任務函數經 record_task_cost 回報的累計費用
 
     @property
     def duration(self) -> Optional[float]:
@@ -69,14 +81,52 @@ class AsyncTask:
 class AsyncProcessor:
     """異步處理器"""
     
-    def __init__(self, max_concurrent_tasks: int = 5, max_thread_workers: int = 10):
+    def __init__(self, max_concurrent_tasks: int = 5, max_thread_workers: int = 10,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 limiters: Optional[AdaptiveLimiterRegistry] = None,
+                 retention_seconds: Optional[float] = 3600,
+                 max_finished_tasks: int = 10000,
+                 archive: Optional[TaskArchive] = None,
+                 result_store: Optional[ResultStore] = None):
+        """
+        Args:
+            max_concurrent_tasks: 最大併發任務數
+            max_thread_workers: 同步任務函數的線程池大小
+            retry_policy: 失敗重試的退避策略
+            limiters: 服務商自適應併發限制
+            retention_seconds: 已結束任務在記憶體中的保留秒數，None 表示不按時間淘汰
+            max_finished_tasks: 記憶體中保留的已結束任務上限，超出時淘汰最早結束的任務
+            archive: 淘汰任務的歸檔，提供時歷史查詢會包含已淘汰任務的元數據
+            result_store: 任務結果存儲，提供時大型結果寫入磁碟，任務只保留結果引用
+        """
         self.max_concurrent_tasks = max_concurrent_tasks
         self.max_thread_workers = max_thread_workers
         
+        # 已結束任務的保留與歸檔
+        self.retention_seconds = retention_seconds
+        self.max_finished_tasks = max_finished_tasks
+        self.archive = archive
+        self.result_store = result_store
+        self.finished_tasks: OrderedDict = OrderedDict()  # 任務ID -> 結束時間（按結束順序）
+        self._sweep_handle: Optional[asyncio.TimerHandle] = None
+        
+        # 服務商自適應併發限制：metadata 帶有 provider 的任務在執行時另需取得該服務商的名額
+        self.limiters = limiters or provider_limiters
+        
+        # 重試退避策略
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retry_stats = RetryDelayStats()
+        self.parked_tasks: Dict[str, asyncio.TimerHandle] = {}
+        
         # 任務管理
         self.tasks: Dict[str, AsyncTask] = {}
+        self.status_index: Dict[TaskStatus, Dict[str, None]] = {status: {} for status in TaskStatus}  # 狀態 -> 任務ID
         self.task_queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
         self.running_tasks: Dict[str, asyncio.Task] = {}
+        self._sequence = itertools.count()  # 同優先級任務按提交順序執行
+        self._slots: Optional[asyncio.Semaphore] = None  # 併發名額，啟動處理器時建立
+        self._yielded_slots: set = set()  # 等待服務商名額期間已歸還併發名額的任務ID
+        self.task_futures: Dict[str, asyncio.Future] = {}  # 未結束任務的完成 Future
         
         # 執行器
         self.thread_executor = ThreadPoolExecutor(max_workers=max_thread_workers)
@@ -100,7 +150,10 @@ class AsyncProcessor:
             'failed_tasks': 0,
             'average_duration': 0.0,
             'queue_size': 0,
-            'running_count': 0
+            'running_count': 0,
+            'cancelled_tasks': 0,
+            'cancelled_partial_cost': 0.0,
+            'evicted_tasks': 0
         }
         
         self.lock = threading.RLock()
@@ -114,12 +167,14 @@ class AsyncProcessor:
         """提交任務到隊列"""
         with self.lock:
             self.tasks[task.id] = task
+            self.status_index[task.status][task.id] = None
             self.stats['total_tasks'] += 1
             self.stats['queue_size'] += 1
+        self.task_futures[task.id] = asyncio.get_running_loop().create_future()
         
         # 優先級隊列：數字越小優先級越高
         priority = -task.priority.value  # 反轉優先級
-        await self.task_queue.put((priority, time.time(), task.id))
+        await self.task_queue.put((priority, next(self._sequence), task.id))
         
         logger.info(f"任務已提交: {task.name} (ID: {task.id[:8]}...)")
         return task.id
@@ -153,7 +208,9 @@ class AsyncProcessor:
             return
         
         self.is_running = True
+        self._slots = asyncio.Semaphore(self.max_concurrent_tasks)
         self.processor_task = asyncio.create_task(self._process_tasks())
+        self._schedule_sweep()
         logger.info("異步處理器已啟動")
     
     async def stop_processor(self):
@@ -162,17 +219,27 @@ class AsyncProcessor:
             return
         
         self.is_running = False
+        if self._sweep_handle is not None:
+            self._sweep_handle.cancel()
+            self._sweep_handle = None
+        
+        # 停止調度循環（阻塞在等待名額或隊列上）
+        if self.processor_task:
+            self.processor_task.cancel()
+            try:
+                await self.processor_task
+            except asyncio.CancelledError:
+                pass
         
-        # 取消所有運行中的任務
-        for task_id, running_task in self.running_tasks.items():
+        # 取消所有運行中的任務並等待其完成清理
+        running = list(self.running_tasks.items())
+        for task_id, running_task in running:
             running_task.cancel()
             with self.lock:
                 if task_id in self.tasks:
-                    self.tasks[task_id].status = TaskStatus.CANCELLED
-        
-        # 等待處理器任務完成
-        if self.processor_task:
-            await self.processor_task
+                    self._set_status(self.tasks[task_id], TaskStatus.CANCELLED)
+        if running:
+            await asyncio.gather(*(running_task for _, running_task in running), return_exceptions=True)
         
         # 關閉線程池
         self.thread_executor.shutdown(wait=True)
@@ -180,49 +247,91 @@ class AsyncProcessor:
         logger.info("異步處理器已停止")
     
     async def _process_tasks(self):
-        """處理任務隊列"""
+        """
+        調度循環：先取得併發名額再從隊列取任務，每個任務在獨立的協程中執行
+
+        名額在任務協程結束時歸還，空閒名額與就緒任務之間沒有輪詢延遲。
+        """
         while self.is_running:
+            await self._slots.acquire()
             try:
-                # 控制併發數量
-                if len(self.running_tasks) >= self.max_concurrent_tasks:
-                    await asyncio.sleep(0.1)
-                    continue
-                
-                # 從隊列獲取任務（帶超時）
-                try:
-                    priority, submit_time, task_id = await asyncio.wait_for(
-                        self.task_queue.get(), timeout=1.0
-                    )
-                except asyncio.TimeoutError:
-                    continue
-                
-                # 檢查任務是否存在
-                if task_id not in self.tasks:
-                    continue
-                
-                task = self.tasks[task_id]
-                
-                # 檢查任務是否已被取消
-                if task.status == TaskStatus.CANCELLED:
-                    continue
-                
-                # 啟動任務執行
-                running_task = asyncio.create_task(self._execute_task(task))
-                self.running_tasks[task_id] = running_task
-                
-                with self.lock:
-                    self.stats['queue_size'] -= 1
-                    self.stats['running_count'] += 1
-                
-            except Exception as e:
-                logger.error(f"處理任務時發生錯誤: {e}")
-                await asyncio.sleep(1)
+                priority, sequence, task_id = await self.task_queue.get()
+            except BaseException:
+                self._slots.release()
+                raise
+            
+            with self.lock:
+                self.stats['queue_size'] -= 1
+            
+            # 跳過已刪除或已取消的任務
+            task = self.tasks.get(task_id)
+            if task is None or task.status != TaskStatus.PENDING:
+                self._slots.release()
+                continue
+            
+            # 啟動任務執行
+            with self.lock:
+                self.stats['running_count'] += 1
+            running_task = asyncio.create_task(self._execute_task(task))
+            self.running_tasks[task_id] = running_task
+            running_task.add_done_callback(functools.partial(self._on_task_done, task))
+    
+    def _on_task_done(self, task: AsyncTask, running_task: asyncio.Task):
+        """任務協程結束：歸還併發名額（等待服務商名額時已歸還的除外）"""
+        if task.id in self._yielded_slots:
+            self._yielded_slots.discard(task.id)
+        else:
+            self._slots.release()
+        
+        # 協程開始執行前即被取消時 _execute_task 的清理不會運行
+        if self.running_tasks.get(task.id) is running_task:
+            del self.running_tasks[task.id]
+            self._set_status(task, TaskStatus.CANCELLED)
+            task.completed_at = datetime.now()
+            with self.lock:
+                self.stats['running_count'] -= 1
+                self.stats['cancelled_tasks'] += 1
+            self._resolve_task(task)
+    
+    def _provider_limiter(self, provider: str) -> AdaptiveLimiter:
+        """服務商的自適應限制器；首次建立時以全局併發數為初始上限，之後由 AIMD 調整"""
+        return self.limiters.get(provider, initial_limit=self.max_concurrent_tasks)
+    
+    @contextlib.asynccontextmanager
+    async def _provider_slot(self, task: AsyncTask, provider: str):
+        """
+        取得服務商名額，結束時以耗時與異常釋放
+
+        名額已滿時先歸還全局併發名額再等待，取得服務商名額後重新取得全局名額，
+        避免等待同一服務商的任務佔滿全局名額而阻塞其他任務。
+        """
+        limiter = self._provider_limiter(provider)
+        if not limiter.try_acquire():
+            self._yielded_slots.add(task.id)
+            self._slots.release()
+            await limiter.acquire()
+            try:
+                await self._slots.acquire()
+            except BaseException:
+                limiter.release()
+                raise
+            self._yielded_slots.discard(task.id)
+        
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            limiter.release(time.monotonic() - started, e)
+            raise
+        limiter.release(time.monotonic() - started)
     
     async def _execute_task(self, task: AsyncTask):
         """執行單個任務"""
+        cost_token = bind_task(task)
+        cost_before = task.cost
         try:
             # 更新任務狀態
-            task.status = TaskStatus.RUNNING
+            self._set_status(task, TaskStatus.RUNNING)
             task.started_at = datetime.now()
             task.progress = 0.0
             
@@ -232,21 +341,26 @@ class AsyncProcessor:
             logger.info(f"開始執行任務: {task.name} (ID: {task.id[:8]}...)")
             
             # 執行任務函數
-            if asyncio.iscoroutinefunction(task.function):
-                # 異步函數
-                result = await task.function(*task.args, **task.kwargs)
+            provider = task.metadata.get('provider')
+            if provider:
+                async with self._provider_slot(task, provider):
+                    result = await self._call_function(task)
             else:
-                # 同步函數，在線程池中執行
-                loop = asyncio.get_event_loop()
-                result = await loop.run_in_executor(
-                    self.thread_executor, 
-                    task.function, 
-                    *task.args
+                result = await self._call_function(task)
+            
+            # 未經 record_task_cost 記錄費用的任務函數可由結果攜帶費用
+            if task.cost == cost_before:
+                task.cost += result_cost(result)
+            
+            # 大型結果寫入磁碟（編碼與寫入在線程池中進行），任務只保留引用
+            if self.result_store is not None:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self.thread_executor, self.result_store.put, task.id, result
                 )
             
             # 任務完成
             task.result = result
-            task.status = TaskStatus.COMPLETED
+            self._set_status(task, TaskStatus.COMPLETED)
             task.completed_at = datetime.now()
             task.progress = 100.0
             
@@ -258,18 +372,28 @@ class AsyncProcessor:
             
             # 觸發完成回調
             await self._trigger_callbacks('on_complete', task)
+            self._resolve_task(task)
             
             logger.info(f"任務完成: {task.name} (ID: {task.id[:8]}...) - 耗時: {task.duration:.2f}s")
             
         except asyncio.CancelledError:
-            task.status = TaskStatus.CANCELLED
+            # 取消會中斷協程中的 HTTP 請求；線程池中的同步函數無法中斷，結果將被捨棄
+            self._set_status(task, TaskStatus.CANCELLED)
             task.completed_at = datetime.now()
-            logger.info(f"任務被取消: {task.name} (ID: {task.id[:8]}...)")
+            task.error = f"任務已取消（執行 {task.duration:.1f} 秒後中止）"
+            
+            with self.lock:
+                self.stats['running_count'] -= 1
+                self.stats['cancelled_tasks'] += 1
+                self.stats['cancelled_partial_cost'] += task.cost
+            
+            logger.info(f"任務被取消: {task.name} (ID: {task.id[:8]}...)，部分費用 {task.cost:.4f}")
+            self._resolve_task(task)
             
         except Exception as e:
             # 任務失敗
             task.error = str(e)
-            task.status = TaskStatus.FAILED
+            self._set_status(task, TaskStatus.FAILED)
             task.completed_at = datetime.now()
             
             # 更新統計信息
@@ -277,22 +401,141 @@ class AsyncProcessor:
                 self.stats['failed_tasks'] += 1
                 self.stats['running_count'] -= 1
             
-            # 檢查是否需要重試
+            # 檢查是否需要重試（退避結束前不佔用併發名額）
             if task.retry_count < task.max_retries:
                 task.retry_count += 1
-                task.status = TaskStatus.PENDING
-                await self.submit_task(task)
-                logger.warning(f"任務失敗，重試 {task.retry_count}/{task.max_retries}: {task.name}")
+                self._set_status(task, TaskStatus.PENDING)
+                delay = self.retry_policy.compute_delay(task.retry_count, e)
+                self.retry_stats.record(delay, get_retry_after(e) is not None)
+                self._park_task(task, delay)
+                logger.warning(f"任務失敗，{delay:.2f} 秒後重試 {task.retry_count}/{task.max_retries}: {task.name}")
             else:
                 # 觸發錯誤回調
                 await self._trigger_callbacks('on_error', task)
+                self._resolve_task(task)
                 logger.error(f"任務最終失敗: {task.name} (ID: {task.id[:8]}...) - 錯誤: {e}")
         
         finally:
-            # 清理運行中的任務記錄
+            unbind_task(cost_token)
+            # 清理運行中的任務記錄，釋放併發名額
             if task.id in self.running_tasks:
                 del self.running_tasks[task.id]
     
+    async def _call_function(self, task: AsyncTask) -> Any:
+        """調用任務函數"""
+        if asyncio.iscoroutinefunction(task.function):
+            # 異步函數
+            return await task.function(*task.args, **task.kwargs)
+        
+        # 同步函數，在線程池中執行（保留關鍵字參數，並複製上下文使 record_task_cost 生效）
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self.thread_executor,
+            functools.partial(context.run, task.function, *task.args, **task.kwargs)
+        )
+    
+    def _set_status(self, task: AsyncTask, status: TaskStatus):
+        """更新任務狀態並維護狀態索引"""
+        with self.lock:
+            if task.status != status:
+                self.status_index[task.status].pop(task.id, None)
+            task.status = status
+            if task.id in self.tasks:
+                self.status_index[status][task.id] = None
+    
+    def _resolve_task(self, task: AsyncTask):
+        """任務進入最終狀態：完成其 Future 並納入保留期管理"""
+        future = self.task_futures.pop(task.id, None)
+        if future is not None and not future.done():
+            future.set_result(task)
+        
+        with self.lock:
+            if task.id not in self.tasks:
+                return
+            self.finished_tasks[task.id] = time.monotonic()
+            self.finished_tasks.move_to_end(task.id)
+            while len(self.finished_tasks) > self.max_finished_tasks:
+                self._evict_task(next(iter(self.finished_tasks)))
+    
+    def _evict_task(self, task_id: str):
+        """從記憶體移除已結束的任務，提供歸檔時先寫入元數據（不含結果）"""
+        with self.lock:
+            self.finished_tasks.pop(task_id, None)
+            task = self.tasks.pop(task_id, None)
+            if task is None:
+                return
+            self.status_index[task.status].pop(task_id, None)
+            self.task_futures.pop(task_id, None)
+            self.stats['evicted_tasks'] += 1
+        if self.result_store is not None:
+            self.result_store.release(task_id)
+        if self.archive is not None:
+            record = self.get_task_status(task_id, task)
+            record.pop('archived', None)
+            self.archive.add(record)
+    
+    def _schedule_sweep(self):
+        """定時淘汰超過保留期的已結束任務"""
+        if self.retention_seconds is None:
+            return
+        interval = max(1.0, min(60.0, self.retention_seconds / 4))
+        self._sweep_handle = asyncio.get_running_loop().call_later(interval, self._sweep)
+    
+    def _sweep(self):
+        """淘汰超過保留期的已結束任務（按結束順序，遇到未過期的任務即停止）"""
+        cutoff = time.monotonic() - self.retention_seconds
+        with self.lock:
+            expired = []
+            for task_id, finished_at in self.finished_tasks.items():
+                if finished_at > cutoff:
+                    break
+                expired.append(task_id)
+            for task_id in expired:
+                self._evict_task(task_id)
+        if expired:
+            logger.info(f"淘汰 {len(expired)} 個已結束的任務")
+        if self.is_running:
+            self._schedule_sweep()
+    
+    def task_done(self, task_id: str) -> asyncio.Future:
+        """
+        獲取任務結束時完成的 Future
+        
+        任務完成、最終失敗或取消時 Future 以 AsyncTask 完成（不拋出任務的異常），
+        重試中的任務不會完成 Future。
+        
+        Raises:
+            KeyError: 任務不存在
+        """
+        future = self.task_futures.get(task_id)
+        if future is not None:
+            return future
+        
+        task = self.tasks[task_id]
+        future = asyncio.get_running_loop().create_future()
+        if task.is_completed:
+            future.set_result(task)
+        else:
+            self.task_futures[task_id] = future
+        return future
+    
+    def _park_task(self, task: AsyncTask, delay: float):
+        """將重試任務暫存，退避結束後重新放入隊列"""
+        loop = asyncio.get_running_loop()
+        self.parked_tasks[task.id] = loop.call_later(delay, self._release_parked_task, task.id)
+    
+    def _release_parked_task(self, task_id: str):
+        """退避結束：重新排隊（已取消的任務跳過）"""
+        self.parked_tasks.pop(task_id, None)
+        task = self.tasks.get(task_id)
+        if task is None or task.status != TaskStatus.PENDING:
+            return
+        
+        with self.lock:
+            self.stats['queue_size'] += 1
+        self.task_queue.put_nowait((-task.priority.value, next(self._sequence), task.id))
+    
     async def _trigger_callbacks(self, event: str, task: AsyncTask):
         """觸發事件回調"""
         for callback in self.task_callbacks.get(event, []):
@@ -316,12 +559,12 @@ class AsyncProcessor:
             current_avg = self.stats['average_duration']
             self.stats['average_duration'] = (current_avg * (completed - 1) + duration) / completed
     
-    def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
-        """獲取任務狀態"""
-        if task_id not in self.tasks:
-            return None
+    def get_task_status(self, task_id: str, task: Optional[AsyncTask] = None) -> Optional[Dict[str, Any]]:
+        """獲取任務狀態（已淘汰的任務從歸檔查詢，不含結果）"""
+        task = task or self.tasks.get(task_id)
+        if task is None:
+            return self.archive.get(task_id) if self.archive is not None else None
         
-        task = self.tasks[task_id]
         return {
             'id': task.id,
             'name': task.name,
@@ -334,19 +577,44 @@ class AsyncProcessor:
             'estimated_duration': task.estimated_duration,
             'retry_count': task.retry_count,
             'error': task.error,
-            'metadata': task.metadata
+            'cost': task.cost,
+            'metadata': task.metadata,
+            'archived': False
         }
     
-    def get_all_tasks(self, status_filter: Optional[TaskStatus] = None) -> List[Dict[str, Any]]:
-        """獲取所有任務"""
-        tasks = []
-        for task in self.tasks.values():
-            if status_filter is None or task.status == status_filter:
-                tasks.append(self.get_task_status(task.id))
+    def get_task_result(self, task_id: str) -> Any:
+        """
+        獲取已完成任務的結果（寫入磁碟的結果經 mmap 載入）
+        
+        Raises:
+            KeyError: 任務不存在（或已淘汰）
+        """
+        result = self.tasks[task_id].result
+        if self.result_store is not None:
+            result = self.result_store.load(result)
+        return result
+    
+    def get_all_tasks(self, status_filter: Optional[TaskStatus] = None,
+                      include_archived: bool = False, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        獲取任務列表（按創建時間倒序）
+        
+        Args:
+            status_filter: 狀態過濾，經狀態索引直接取得對應任務
+            include_archived: 是否包含已淘汰並歸檔的任務
+            limit: 最大返回數
+        """
+        with self.lock:
+            task_ids = list(self.tasks if status_filter is None else self.status_index[status_filter])
+        tasks = [self.get_task_status(task_id) for task_id in task_ids]
+        tasks = [task for task in tasks if task is not None]
+        
+        if include_archived and self.archive is not None:
+            tasks.extend(self.archive.query(status_filter.value if status_filter else None, limit=limit))
         
         # 按創建時間排序
         tasks.sort(key=lambda x: x['created_at'], reverse=True)
-        return tasks
+        return tasks[:limit] if limit is not None else tasks
     
     async def cancel_task(self, task_id: str) -> bool:
         """取消任務"""
@@ -358,11 +626,19 @@ class AsyncProcessor:
         if task.is_completed:
             return False
         
-        task.status = TaskStatus.CANCELLED
+        self._set_status(task, TaskStatus.CANCELLED)
+        
+        # 如果任務正在等待重試，取消計時器
+        parked = self.parked_tasks.pop(task_id, None)
+        if parked is not None:
+            parked.cancel()
         
-        # 如果任務正在運行，取消它
+        # 如果任務正在運行，取消它（由執行協程完成 Future）；排隊中的任務直接完成
         if task_id in self.running_tasks:
             self.running_tasks[task_id].cancel()
+        else:
+            task.completed_at = datetime.now()
+            self._resolve_task(task)
         
         logger.info(f"任務已取消: {task.name} (ID: {task_id[:8]}...)")
         return True
@@ -373,6 +649,12 @@ class AsyncProcessor:
             stats = self.stats.copy()
             stats['is_running'] = self.is_running
             stats['total_running'] = len(self.running_tasks)
+            stats['parked_retries'] = len(self.parked_tasks)
+            stats['retained_tasks'] = len(self.tasks)
+            stats['finished_in_memory'] = len(self.finished_tasks)
+            stats['archive'] = self.archive.get_stats() if self.archive is not None else None
+            stats['result_store'] = self.result_store.get_stats() if self.result_store is not None else None
+            stats['retry_delays'] = self.retry_stats.to_dict()
             stats['success_rate'] = (
                 (stats['completed_tasks'] / max(stats['total_tasks'], 1)) * 100
             )
@@ -396,8 +678,8 @@ class AsyncProcessor:
 class ImageGenerationProcessor(AsyncProcessor):
     """圖片生成專用異步處理器"""
     
-    def __init__(self, max_concurrent_tasks: int = 3):
-        super().__init__(max_concurrent_tasks=max_concurrent_tasks)
+    def __init__(self, max_concurrent_tasks: int = 3, **kwargs):
+        super().__init__(max_concurrent_tasks=max_concurrent_tasks, **kwargs)
         
         # 圖片生成特定的統計
         self.generation_stats = {
@@ -406,6 +688,11 @@ class ImageGenerationProcessor(AsyncProcessor):
             'provider_usage': {},
             'popular_prompts': {}
         }
+        
+        # 批次記錄：批次ID -> 子任務、部分結果與匯總
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        # 批次進度回調：每張圖片結束時以 (批次ID, 單項結果) 調用
+        self.task_callbacks['on_batch_progress'] = []
     
     async def submit_batch_generation(
         self, 
@@ -434,24 +721,25 @@ class ImageGenerationProcessor(AsyncProcessor):
                     'type': 'image_generation',
                     'batch_id': batch_id,
                     'prompt': prompt,
+                    'provider': settings.get('api_provider'),
                     'is_batch_item': True
                 }
             )
             subtask_ids.append(task_id)
         
-        # 創建批量監控任務
-        await self.create_and_submit_task(
-            name=f"批量監控 {batch_id[:8]}...",
-            function=self._monitor_batch,
-            batch_id=batch_id,
-            subtask_ids=subtask_ids,
-            priority=TaskPriority.LOW,
-            metadata={
-                'type': 'batch_monitor',
-                'batch_id': batch_id,
-                'subtask_count': len(subtask_ids)
-            }
-        )
+        # 批量匯總在子任務結束時被喚醒，不佔用任務併發名額
+        self.batches[batch_id] = {
+            'subtask_ids': subtask_ids,
+            'futures': [self.task_done(task_id) for task_id in subtask_ids],
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'results': [],
+            'summary': None,
+            'created_at': datetime.now(),
+            'completed_at': None
+        }
+        self.batches[batch_id]['monitor'] = asyncio.create_task(self._monitor_batch(batch_id, subtask_ids))
         
         logger.info(f"已提交批量生成任務: {len(prompts)} 個提示詞 (批次ID: {batch_id[:8]}...)")
         return batch_id
@@ -479,65 +767,143 @@ class ImageGenerationProcessor(AsyncProcessor):
             'generation_time': 2.0
         }
     
+    @staticmethod
+    def _batch_item(task: AsyncTask) -> Dict[str, Any]:
+        """子任務的單項結果（寫入磁碟的結果為引用，可經 get_task_result 載入）"""
+        return {
+            'task_id': task.id,
+            'index': task.kwargs.get('index'),
+            'status': task.status.value,
+            'result': task.result if task.status == TaskStatus.COMPLETED else None,
+            'error': task.error
+        }
+    
     async def _monitor_batch(self, batch_id: str, subtask_ids: List[str]) -> Dict[str, Any]:
-        """監控批量任務進度"""
+        """按完成順序匯總批量任務結果（子任務結束時推送，無輪詢）"""
+        batch = self.batches[batch_id]
         total_tasks = len(subtask_ids)
         
-        while True:
-            completed = 0
-            failed = 0
-            
-            for task_id in subtask_ids:
-                task = self.tasks.get(task_id)
-                if task:
-                    if task.status == TaskStatus.COMPLETED:
-                        completed += 1
-                    elif task.status == TaskStatus.FAILED:
-                        failed += 1
-            
-            progress = (completed + failed) / total_tasks * 100
-            
-            # 更新批量任務進度
-            await self.update_task_progress(
-                batch_id, 
-                progress, 
-                f"已完成 {completed}/{total_tasks}，失敗 {failed}"
-            )
-            
-            # 檢查是否全部完成
-            if completed + failed >= total_tasks:
-                break
+        for future in asyncio.as_completed(batch['futures']):
+            task = await future
+            if task.status == TaskStatus.COMPLETED:
+                batch['completed'] += 1
+            elif task.status == TaskStatus.CANCELLED:
+                batch['cancelled'] += 1
+            else:
+                batch['failed'] += 1
             
-            await asyncio.sleep(1)
+            item = self._batch_item(task)
+            batch['results'].append(item)
+            for callback in self.task_callbacks['on_batch_progress']:
+                try:
+                    if asyncio.iscoroutinefunction(callback):
+                        await callback(batch_id, item)
+                    else:
+                        callback(batch_id, item)
+                except Exception as e:
+                    logger.error(f"回調函數執行失敗 (on_batch_progress): {e}")
+        
+        batch['completed_at'] = datetime.now()
+        batch['summary'] = {
+            'batch_id': batch_id,
+            'total_tasks': total_tasks,
+            'completed': batch['completed'],
+            'failed': batch['failed'],
+            'cancelled': batch['cancelled'],
+            'success_rate': batch['completed'] / max(total_tasks, 1) * 100
+        }
+        logger.info(f"批量生成完成: {batch_id[:8]}... 成功 {batch['completed']}/{total_tasks}")
+        return batch['summary']
+    
+    async def iter_batch_results(self, batch_id: str):
+        """
+        按完成順序逐項產出批次結果（已結束的子任務立即產出）
+        
+        Raises:
+            KeyError: 批次不存在
+        """
+        batch = self.batches[batch_id]
+        for future in asyncio.as_completed(batch['futures']):
+            yield self._batch_item(await future)
+    
+    async def wait_batch(self, batch_id: str) -> Dict[str, Any]:
+        """等待批次全部結束並返回匯總"""
+        return await asyncio.shield(self.batches[batch_id]['monitor'])
+    
+    def get_batch_status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """獲取批次進度與已完成的部分結果"""
+        batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
         
+        total_tasks = len(batch['subtask_ids'])
+        finished = batch['completed'] + batch['failed'] + batch['cancelled']
         return {
             'batch_id': batch_id,
             'total_tasks': total_tasks,
-            'completed': completed,
-            'failed': failed,
-            'success_rate': completed / total_tasks * 100
+            'completed': batch['completed'],
+            'failed': batch['failed'],
+            'cancelled': batch['cancelled'],
+            'progress': finished / max(total_tasks, 1) * 100,
+            'is_completed': batch['summary'] is not None,
+            'created_at': batch['created_at'].isoformat(),
+            'completed_at': batch['completed_at'].isoformat() if batch['completed_at'] else None,
+            'results': list(batch['results'])
         }
+    
+    def _sweep(self):
+        """淘汰過期任務，並移除完成時間超過保留期的批次記錄"""
+        super()._sweep()
+        cutoff = datetime.now() - timedelta(seconds=self.retention_seconds)
+        expired = [batch_id for batch_id, batch in self.batches.items()
+                   if batch['completed_at'] is not None and batch['completed_at'] < cutoff]
+        for batch_id in expired:
+            del self.batches[batch_id]
+    
+    async def stop_processor(self):
+        """停止處理器並結束等待中的批量匯總"""
+        await super().stop_processor()
+        for batch in self.batches.values():
+            if not batch['monitor'].done():
+                batch['monitor'].cancel()
+
+# 全局異步處理器實例（首次使用時建立，導入模組不會建立歸檔資料庫與結果目錄）
+_image_processor: Optional[ImageGenerationProcessor] = None
+_image_processor_lock = threading.Lock()
+
+def get_image_processor() -> ImageGenerationProcessor:
+    """獲取全局圖片生成處理器"""
+    global _image_processor
+    with _image_processor_lock:
+        if _image_processor is None:
+            _image_processor = ImageGenerationProcessor(archive=TaskArchive(), result_store=ResultStore())
+        return _image_processor
 
-# 全局異步處理器實例
-image_processor = ImageGenerationProcessor()
+def __getattr__(name: str):
+    """保留 `from services.async_processor import image_processor` 的舊用法（首次訪問時建立）"""
+    if name == 'image_processor':
+        return get_image_processor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # 便捷函數
 async def start_async_processing():
     """啟動異步處理"""
-    await image_processor.start_processor()
+    await get_image_processor().start_processor()
 
 async def stop_async_processing():
-    """停止異步處理"""
-    await image_processor.stop_processor()
+    """停止異步處理（處理器尚未建立時無需處理）"""
+    if _image_processor is not None:
+        await _image_processor.stop_processor()
 
 async def submit_image_generation(prompt: str, settings: Dict[str, Any]) -> str:
     """提交單個圖片生成任務"""
-    return await image_processor.create_and_submit_task(
+    processor = get_image_processor()
+    return await processor.create_and_submit_task(
         name=f"生成圖片: {prompt[:50]}...",
-        function=image_processor._generate_single_image,
+        function=processor._generate_single_image,
         prompt=prompt,
         settings=settings,
         batch_id=str(uuid.uuid4()),
         index=0,
-        metadata={'type': 'single_generation', 'prompt': prompt}
-    ) 
\ No newline at end of file
+        metadata={'type': 'single_generation', 'prompt': prompt, 'provider': settings.get('api_provider')}
+    )
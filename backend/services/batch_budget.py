@@ -0,0 +1,242 @@
+"""
+批量作業預算控制 v2.7
+調度前按預估成本為任務預留預算，任務結束後以實際成本結算；
+作業或用戶預算不足時拒絕預留，由 BatchProcessor 暫停作業
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class BudgetManager:
+    """作業與用戶預算的預留 / 結算管理"""
+
+    def __init__(self, cost_history: Optional[Callable[[str], Optional[float]]] = None,
+                 spend_history: Optional[Callable[[int], float]] = None,
+                 default_cost: float = 0.0, history_ttl: float = 300.0):
+        """
+        Args:
+            cost_history: 按平台查詢歷史平均單次成本的函數（如 APIKeyManager.get_average_request_cost）
+            spend_history: 按用戶查詢當日已記錄花費的函數（如 APIKeyManager.get_user_spend），
+                用於設定用戶預算時的初始已用額度
+            default_cost: 沒有任何成本資訊時的預估單次成本
+            history_ttl: 歷史平均成本的快取秒數
+        """
+        self.cost_history = cost_history
+        self.spend_history = spend_history
+        self.default_cost = default_cost
+        self.history_ttl = history_ttl
+        self.lock = threading.Lock()
+
+        self.jobs: Dict[str, Dict[str, float]] = {}   # 作業ID -> limit / reserved / spent
+        self.users: Dict[Any, Dict[str, float]] = {}  # 用戶ID -> limit / reserved / spent
+        self.job_users: Dict[str, Any] = {}
+
+        self.observed: Dict[str, Dict[str, float]] = {}  # 成本鍵 -> count / mean
+        self._history_cache: Dict[str, tuple] = {}       # 平台 -> (查詢時間, 平均成本)
+        self._history_pending: Set[str] = set()          # 正在背景查詢的平台
+        self._history_executor: Optional[ThreadPoolExecutor] = None
+        self.stats = {
+            "reservations": 0,
+            "rejections": 0,
+            "reserved_total": 0.0,
+            "actual_total": 0.0
+        }
+
+    # 預算設定
+
+    def register_job(self, job_id: str, budget: Optional[float] = None,
+                     user_id: Any = None, spent: float = 0.0):
+        """登記作業預算（budget 為 None 表示不限）"""
+        with self.lock:
+            self.jobs[job_id] = {"limit": budget, "reserved": 0.0, "spent": spent}
+            if user_id is not None:
+                self.job_users[job_id] = user_id
+
+    def set_job_budget(self, job_id: str, budget: Optional[float]):
+        """調整作業預算（可用於追加預算後恢復作業）"""
+        with self.lock:
+            entry = self.jobs.setdefault(job_id, {"limit": None, "reserved": 0.0, "spent": 0.0})
+            entry["limit"] = budget
+
+    def set_user_budget(self, user_id: Any, budget: Optional[float]):
+        """設定用戶預算；初始已用額度取自當日已記錄的花費"""
+        spent = 0.0
+        if budget is not None and self.spend_history is not None:
+            try:
+                spent = float(self.spend_history(user_id) or 0.0)
+            except Exception as e:
+                logger.warning(f"查詢用戶花費失敗 {user_id}: {str(e)}")
+        with self.lock:
+            if budget is None:
+                self.users.pop(user_id, None)
+                return
+            entry = self.users.setdefault(user_id, {"limit": budget, "reserved": 0.0, "spent": spent})
+            entry["limit"] = budget
+
+    def remove_job(self, job_id: str):
+        """移除作業的預算記錄"""
+        with self.lock:
+            self.jobs.pop(job_id, None)
+            self.job_users.pop(job_id, None)
+
+    # 成本估計
+
+    @staticmethod
+    def _cost_key(task_type: str, data: Dict[str, Any]) -> str:
+        provider = data.get("api_provider") or data.get("provider") or ""
+        return f"{task_type}:{provider}"
+
+    def estimate(self, task_type: str, data: Dict[str, Any]) -> float:
+        """
+        預估單個任務的成本
+
+        依序使用：任務資料的 estimated_cost、本進程觀測到的實際平均成本、
+        平台的歷史平均單次成本、default_cost。
+        調度器在事件循環線程上調用此方法，因此只讀取快取；歷史成本過期或缺失時
+        在背景線程中刷新，本次先使用舊值（沒有舊值時使用 default_cost）。
+        """
+        if data.get("estimated_cost") is not None:
+            return float(data["estimated_cost"])
+
+        provider = data.get("api_provider") or data.get("provider")
+        with self.lock:
+            observed = self.observed.get(self._cost_key(task_type, data))
+            if observed is not None:
+                return observed["mean"]
+            cached = self._history_cache.get(provider) if provider else None
+
+        if provider and self.cost_history is not None:
+            if cached is None or time.time() - cached[0] > self.history_ttl:
+                self.prefetch_history([provider])
+            if cached is not None and cached[1] is not None:
+                return cached[1]
+
+        return self.default_cost
+
+    def prefetch_history(self, providers: Iterable[str]) -> List[Future]:
+        """
+        在背景線程中刷新平台的歷史平均成本（同一平台同時只有一個查詢）
+
+        建立作業時調用，讓首批任務調度時已有歷史成本可用。
+
+        Returns:
+            List[Future]: 本次新提交的查詢
+        """
+        if self.cost_history is None:
+            return []
+        futures = []
+        with self.lock:
+            for provider in set(providers):
+                if not provider or provider in self._history_pending:
+                    continue
+                cached = self._history_cache.get(provider)
+                if cached is not None and time.time() - cached[0] <= self.history_ttl:
+                    continue
+                if self._history_executor is None:
+                    self._history_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="budget-history")
+                self._history_pending.add(provider)
+                futures.append(self._history_executor.submit(self._refresh_history, provider))
+        return futures
+
+    def _refresh_history(self, provider: str):
+        """查詢歷史平均成本（在背景線程中執行，查詢期間不持有鎖）"""
+        try:
+            average = self.cost_history(provider)
+        except Exception as e:
+            logger.warning(f"查詢歷史成本失敗 {provider}: {str(e)}")
+            average = None
+        with self.lock:
+            self._history_cache[provider] = (time.time(), average)
+            self._history_pending.discard(provider)
+
+    # 預留與結算
+
+    @staticmethod
+    def _available(entry: Optional[Dict[str, float]], amount: float) -> bool:
+        if entry is None or entry["limit"] is None:
+            return True
+        committed = entry["spent"] + entry["reserved"]
+        return committed < entry["limit"] and committed + amount <= entry["limit"]
+
+    def reserve(self, job_id: str, amount: float) -> bool:
+        """
+        為任務預留預算
+
+        Returns:
+            bool: 作業與用戶預算均足夠時返回 True
+        """
+        with self.lock:
+            job_entry = self.jobs.get(job_id)
+            user_entry = self.users.get(self.job_users.get(job_id))
+            if not (self._available(job_entry, amount) and self._available(user_entry, amount)):
+                self.stats["rejections"] += 1
+                return False
+            for entry in (job_entry, user_entry):
+                if entry is not None:
+                    entry["reserved"] += amount
+            self.stats["reservations"] += 1
+            self.stats["reserved_total"] += amount
+            return True
+
+    def reconcile(self, job_id: str, reserved: float, actual: float,
+                  task_type: Optional[str] = None, data: Optional[Dict[str, Any]] = None):
+        """以實際成本結算預留，並更新成本估計"""
+        with self.lock:
+            for entry in (self.jobs.get(job_id), self.users.get(self.job_users.get(job_id))):
+                if entry is not None:
+                    entry["reserved"] = max(0.0, entry["reserved"] - reserved)
+                    entry["spent"] += actual
+            self.stats["actual_total"] += actual
+
+            if task_type is not None and actual > 0:
+                key = self._cost_key(task_type, data or {})
+                observed = self.observed.setdefault(key, {"count": 0, "mean": 0.0})
+                observed["count"] += 1
+                observed["mean"] += (actual - observed["mean"]) / observed["count"]
+
+    def is_exhausted(self, job_id: str) -> bool:
+        """作業或用戶預算是否已用盡"""
+        with self.lock:
+            job_entry = self.jobs.get(job_id)
+            user_entry = self.users.get(self.job_users.get(job_id))
+            return not (self._available(job_entry, 0.0) and self._available(user_entry, 0.0))
+
+    def get_job_budget(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """獲取作業預算狀態"""
+        with self.lock:
+            entry = self.jobs.get(job_id)
+            if entry is None:
+                return None
+            return {
+                "limit": entry["limit"],
+                "reserved": round(entry["reserved"], 4),
+                "spent": round(entry["spent"], 4),
+                "user_id": self.job_users.get(job_id)
+            }
+
+    def get_user_budget(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        """獲取用戶預算狀態"""
+        with self.lock:
+            entry = self.users.get(user_id)
+            if entry is None:
+                return None
+            return {
+                "limit": entry["limit"],
+                "reserved": round(entry["reserved"], 4),
+                "spent": round(entry["spent"], 4)
+            }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取預算統計"""
+        with self.lock:
+            return {
+                **self.stats,
+                "budgeted_jobs": sum(1 for entry in self.jobs.values() if entry["limit"] is not None),
+                "budgeted_users": len(self.users),
+                "observed_costs": {key: round(value["mean"], 4) for key, value in self.observed.items()}
+            }
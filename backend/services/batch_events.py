@@ -0,0 +1,238 @@
+"""
+批量作業事件廣播 v2.7
+將 BatchProcessor 的進度與完成回調轉換為 Server-Sent Events，
+提供有界的訂閱者緩衝、進度合併與 Last-Event-ID 續傳；
+多工作進程部署時經轉發通道（如 Redis pub/sub）交換各進程的事件
+"""
+
+import json
+import time
+import uuid
+import logging
+import threading
+import itertools
+from collections import deque, OrderedDict
+from typing import Dict, List, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+# 跨進程轉發批量事件的頻道
+BATCH_EVENTS_CHANNEL = 'batch:events'
+
+class BatchEvent:
+    """單條批量事件"""
+
+    __slots__ = ("id", "event", "job_id", "key", "data")
+
+    def __init__(self, event_id: int, event: str, job_id: str, key: str, data: Dict[str, Any]):
+        self.id = event_id
+        self.event = event
+        self.job_id = job_id
+        self.key = key  # 合併鍵：相同鍵的未送達事件只保留最新一條
+        self.data = data
+
+    def to_sse(self) -> str:
+        """格式化為 SSE 訊息"""
+        payload = json.dumps(self.data, ensure_ascii=False, default=str)
+        return f"id: {self.id}\nevent: {self.event}\ndata: {payload}\n\n"
+
+class EventSubscription:
+    """單個訂閱者的有界事件緩衝"""
+
+    def __init__(self, job_id: Optional[str], max_buffer: int):
+        self.job_id = job_id  # None 表示訂閱全部作業
+        self.max_buffer = max_buffer
+        self.pending: "OrderedDict[str, BatchEvent]" = OrderedDict()
+        self.overflowed = False
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def matches(self, event: BatchEvent) -> bool:
+        return self.job_id is None or self.job_id == event.job_id
+
+    def push(self, event: BatchEvent):
+        """放入事件；同鍵事件合併，緩衝滿時丟棄最舊事件並標記需重新同步"""
+        with self.condition:
+            if event.key in self.pending:
+                del self.pending[event.key]
+            self.pending[event.key] = event
+            if len(self.pending) > self.max_buffer:
+                self.pending.popitem(last=False)
+                self.overflowed = True
+            self.condition.notify()
+
+    def get(self, timeout: float) -> List[BatchEvent]:
+        """等待並取出所有待送事件，超時返回空列表"""
+        with self.condition:
+            if not self.pending and not self.closed:
+                self.condition.wait(timeout)
+            events = list(self.pending.values())
+            self.pending.clear()
+            return events
+
+    def take_overflow(self) -> bool:
+        """取得並重置溢出標記"""
+        with self.condition:
+            overflowed, self.overflowed = self.overflowed, False
+            return overflowed
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+class BatchEventBroker:
+    """
+    批量作業事件廣播器
+
+    事件只在發布的進程內產生；多個工作進程各自執行不同的作業，
+    需提供轉發通道（publish/subscribe 介面，如 cache_service.RedisInvalidationBus）
+    才能讓任一進程的訂閱者收到所有進程的事件。事件ID由各進程獨立編號，
+    客戶端重連到其他進程時若 Last-Event-ID 不在本進程範圍內會收到 resync。
+    """
+
+    def __init__(self, history_size: int = 2000, max_subscriber_buffer: int = 500,
+                 heartbeat_seconds: float = 15.0, relay=None):
+        """
+        Args:
+            history_size: 保留用於 Last-Event-ID 續傳的最近事件數
+            max_subscriber_buffer: 每個訂閱者最多緩衝的未送達事件數
+            heartbeat_seconds: 無事件時發送心跳的間隔
+            relay: 跨進程轉發通道，None 表示只廣播本進程的事件
+        """
+        self.history: deque = deque(maxlen=history_size)
+        self.max_subscriber_buffer = max_subscriber_buffer
+        self.heartbeat_seconds = heartbeat_seconds
+        self.subscriptions: List[EventSubscription] = []
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.instance_id = uuid.uuid4().hex
+        self.relay = None
+        self.stats = {
+            "published_events": 0,
+            "relayed_events": 0,
+            "subscriber_overflows": 0
+        }
+        if relay is not None:
+            self.attach_relay(relay)
+
+    def attach_relay(self, relay):
+        """設置跨進程轉發通道：本進程的事件轉發至通道，其他進程的事件廣播給本地訂閱者"""
+        self.relay = relay
+        relay.subscribe(self._on_relayed_event)
+
+    def _on_relayed_event(self, message: Dict[str, Any]):
+        """處理其他進程轉發的事件（忽略本進程發出的事件）"""
+        if message.get("origin") == self.instance_id:
+            return
+        self.stats["relayed_events"] += 1
+        self._publish(message["event"], message["job_id"], message["key"], message["data"], forward=False)
+
+    def attach(self, batch_processor):
+        """註冊到 BatchProcessor 的進度與完成回調"""
+        batch_processor.add_progress_callback(lambda task: self.publish_task(batch_processor, task))
+        batch_processor.add_completion_callback(self.publish_job)
+
+    def publish_task(self, batch_processor, task):
+        """發布任務進度事件（包含所屬作業的 O(1) 進度摘要）"""
+        job_id = batch_processor._job_id_of(task)
+        job = batch_processor.jobs.get(job_id)
+        data = {
+            "job_id": job_id,
+            "task_id": task.id,
+            "status": task.status.value,
+            "progress": round(task.progress, 2),
+            "retry_count": task.retry_count,
+            "error": task.error
+        }
+        if job is not None:
+            data["job_status"] = job.status.value
+            # 按狀態直方圖計算：狀態轉換時作業進度欄位尚未刷新
+            completed = job.task_counts["completed"]
+            data["job_progress"] = round(completed / len(job.tasks) * 100, 2) if job.tasks else round(job.progress, 2)
+            data["task_statistics"] = dict(job.task_counts)
+        self._publish("task", job_id, f"task:{task.id}", data)
+
+    def publish_job(self, job):
+        """發布作業結束事件"""
+        self._publish("job", job.id, f"job:{job.id}", {
+            "job_id": job.id,
+            "name": job.name,
+            "status": job.status.value,
+            "progress": round(job.progress, 2),
+            "task_statistics": dict(job.task_counts),
+            "completed_at": job.completed_at.isoformat() if job.completed_at else None
+        })
+
+    def _publish(self, event_type: str, job_id: str, key: str, data: Dict[str, Any], forward: bool = True):
+        with self.lock:
+            event = BatchEvent(next(self._ids), event_type, job_id, key, data)
+            self.history.append(event)
+            subscriptions = list(self.subscriptions)
+            self.stats["published_events"] += 1
+
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                subscription.push(event)
+
+        if forward and self.relay is not None:
+            self.relay.publish({"origin": self.instance_id, "event": event_type,
+                                "job_id": job_id, "key": key, "data": data})
+
+    def subscribe(self, job_id: Optional[str] = None,
+                  last_event_id: Optional[int] = None) -> EventSubscription:
+        """
+        建立訂閱
+
+        Args:
+            job_id: 只接收該作業的事件，None 表示全部作業
+            last_event_id: 客戶端最後收到的事件ID，用於補發錯過的事件
+        """
+        subscription = EventSubscription(job_id, self.max_subscriber_buffer)
+        with self.lock:
+            if last_event_id is not None:
+                oldest_id = self.history[0].id if self.history else None
+                newest_id = self.history[-1].id if self.history else 0
+                if (oldest_id is not None and last_event_id < oldest_id - 1) or last_event_id > newest_id:
+                    # 錯過的事件已不在歷史中（或ID來自其他進程），通知客戶端重新同步
+                    subscription.overflowed = True
+                for event in self.history:
+                    if event.id > last_event_id and subscription.matches(event):
+                        subscription.push(event)
+            self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: EventSubscription):
+        """取消訂閱"""
+        subscription.close()
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+
+    def stream(self, subscription: EventSubscription):
+        """SSE 生成器；客戶端斷開時自動取消訂閱"""
+        try:
+            yield "retry: 3000\n\n"
+            while not subscription.closed:
+                if subscription.take_overflow():
+                    self.stats["subscriber_overflows"] += 1
+                    yield f"event: resync\ndata: {json.dumps({'job_id': subscription.job_id})}\n\n"
+
+                events = subscription.get(self.heartbeat_seconds)
+                if not events:
+                    yield f": keep-alive {int(time.time())}\n\n"
+                    continue
+                for event in events:
+                    yield event.to_sse()
+        finally:
+            self.unsubscribe(subscription)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取廣播統計"""
+        with self.lock:
+            return {
+                **self.stats,
+                "subscribers": len(self.subscriptions),
+                "history_size": len(self.history),
+                "last_event_id": self.history[-1].id if self.history else 0
+            }
@@ -0,0 +1,127 @@
+"""
+批量作業串流匯入 v2.7
+以惰性方式解析 JSONL / CSV 提示詞檔案，逐行產生任務定義
+"""
+
+import io
+import os
+import csv
+import json
+import logging
+from typing import Dict, Iterator, List, Optional, Union, IO
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ("jsonl", "csv")
+
+# CSV 中映射到任務欄位的列，其餘列放入任務資料
+_TASK_FIELD_COLUMNS = ("type", "priority", "max_retries", "timeout", "dependencies", "deadline")
+
+class IngestError(ValueError):
+    """匯入來源或格式錯誤"""
+
+def detect_format(filename: str, declared: Optional[str] = None) -> str:
+    """根據聲明或副檔名判斷檔案格式"""
+    fmt = (declared or os.path.splitext(filename or "")[1].lstrip(".")).lower()
+    if fmt in ("ndjson", "json"):
+        fmt = "jsonl"
+    if fmt not in SUPPORTED_FORMATS:
+        raise IngestError(f"不支援的匯入格式: {fmt or '未知'}，支援: {', '.join(SUPPORTED_FORMATS)}")
+    return fmt
+
+def _normalize_record(record: Dict, default_task_type: str) -> Dict:
+    """將一行資料轉換為 create_job 使用的任務定義"""
+    if "data" in record and isinstance(record["data"], dict):
+        task = dict(record)
+    else:
+        task = {key: record[key] for key in _TASK_FIELD_COLUMNS if key in record}
+        task["data"] = {key: value for key, value in record.items() if key not in _TASK_FIELD_COLUMNS}
+    task.setdefault("type", default_task_type)
+    return task
+
+def _parse_csv_row(row: Dict[str, str]) -> Dict:
+    """轉換 CSV 行中的數值與依賴欄位"""
+    record = {key: value for key, value in row.items() if key is not None and value not in (None, "")}
+    for key in ("priority", "max_retries", "timeout"):
+        if key in record:
+            record[key] = int(record[key])
+    if "dependencies" in record:
+        record["dependencies"] = [
+            int(dep) if dep.strip().isdigit() else dep.strip()
+            for dep in record["dependencies"].split(";") if dep.strip()
+        ]
+    return record
+
+def iter_task_records(source: Union[str, IO], fmt: str,
+                      default_task_type: str = "image_generation",
+                      stats: Optional[Dict[str, int]] = None,
+                      with_line_numbers: bool = False) -> Iterator:
+    """
+    惰性解析匯入來源
+
+    Args:
+        source: 檔案路徑或已開啟的檔案物件（文字或二進位）
+        fmt: jsonl 或 csv
+        default_task_type: 記錄未指定 type 時使用的任務類型
+        stats: 可選的統計字典，累計 parsed / skipped 行數
+        with_line_numbers: 產生 (來源行號, 任務定義)，用於回報無效的行
+
+    Yields:
+        Dict: 任務定義（with_line_numbers 時為 (int, Dict)）
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault("parsed", 0)
+    stats.setdefault("skipped", 0)
+
+    owns_handle = isinstance(source, str)
+    handle = open(source, "r", encoding="utf-8", newline="") if owns_handle else source
+    if isinstance(handle, (io.BufferedIOBase, io.RawIOBase)) or "b" in getattr(handle, "mode", ""):
+        handle = io.TextIOWrapper(handle, encoding="utf-8", newline="")
+
+    try:
+        if fmt == "jsonl":
+            for line_number, line in enumerate(handle, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                    if not isinstance(record, dict):
+                        raise ValueError("每行必須是 JSON 物件")
+                except ValueError as e:
+                    stats["skipped"] += 1
+                    logger.warning(f"略過無效的 JSONL 行 {line_number}: {str(e)}")
+                    continue
+                stats["parsed"] += 1
+                task = _normalize_record(record, default_task_type)
+                yield (line_number, task) if with_line_numbers else task
+
+        elif fmt == "csv":
+            for line_number, row in enumerate(csv.DictReader(handle), 2):
+                try:
+                    record = _parse_csv_row(row)
+                except ValueError as e:
+                    stats["skipped"] += 1
+                    logger.warning(f"略過無效的 CSV 行 {line_number}: {str(e)}")
+                    continue
+                stats["parsed"] += 1
+                task = _normalize_record(record, default_task_type)
+                yield (line_number, task) if with_line_numbers else task
+
+        else:
+            raise IngestError(f"不支援的匯入格式: {fmt}")
+    finally:
+        if owns_handle:
+            handle.close()
+
+def iter_chunks(records: Iterator[Dict], chunk_size: int) -> Iterator[List[Dict]]:
+    """將記錄流切分為固定大小的塊"""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
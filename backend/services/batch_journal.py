@@ -0,0 +1,250 @@
+"""
+批量作業日誌 v2.7
+以 SQLite (WAL 模式) 保存批量作業與任務狀態轉換的追加式日誌，
+支援分組提交、啟動時重放恢復與日誌壓縮
+"""
+
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Any
+
+from .sqlite_writer import SQLiteBatchWriter, default_db_path
+
+logger = logging.getLogger(__name__)
+
+# 日誌事件類型
+EVENT_JOB_CREATED = "job_created"
+EVENT_JOB_STATUS = "job_status"
+EVENT_TASK_CREATED = "task_created"
+EVENT_TASK_STATUS = "task_status"
+EVENT_JOB_INGEST = "job_ingest"
+
+class BatchJournal(SQLiteBatchWriter):
+    """批量作業追加式日誌"""
+
+    description = "批量作業日誌"
+
+    def __init__(self, db_path: str = None, max_batch_size: int = 500):
+        """
+        初始化日誌
+
+        Args:
+            db_path: 資料庫路徑，預設為項目根目錄下 data/batch_journal.db
+            max_batch_size: 單次分組提交的最大記錄數
+        """
+        super().__init__(db_path or default_db_path('batch_journal.db'), max_batch_size,
+                         thread_name="BatchJournalWriter")
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        """初始化日誌表結構"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS batch_journal (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                task_id TEXT,
+                event TEXT NOT NULL,
+                status TEXT,
+                payload TEXT,
+                created_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_batch_journal_job ON batch_journal(job_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_batch_journal_task ON batch_journal(task_id, event)')
+        # 作業租約：多個工作進程共用日誌時，每個作業只由持有未過期租約的進程載入與執行
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS batch_job_leases (
+                job_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_batch_job_leases_owner ON batch_job_leases(owner, expires_at)')
+
+    # ------------------------------------------------------------------
+    # 寫入（熱路徑，僅入隊）
+    # ------------------------------------------------------------------
+
+    def append(self, event: str, job_id: str, task_id: Optional[str] = None,
+               status: Optional[str] = None, payload: Optional[Dict[str, Any]] = None):
+        """追加一條日誌記錄（非阻塞）"""
+        self._enqueue_row((job_id, task_id, event, status, payload, time.time()))
+
+    def append_many(self, records: List[tuple]):
+        """
+        批量追加日誌記錄（非阻塞）
+
+        Args:
+            records: (event, job_id, task_id, status, payload) 元組列表
+        """
+        now = time.time()
+        for event, job_id, task_id, status, payload in records:
+            self._enqueue_row((job_id, task_id, event, status, payload, now))
+
+    def remove_job(self, job_id: str):
+        """刪除作業的全部日誌記錄"""
+        self._enqueue("remove_job", job_id)
+
+    def compact(self, timeout: float = 60.0) -> int:
+        """
+        壓縮日誌：每個任務及作業只保留最新的狀態記錄
+
+        Returns:
+            int: 被刪除的記錄數，超時返回 -1
+        """
+        done = threading.Event()
+        result = {"deleted": -1}
+        self._enqueue("compact", (done, result))
+        done.wait(timeout)
+        return result["deleted"]
+
+    # ------------------------------------------------------------------
+    # 背景寫入線程
+    # ------------------------------------------------------------------
+
+    def _write_rows(self, conn: sqlite3.Connection, rows: List[tuple]):
+        """寫入追加記錄"""
+        conn.executemany('''
+            INSERT INTO batch_journal (job_id, task_id, event, status, payload, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(job_id, task_id, event, status,
+               json.dumps(payload, ensure_ascii=False, default=str) if payload is not None else None,
+               created_at)
+              for job_id, task_id, event, status, payload, created_at in rows])
+
+    def _apply_op(self, conn: sqlite3.Connection, kind: str, arg: Any, waiters: List[threading.Event]):
+        if kind == "remove_job":
+            conn.execute('DELETE FROM batch_journal WHERE job_id = ?', (arg,))
+            conn.execute('DELETE FROM batch_job_leases WHERE job_id = ?', (arg,))
+        elif kind == "compact":
+            conn.commit()
+            done, result = arg
+            result["deleted"] = self._compact(conn)
+            waiters.append(done)
+        else:
+            super()._apply_op(conn, kind, arg, waiters)
+
+    def _compact(self, conn: sqlite3.Connection) -> int:
+        """刪除被後續狀態覆蓋的記錄並截斷 WAL"""
+        cursor = conn.execute('''
+            DELETE FROM batch_journal
+            WHERE (event = ? AND seq NOT IN (
+                      SELECT MAX(seq) FROM batch_journal WHERE event = ? GROUP BY task_id))
+               OR (event = ? AND seq NOT IN (
+                      SELECT MAX(seq) FROM batch_journal WHERE event = ? GROUP BY job_id))
+               OR (event = ? AND seq NOT IN (
+                      SELECT MAX(seq) FROM batch_journal WHERE event = ? GROUP BY job_id))
+        ''', (EVENT_TASK_STATUS, EVENT_TASK_STATUS, EVENT_JOB_STATUS, EVENT_JOB_STATUS,
+              EVENT_JOB_INGEST, EVENT_JOB_INGEST))
+        deleted = cursor.rowcount
+        conn.commit()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        logger.info(f"批量作業日誌壓縮完成，刪除 {deleted} 條記錄")
+        return deleted
+
+    # ------------------------------------------------------------------
+    # 作業租約（直接寫入，不經分組提交隊列）
+    # ------------------------------------------------------------------
+
+    def claim_jobs(self, job_ids: List[str], owner: str, ttl: float) -> List[str]:
+        """
+        為作業取得租約：沒有租約、租約已過期或已由 owner 持有的作業可被取得
+
+        多個進程同時調用時由 SQLite 寫鎖串行化，每個作業只會被一個進程取得。
+
+        Returns:
+            List[str]: 成功取得租約的作業ID
+        """
+        if not job_ids:
+            return []
+        now = time.time()
+        claimed = []
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for job_id in job_ids:
+                cursor = conn.execute('''
+                    INSERT INTO batch_job_leases (job_id, owner, expires_at) VALUES (?, ?, ?)
+                    ON CONFLICT(job_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                    WHERE batch_job_leases.expires_at < ? OR batch_job_leases.owner = excluded.owner
+                ''', (job_id, owner, now + ttl, now))
+                if cursor.rowcount:
+                    claimed.append(job_id)
+            conn.commit()
+        finally:
+            conn.close()
+        return claimed
+
+    def renew_leases(self, owner: str, ttl: float) -> int:
+        """延長 owner 持有的全部租約，返回續約的作業數"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute('UPDATE batch_job_leases SET expires_at = ? WHERE owner = ?',
+                                  (time.time() + ttl, owner))
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def has_expired_leases(self, owner: str) -> bool:
+        """是否有其他進程的過期租約（持有者可能已中斷，其作業等待接管）"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT 1 FROM batch_job_leases WHERE expires_at < ? AND owner != ? LIMIT 1',
+                               (time.time(), owner)).fetchone()
+        finally:
+            conn.close()
+        return row is not None
+
+    # ------------------------------------------------------------------
+    # 重放
+    # ------------------------------------------------------------------
+
+    def load(self) -> List[Dict[str, Any]]:
+        """
+        重放日誌，重建每個作業的最新狀態
+
+        Returns:
+            List[Dict]: 按創建順序排列的作業快照，每個快照包含
+                job（作業配置）、status、started_at、completed_at、ingest
+                （串流匯入的最新進度，非串流作業為 None）與 tasks（任務定義及其最新狀態）
+        """
+        self.flush()
+        jobs: Dict[str, Dict[str, Any]] = {}
+
+        conn = self._connect()
+        try:
+            cursor = conn.execute('''
+                SELECT job_id, task_id, event, status, payload
+                FROM batch_journal ORDER BY seq
+            ''')
+            for job_id, task_id, event, status, payload in cursor:
+                data = json.loads(payload) if payload else {}
+
+                if event == EVENT_JOB_CREATED:
+                    jobs[job_id] = {"job_id": job_id, "job": data, "status": "pending",
+                                    "started_at": None, "completed_at": None, "ingest": None, "tasks": {}}
+                    continue
+
+                job = jobs.get(job_id)
+                if job is None:
+                    continue
+
+                if event == EVENT_JOB_STATUS:
+                    job["status"] = status
+                    job["started_at"] = data.get("started_at")
+                    job["completed_at"] = data.get("completed_at")
+                elif event == EVENT_JOB_INGEST:
+                    job["ingest"] = data
+                elif event == EVENT_TASK_CREATED:
+                    job["tasks"][task_id] = {"task_id": task_id, "definition": data,
+                                             "status": "pending", "state": {}}
+                elif event == EVENT_TASK_STATUS and task_id in job["tasks"]:
+                    job["tasks"][task_id]["status"] = status
+                    job["tasks"][task_id]["state"] = data
+        finally:
+            conn.close()
+
+        return list(jobs.values())
@@ -4,21 +4,44 @@
 """
 
 import asyncio
+import contextvars
+import functools
+import os
+import sys
 import time
 import logging
 import json
 import uuid
+import socket
 from typing import Dict, List, Optional, Callable, Any
 from datetime import datetime, timedelta
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from enum import Enum
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import queue
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from collections import deque
+import itertools
 import heapq
 
+from .batch_ingest import iter_task_records, iter_chunks
+from .task_storage import PayloadStore
+from .singleflight import AsyncSingleFlight, generation_request_key
+from .process_lane import export_payload, release_segments, run_in_process
+from .task_cost import bind_task, unbind_task, result_cost
+from .deadline_scheduling import NO_DEADLINE, InvalidDeadlineError, TaskDurationEstimator, parse_deadline
+from .batch_budget import BudgetManager
+from .adaptive_limiter import AdaptiveLimiter, AdaptiveLimiterRegistry, provider_limiters
+from .result_store import REF_KEY as RESULT_REF_KEY, ResultStore
+from .retry_policy import RetryPolicy, RetryDelayStats, get_retry_after
+from .batch_journal import (
+    BatchJournal, EVENT_JOB_CREATED, EVENT_JOB_INGEST, EVENT_JOB_STATUS, EVENT_TASK_CREATED, EVENT_TASK_STATUS
+)
+
 logger = logging.getLogger(__name__)
 
+# 串流匯入時保留明細的被拒絕行數上限
+MAX_REJECTED_ROWS = 100
+
 class TaskStatus(Enum):
     """任務狀態枚舉"""
     PENDING = "pending"
@@ -36,30 +59,112 @@ class TaskPriority(Enum):
     HIGH = 3
     URGENT = 4
 
-@dataclass
+class InvalidTaskError(ValueError):
+    """任務定義無效（優先級、重試次數、超時或依賴格式錯誤）"""
+
+class ExecutionLane(Enum):
+    """任務處理器執行通道"""
+    ASYNC = "async"      # 事件循環內的協程（I/O 密集）
+    THREAD = "thread"    # 線程池中的同步函數（阻塞 I/O）
+    PROCESS = "process"  # 進程池中的同步函數（CPU 密集，繞過 GIL）
+
 class BatchTask:
-    """批量任務資料結構"""
-    id: str
-    task_type: str  # image_generation, prompt_optimization, etc.
-    data: Dict[str, Any]
-    priority: TaskPriority = TaskPriority.NORMAL
-    status: TaskStatus = TaskStatus.PENDING
-    created_at: datetime = None
-    started_at: Optional[datetime] = None
-    completed_at: Optional[datetime] = None
-    result: Optional[Dict] = None
-    error: Optional[str] = None
-    progress: float = 0.0
-    retry_count: int = 0
-    max_retries: int = 3
-    timeout_seconds: int = 300
-    dependencies: List[str] = None  # 依賴的任務ID列表
+    """
+    批量任務資料結構
     
-    def __post_init__(self):
-        if self.created_at is None:
-            self.created_at = datetime.now()
-        if self.dependencies is None:
-            self.dependencies = []
+    為降低大型作業的記憶體佔用：使用 __slots__，時間戳以 epoch 浮點數保存
+    （created_at / started_at / completed_at 提供 datetime 視圖），任務類型被 intern，
+    依賴以 tuple 保存；提供 payload_store 時任務資料只保存於作業的 PayloadStore 中，
+    每次訪問 data 都會重新解碼，熱路徑應讀取一次後傳遞。
+    """
+    
+    __slots__ = ("id", "task_type", "_data", "_payload_store", "priority", "status",
+                 "created_ts", "started_ts", "completed_ts", "result", "error",
+                 "progress", "retry_count", "max_retries", "timeout_seconds", "dependencies", "cost",
+                 "deadline_ts")
+    
+    def __init__(self, id: str, task_type: str, data: Dict[str, Any],
+                 priority: TaskPriority = TaskPriority.NORMAL,
+                 status: TaskStatus = TaskStatus.PENDING,
+                 created_at: Optional[datetime] = None,
+                 started_at: Optional[datetime] = None,
+                 completed_at: Optional[datetime] = None,
+                 result: Optional[Dict] = None,
+                 error: Optional[str] = None,
+                 progress: float = 0.0,
+                 retry_count: int = 0,
+                 max_retries: int = 3,
+                 timeout_seconds: int = 300,
+                 dependencies: Optional[List[str]] = None,  # 依賴的任務ID列表（創建時可用作業內索引）
+                 payload_store: Optional[PayloadStore] = None,
+                 cost: float = 0.0,  # 處理器經 record_task_cost 回報的累計費用
+                 deadline: Optional[datetime] = None):
+        self.id = id
+        self.task_type = sys.intern(task_type)
+        self._payload_store = None
+        self._data = data
+        if payload_store is not None:
+            try:
+                self._data = payload_store.add(data)
+                self._payload_store = payload_store
+            except (TypeError, ValueError):
+                pass  # 無法 JSON 編碼的資料保留原樣
+        self.priority = priority
+        self.status = status
+        self.created_ts = created_at.timestamp() if created_at else time.time()
+        self.started_ts = started_at.timestamp() if started_at else None
+        self.completed_ts = completed_at.timestamp() if completed_at else None
+        self.result = result
+        self.error = error
+        self.progress = progress
+        self.retry_count = retry_count
+        self.max_retries = max_retries
+        self.timeout_seconds = timeout_seconds
+        self.dependencies = tuple(dependencies) if dependencies else ()
+        self.cost = cost
+        self.deadline_ts = deadline.timestamp() if deadline else None
+    
+    @property
+    def data(self) -> Dict[str, Any]:
+        if self._payload_store is not None:
+            return self._payload_store.get(self._data)
+        return self._data
+    
+    @data.setter
+    def data(self, value: Dict[str, Any]):
+        self._payload_store = None
+        self._data = value
+    
+    @property
+    def deadline(self) -> Optional[datetime]:
+        return datetime.fromtimestamp(self.deadline_ts) if self.deadline_ts is not None else None
+    
+    @property
+    def created_at(self) -> datetime:
+        return datetime.fromtimestamp(self.created_ts)
+    
+    @created_at.setter
+    def created_at(self, value: datetime):
+        self.created_ts = value.timestamp()
+    
+    @property
+    def started_at(self) -> Optional[datetime]:
+        return datetime.fromtimestamp(self.started_ts) if self.started_ts is not None else None
+    
+    @started_at.setter
+    def started_at(self, value: Optional[datetime]):
+        self.started_ts = value.timestamp() if value else None
+    
+    @property
+    def completed_at(self) -> Optional[datetime]:
+        return datetime.fromtimestamp(self.completed_ts) if self.completed_ts is not None else None
+    
+    @completed_at.setter
+    def completed_at(self, value: Optional[datetime]):
+        self.completed_ts = value.timestamp() if value else None
+    
+    def __repr__(self) -> str:
+        return f"BatchTask(id={self.id!r}, task_type={self.task_type!r}, status={self.status.value})"
 
 @dataclass 
 class BatchJob:
@@ -75,39 +180,297 @@ class BatchJob:
     concurrent_limit: int = 3
     auto_retry_failed: bool = True
     pause_on_error: bool = False
+    task_counts: Dict[str, int] = None  # 任務狀態直方圖，由 BatchProcessor._transition 維護
+    ingest_complete: bool = True  # 串流匯入的作業在讀完來源前為 False
+    ingest_stats: Optional[Dict[str, Any]] = None
+    ingest_source: Optional[Dict[str, Any]] = None  # 串流匯入的來源與參數，用於中斷後續傳
+    payload_store: Optional[PayloadStore] = None  # 大型作業的緊湊任務資料存儲
+    deadline: Optional[datetime] = None  # 作業截止時間（未指定截止時間的任務沿用）
+    budget: Optional[float] = None  # 作業預算上限（None 表示不限）
+    user_id: Any = None  # 作業所屬用戶，用於用戶預算
+    pause_reason: Optional[str] = None  # 自動暫停的原因（如 budget_exhausted）
     
     def __post_init__(self):
         if self.created_at is None:
             self.created_at = datetime.now()
+        if self.task_counts is None:
+            self.task_counts = {status.value: 0 for status in TaskStatus}
+            for task in self.tasks:
+                self.task_counts[task.status.value] += 1
+    
+    @property
+    def finished_tasks(self) -> int:
+        """已結束（完成、失敗或取消）的任務數"""
+        return (self.task_counts[TaskStatus.COMPLETED.value]
+                + self.task_counts[TaskStatus.FAILED.value]
+                + self.task_counts[TaskStatus.CANCELLED.value])
+
+class FairShareScheduler:
+    """
+    公平共享調度器
+    
+    每個作業擁有獨立的優先級隊列，作業之間以加權赤字輪詢（DRR）分配工作槽位，
+    權重由隊首任務的 TaskPriority 決定；同時強制執行作業的 concurrent_limit
+    與全局的 max_concurrent_jobs。非線程安全，由 BatchProcessor.lock 保護。
+    
+    有截止時間的任務以最晚開始時間（urgency）排序，優先於所有無截止時間的任務：
+    作業內按 urgency 排在隊首，作業間選擇隊首最緊迫的作業，不受輪詢順序影響。
+    """
+    
+    # 每輪分配給作業的配額（以任務數計）
+    PRIORITY_WEIGHTS = {
+        TaskPriority.LOW: 1,
+        TaskPriority.NORMAL: 2,
+        TaskPriority.HIGH: 3,
+        TaskPriority.URGENT: 4
+    }
+    
+    def __init__(self, max_concurrent_jobs: int):
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.queues: Dict[str, List[tuple]] = {}  # 作業ID -> (urgency, 負優先級, 序號, 任務ID) 小頂堆
+        self.limits: Dict[str, int] = {}
+        self.active: Dict[str, int] = {}
+        self.deficits: Dict[str, float] = {}
+        self.admitted: set = set()
+        self.ring: deque = deque()  # 已准入且有排隊任務的作業
+        self.waiting: List[tuple] = []  # (urgency, 負優先級, 序號, 作業ID) 等待准入
+        self.queued_count = 0
+        self._seq = itertools.count()
+    
+    def register_job(self, job_id: str, concurrent_limit: int):
+        """登記作業及其並發限制"""
+        self.queues.setdefault(job_id, [])
+        self.limits[job_id] = max(1, concurrent_limit)
+        self.active.setdefault(job_id, 0)
+        self.deficits.setdefault(job_id, 0.0)
+    
+    def remove_job(self, job_id: str) -> int:
+        """移除作業的排隊任務，返回被丟棄的任務數"""
+        dropped = len(self.queues.get(job_id, []))
+        self.queued_count -= dropped
+        if job_id in self.queues:
+            self.queues[job_id] = []
+        if self.active.get(job_id, 0) == 0:
+            self._release(job_id)
+            self.queues.pop(job_id, None)
+            self.limits.pop(job_id, None)
+            self.active.pop(job_id, None)
+            self.deficits.pop(job_id, None)
+        return dropped
+    
+    def push(self, job_id: str, task: BatchTask, urgency: float = NO_DEADLINE):
+        """
+        將就緒任務放入所屬作業的隊列
+        
+        Args:
+            urgency: 最晚開始時間（epoch 秒），無截止時間為 NO_DEADLINE
+        """
+        if job_id not in self.queues:
+            self.register_job(job_id, 1)
+        queue = self.queues[job_id]
+        heapq.heappush(queue, (urgency, -task.priority.value, next(self._seq), task.id))
+        self.queued_count += 1
+        
+        if job_id in self.admitted:
+            if len(queue) == 1 and job_id not in self.ring:
+                self.ring.append(job_id)
+        elif len(self.admitted) < self.max_concurrent_jobs:
+            self._admit(job_id)
+        elif not any(entry[3] == job_id for entry in self.waiting):
+            heapq.heappush(self.waiting, (urgency, -task.priority.value, next(self._seq), job_id))
+    
+    def pop(self) -> Optional[tuple]:
+        """
+        挑選下一個可執行的任務
+        
+        Returns:
+            Optional[tuple]: (作業ID, 任務ID)，沒有可執行任務時返回 None
+        """
+        # 有截止時間的任務優先：選擇有空閒槽位且隊首最緊迫的作業
+        urgent_job = None
+        for job_id in self.ring:
+            queue = self.queues.get(job_id)
+            if (queue and queue[0][0] != NO_DEADLINE and self.active[job_id] < self.limits[job_id]
+                    and (urgent_job is None or queue[0][0] < self.queues[urgent_job][0][0])):
+                urgent_job = job_id
+        if urgent_job is not None:
+            task_id = heapq.heappop(self.queues[urgent_job])[3]
+            self.queued_count -= 1
+            return urgent_job, task_id
+        
+        blocked = 0
+        while self.ring and blocked < len(self.ring):
+            job_id = self.ring[0]
+            queue = self.queues.get(job_id)
+            if not queue:
+                self.ring.popleft()
+                self.deficits[job_id] = 0.0
+                continue
+            
+            # 作業已達並發上限，讓給下一個作業
+            if self.active[job_id] >= self.limits[job_id]:
+                self.ring.rotate(-1)
+                blocked += 1
+                continue
+            
+            if self.deficits[job_id] < 1:
+                head_priority = TaskPriority(-queue[0][1])
+                self.deficits[job_id] += self.PRIORITY_WEIGHTS[head_priority]
+            
+            task_id = heapq.heappop(queue)[3]
+            self.queued_count -= 1
+            self.deficits[job_id] -= 1
+            if self.deficits[job_id] < 1 or not queue:
+                self.ring.rotate(-1)
+            return job_id, task_id
+        
+        return None
+    
+    def task_started(self, job_id: str):
+        """任務開始佔用槽位"""
+        self.active[job_id] = self.active.get(job_id, 0) + 1
+    
+    def task_finished(self, job_id: str):
+        """任務釋放槽位；作業沒有剩餘工作時讓出准入名額"""
+        if job_id not in self.active:
+            return
+        self.active[job_id] = max(0, self.active[job_id] - 1)
+        self.release_if_idle(job_id)
+    
+    def release_if_idle(self, job_id: str):
+        """作業沒有運行中及排隊任務時讓出准入名額"""
+        if not self.active.get(job_id) and not self.queues.get(job_id):
+            self._release(job_id)
+    
+    def _admit(self, job_id: str):
+        """准入作業參與輪詢"""
+        self.admitted.add(job_id)
+        self.deficits[job_id] = 0.0
+        if self.queues.get(job_id) and job_id not in self.ring:
+            self.ring.append(job_id)
+    
+    def _release(self, job_id: str):
+        """讓出准入名額並准入下一個等待中的作業"""
+        if job_id not in self.admitted:
+            self.waiting = [entry for entry in self.waiting if entry[3] != job_id]
+            heapq.heapify(self.waiting)
+            return
+        self.admitted.discard(job_id)
+        try:
+            self.ring.remove(job_id)
+        except ValueError:
+            pass
+        
+        while self.waiting and len(self.admitted) < self.max_concurrent_jobs:
+            next_job_id = heapq.heappop(self.waiting)[3]
+            if self.queues.get(next_job_id):
+                self._admit(next_job_id)
+    
+    def get_stats(self) -> Dict:
+        """獲取各作業的隊列深度與槽位使用情況"""
+        jobs = {}
+        for job_id, queue in self.queues.items():
+            if not queue and not self.active.get(job_id):
+                continue
+            jobs[job_id] = {
+                "queued": len(queue),
+                "active": self.active.get(job_id, 0),
+                "concurrent_limit": self.limits.get(job_id, 1),
+                "admitted": job_id in self.admitted,
+                "deficit": round(self.deficits.get(job_id, 0.0), 2)
+            }
+        return {
+            "admitted_jobs": len(self.admitted),
+            "waiting_jobs": len(self.waiting),
+            "queued_tasks": self.queued_count,
+            "jobs": jobs
+        }
 
 class BatchProcessor:
     """批量處理引擎類"""
     
-    def __init__(self, max_workers: int = 5, max_concurrent_jobs: int = 2):
+    def __init__(self, max_workers: int = 5, max_concurrent_jobs: int = 2,
+                 journal: Optional[BatchJournal] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 compact_task_threshold: int = 1000,
+                 coalesce_requests: bool = True,
+                 process_workers: Optional[int] = None,
+                 skip_missed_deadlines: bool = True,
+                 budget_manager: Optional[BudgetManager] = None,
+                 limiters: Optional[AdaptiveLimiterRegistry] = None,
+                 result_store: Optional[ResultStore] = None,
+                 owner_id: Optional[str] = None,
+                 lease_ttl: float = 60.0):
         """
         初始化批量處理引擎
         
         Args:
             max_workers: 最大工作線程數
             max_concurrent_jobs: 最大並發作業數
+            journal: 作業日誌，提供時所有狀態轉換會持久化，可用 recover_from_journal 恢復
+            retry_policy: 失敗重試的退避策略
+            compact_task_threshold: 任務數達到此值的作業（及所有串流匯入作業）將任務資料存於 PayloadStore
+            coalesce_requests: 合併進行中的相同生成請求（任務資料可用 coalesce=False 或 seed 退出）
+            process_workers: 進程通道的工作進程數，預設為 CPU 核心數
+            skip_missed_deadlines: 必然逾期的任務直接標記失敗而不執行；False 時只標記風險
+            budget_manager: 預算管理器，調度前為任務預留預估成本，預算不足時暫停作業
+            limiters: 服務商自適應併發限制（預設為進程共用的 provider_limiters）；
+                max_workers 為全局上限，各服務商的併發另由其 AIMD 上限控制
+            result_store: 任務結果存儲，提供時大型結果寫入磁碟，任務與日誌只保留結果引用
+            owner_id: 本處理器在日誌租約中的身分，預設為主機名、進程號與隨機後綴
+            lease_ttl: 作業租約的有效秒數；多個工作進程共用日誌時，每個作業只由持有
+                未過期租約的處理器執行，持有者中斷後其作業在租約過期後由其他處理器接管
         """
         self.max_workers = max_workers
         self.max_concurrent_jobs = max_concurrent_jobs
+        self.journal = journal
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retry_stats = RetryDelayStats()
+        self.compact_task_threshold = compact_task_threshold
+        self.coalesce_requests = coalesce_requests
+        self.singleflight = AsyncSingleFlight()
+        self.skip_missed_deadlines = skip_missed_deadlines
+        self.duration_estimator = TaskDurationEstimator()
+        self.deadline_at_risk: set = set()  # 預計逾期但仍執行的任務ID
+        self.budget = budget_manager or BudgetManager()
+        self.task_reservations: Dict[str, float] = {}  # 執行中任務ID -> 預留的預算
+        self.limiters = limiters or provider_limiters
+        self.provider_slots: Dict[str, str] = {}  # 執行中任務ID -> 佔用名額的服務商
+        self.provider_waiting: Dict[str, deque] = {}  # 服務商 -> 等待名額的 (作業ID, 任務ID)
+        self.result_store = result_store
+        
+        # 日誌租約
+        self.owner_id = owner_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_ttl = lease_ttl
+        self._lease_thread: Optional[threading.Thread] = None
+        self._lease_stop = threading.Event()
         
         # 任務和作業管理
         self.jobs: Dict[str, BatchJob] = {}
         self.tasks: Dict[str, BatchTask] = {}
-        self.task_queue = queue.PriorityQueue()
+        self.scheduler = FairShareScheduler(max_concurrent_jobs)
+        
+        # 依賴圖：任務ID -> 後繼任務ID列表，以及每個任務未滿足的依賴數
+        self.dependents: Dict[str, List[str]] = {}
+        self.unmet_dependencies: Dict[str, int] = {}
         self.active_tasks: Dict[str, asyncio.Task] = {}
+        self.parked_tasks: Dict[str, asyncio.TimerHandle] = {}  # 等待退避結束的重試任務
+        self.abort_requests: Dict[str, TaskStatus] = {}  # 正在中止的執行中任務 -> 中止後的狀態
         self.paused_jobs: set = set()
+        self.lock = threading.RLock()
+        self._ingest_condition = threading.Condition(self.lock)
         
-        # 線程池
+        # 線程池與進程池（進程池在註冊第一個進程通道處理器時建立）
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.process_workers = process_workers or os.cpu_count() or 1
+        self.process_executor: Optional[ProcessPoolExecutor] = None
         
         # 狀態管理
         self.is_running = False
         self.is_paused = False
         self.processor_thread = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._dispatch_scheduled = False
         self.stats = {
             "total_jobs": 0,
             "completed_jobs": 0,
@@ -116,26 +479,48 @@ class BatchProcessor:
             "completed_tasks": 0,
             "failed_tasks": 0,
             "average_task_time": 0.0,
+            "aborted_tasks": 0,
+            "aborted_processing_seconds": 0.0,
+            "aborted_partial_cost": 0.0,
+            "deadline_met": 0,
+            "deadline_missed": 0,
+            "deadline_skipped": 0,
             "uptime_seconds": 0
         }
+        self._timed_tasks = 0
         
         # 處理器回調函數
         self.task_processors: Dict[str, Callable] = {}
+        self.task_lanes: Dict[str, ExecutionLane] = {}
         self.progress_callbacks: List[Callable] = []
         self.completion_callbacks: List[Callable] = []
         
         logger.info(f"批量處理引擎初始化完成 - 最大工作者數: {max_workers}, 最大並發作業: {max_concurrent_jobs}")
     
-    def register_task_processor(self, task_type: str, processor_func: Callable):
+    def register_task_processor(self, task_type: str, processor_func: Callable,
+                                lane: ExecutionLane = ExecutionLane.ASYNC):
         """
         註冊任務處理器
         
         Args:
             task_type: 任務類型
-            processor_func: 處理函數 async def func(task_data) -> result
+            processor_func: 處理函數；ASYNC 通道為 async def func(task_data) -> result，
+                THREAD / PROCESS 通道為同步函數 def func(task_data) -> result
+            lane: 執行通道。PROCESS 通道的函數必須定義在模組層級（可被 pickle），
+                圖片等大型資料應以檔案路徑傳遞，二進位欄位會經共享記憶體傳遞
         """
+        lane = ExecutionLane(lane)
+        if lane == ExecutionLane.ASYNC and not asyncio.iscoroutinefunction(processor_func):
+            raise ValueError(f"ASYNC 通道的處理器必須是協程函數: {task_type}")
+        if lane != ExecutionLane.ASYNC and asyncio.iscoroutinefunction(processor_func):
+            raise ValueError(f"{lane.value.upper()} 通道的處理器必須是同步函數: {task_type}")
+        
+        if lane == ExecutionLane.PROCESS and self.process_executor is None:
+            self.process_executor = ProcessPoolExecutor(max_workers=self.process_workers)
+        
         self.task_processors[task_type] = processor_func
-        logger.info(f"已註冊任務處理器: {task_type}")
+        self.task_lanes[task_type] = lane
+        logger.info(f"已註冊任務處理器: {task_type} ({lane.value})")
     
     def add_progress_callback(self, callback: Callable):
         """添加進度回調函數"""
@@ -148,7 +533,10 @@ class BatchProcessor:
     def create_job(self, name: str, tasks_data: List[Dict], 
                    concurrent_limit: int = 3, 
                    auto_retry_failed: bool = True,
-                   pause_on_error: bool = False) -> str:
+                   pause_on_error: bool = False,
+                   deadline: Any = None,
+                   budget: Optional[float] = None,
+                   user_id: Any = None) -> str:
         """
         創建批量作業
         
@@ -158,27 +546,30 @@ class BatchProcessor:
             concurrent_limit: 並發限制
             auto_retry_failed: 是否自動重試失敗任務
             pause_on_error: 遇到錯誤時是否暫停
+            deadline: 作業截止時間（datetime、ISO 字串或 epoch 秒），任務可用 "deadline" 欄位覆蓋
+            budget: 作業預算上限，預算用盡時作業自動暫停
+            user_id: 作業所屬用戶（套用用戶預算）
             
         Returns:
             str: 作業ID
+            
+        Raises:
+            InvalidTaskError: 任務定義無效
+            ValueError: 依賴圖無效或截止時間無法解析
         """
         job_id = f"job_{uuid.uuid4().hex[:8]}"
+        deadline = parse_deadline(deadline)
         
-        # 創建任務
-        tasks = []
-        for i, task_data in enumerate(tasks_data):
-            task_id = f"{job_id}_task_{i}"
-            task = BatchTask(
-                id=task_id,
-                task_type=task_data.get("type", "unknown"),
-                data=task_data.get("data", {}),
-                priority=TaskPriority(task_data.get("priority", 2)),
-                max_retries=task_data.get("max_retries", 3),
-                timeout_seconds=task_data.get("timeout", 300),
-                dependencies=task_data.get("dependencies", [])
-            )
-            tasks.append(task)
-            self.tasks[task_id] = task
+        # 創建任務（大型作業使用緊湊的任務資料存儲）
+        payload_store = PayloadStore() if len(tasks_data) >= self.compact_task_threshold else None
+        tasks = self._build_tasks(job_id, tasks_data, payload_store=payload_store, default_deadline=deadline)
+        
+        # 驗證依賴圖（無環、依賴存在）後再登記任務
+        self._validate_dependency_graph(tasks)
+        with self.lock:
+            for task in tasks:
+                self.tasks[task.id] = task
+            self._register_dependencies(tasks)
         
         # 創建作業
         job = BatchJob(
@@ -187,16 +578,304 @@ class BatchProcessor:
             tasks=tasks,
             concurrent_limit=concurrent_limit,
             auto_retry_failed=auto_retry_failed,
-            pause_on_error=pause_on_error
+            pause_on_error=pause_on_error,
+            payload_store=payload_store,
+            deadline=deadline,
+            budget=budget,
+            user_id=user_id
         )
         
         self.jobs[job_id] = job
+        self.budget.register_job(job_id, budget, user_id)
+        self._prefetch_cost_history(tasks_data)
+        with self.lock:
+            self.scheduler.register_job(job_id, concurrent_limit)
+        self._journal_job_created(job)
         self.stats["total_jobs"] += 1
         self.stats["total_tasks"] += len(tasks)
         
         logger.info(f"創建批量作業: {job_id} - {name}, 任務數: {len(tasks)}")
         return job_id
     
+    def _build_tasks(self, job_id: str, tasks_data: List[Dict], start_index: int = 0,
+                     payload_store: Optional[PayloadStore] = None,
+                     default_deadline: Optional[datetime] = None) -> List[BatchTask]:
+        """
+        由任務數據建立 BatchTask 列表
+        
+        Raises:
+            InvalidTaskError: 任一任務定義無效
+            InvalidDeadlineError: 任一任務的截止時間無法解析
+        """
+        tasks = []
+        for i, task_data in enumerate(tasks_data, start_index):
+            try:
+                tasks.append(self._build_task(job_id, i, task_data, payload_store, default_deadline))
+            except InvalidDeadlineError:
+                raise
+            except ValueError as e:
+                raise InvalidTaskError(f"任務 {i} 無效: {str(e)}") from e
+        return tasks
+    
+    def _build_task(self, job_id: str, index: int, task_data: Dict,
+                    payload_store: Optional[PayloadStore] = None,
+                    default_deadline: Optional[datetime] = None) -> BatchTask:
+        """
+        驗證單個任務定義並建立 BatchTask（驗證通過前不寫入 PayloadStore）
+        
+        Raises:
+            ValueError: 優先級、重試次數、超時、依賴或截止時間無效
+        """
+        if not isinstance(task_data, dict):
+            raise ValueError("任務定義必須是物件")
+        try:
+            priority = TaskPriority(int(task_data.get("priority", 2)))
+        except (TypeError, ValueError):
+            raise ValueError(f"無效的優先級: {task_data.get('priority')!r}")
+        try:
+            max_retries = int(task_data.get("max_retries", 3))
+            if max_retries < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            raise ValueError(f"無效的重試次數: {task_data.get('max_retries')!r}")
+        try:
+            timeout = float(task_data.get("timeout", 300))
+            if not timeout > 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            raise ValueError(f"無效的超時: {task_data.get('timeout')!r}")
+        dependencies = task_data.get("dependencies", [])
+        if dependencies is not None and not isinstance(dependencies, (list, tuple)):
+            raise ValueError(f"依賴必須是列表: {dependencies!r}")
+        deadline = parse_deadline(task_data.get("deadline")) or default_deadline
+        
+        return BatchTask(
+            id=f"{job_id}_task_{index}",
+            task_type=str(task_data.get("type", "unknown")),
+            data=task_data.get("data", {}),
+            priority=priority,
+            max_retries=max_retries,
+            timeout_seconds=timeout,
+            dependencies=self._resolve_dependencies(job_id, dependencies),
+            payload_store=payload_store,
+            deadline=deadline
+        )
+    
+    def _prefetch_cost_history(self, tasks_data: List[Dict]):
+        """在背景查詢任務涉及平台的歷史成本，調度時的預算估算不需在事件循環上查詢資料庫"""
+        providers = set()
+        for task_data in tasks_data:
+            data = task_data.get("data") if isinstance(task_data, dict) else None
+            if isinstance(data, dict):
+                providers.add(data.get("api_provider") or data.get("provider"))
+        self.budget.prefetch_history(providers)
+    
+    def ingest_job(self, name: str, source, fmt: str,
+                   default_task_type: str = "image_generation",
+                   concurrent_limit: int = 3,
+                   auto_retry_failed: bool = True,
+                   pause_on_error: bool = False,
+                   chunk_size: int = 500,
+                   window: int = 5000,
+                   auto_start: bool = True,
+                   delete_source: bool = False,
+                   deadline: Any = None,
+                   budget: Optional[float] = None,
+                   user_id: Any = None) -> str:
+        """
+        以串流方式從 JSONL / CSV 來源創建批量作業
+        
+        來源在背景線程中惰性解析並分塊建立任務；啟動後的作業在讀完來源前即開始調度。
+        未結束的任務數達到 window 時暫停讀取，直到有任務結束。
+        依賴只能指向來源中較早的行（以行索引或任務ID表示）。
+        
+        Args:
+            name: 作業名稱
+            source: 檔案路徑或檔案物件
+            fmt: jsonl 或 csv
+            default_task_type: 記錄未指定 type 時的任務類型
+            concurrent_limit: 並發限制
+            auto_retry_failed: 是否自動重試失敗任務
+            pause_on_error: 遇到錯誤時是否暫停
+            chunk_size: 每批建立的任務數
+            window: 允許同時存在的未結束任務上限
+            auto_start: 是否立即啟動作業
+            delete_source: 匯入結束後刪除來源檔案（用於上傳的暫存檔）
+            deadline: 作業截止時間，記錄可用 "deadline" 欄位覆蓋
+            budget: 作業預算上限
+            user_id: 作業所屬用戶
+            
+        Returns:
+            str: 作業ID
+        """
+        job_id = f"job_{uuid.uuid4().hex[:8]}"
+        deadline = parse_deadline(deadline)
+        job = BatchJob(
+            id=job_id,
+            name=name,
+            tasks=[],
+            concurrent_limit=concurrent_limit,
+            auto_retry_failed=auto_retry_failed,
+            pause_on_error=pause_on_error,
+            ingest_complete=False,
+            ingest_stats={"parsed": 0, "skipped": 0, "rejected": 0, "rejected_rows": [],
+                          "next_index": 0, "error": None},
+            ingest_source={"path": source if isinstance(source, str) else None, "fmt": fmt,
+                           "default_task_type": default_task_type, "chunk_size": max(1, chunk_size),
+                           "window": max(1, window), "delete_source": delete_source},
+            payload_store=PayloadStore(),
+            deadline=deadline,
+            budget=budget,
+            user_id=user_id
+        )
+        
+        self.jobs[job_id] = job
+        self.budget.register_job(job_id, budget, user_id)
+        with self.lock:
+            self.scheduler.register_job(job_id, concurrent_limit)
+        self._journal_job_created(job)
+        self.stats["total_jobs"] += 1
+        
+        records = iter_task_records(source, fmt, default_task_type, stats=job.ingest_stats,
+                                    with_line_numbers=True)
+        self._start_ingest_worker(job, records)
+        
+        if auto_start:
+            self.start_job(job_id)
+        
+        logger.info(f"創建串流匯入作業: {job_id} - {name}")
+        return job_id
+    
+    def _start_ingest_worker(self, job: BatchJob, records):
+        """以作業的匯入參數啟動背景匯入線程"""
+        source = job.ingest_source
+        threading.Thread(
+            target=self._ingest_worker,
+            args=(job, records, source["chunk_size"], source["window"],
+                  source["path"] if source["delete_source"] else None),
+            name=f"BatchIngest-{job.id}", daemon=True
+        ).start()
+    
+    def _resume_ingest(self, job: BatchJob):
+        """
+        續傳中斷的串流匯入
+        
+        來源檔案仍存在時跳過已匯入的記錄繼續讀取；來源不可用時（檔案物件或已刪除）
+        記錄錯誤並結束匯入，作業在已匯入的任務結束後標記為失敗，不會當作完整匯入。
+        """
+        source = job.ingest_source or {}
+        path = source.get("path")
+        if job.status == TaskStatus.CANCELLED:
+            job.ingest_complete = True
+            return
+        if path and os.path.exists(path):
+            # parsed / skipped 在重新讀取時重新累計，rejected 已在日誌中記錄
+            job.ingest_stats["parsed"] = 0
+            job.ingest_stats["skipped"] = 0
+            records = iter_task_records(path, source["fmt"], source["default_task_type"],
+                                        stats=job.ingest_stats, with_line_numbers=True)
+            self._start_ingest_worker(job, self._skip_records(records, job.ingest_stats["next_index"]))
+            logger.info(f"續傳串流匯入 {job.id}: 從第 {job.ingest_stats['next_index']} 筆記錄繼續")
+            return
+        
+        job.ingest_stats["error"] = f"匯入中斷且來源不可用，僅保留已匯入的 {len(job.tasks)} 個任務"
+        job.ingest_complete = True
+        self._journal_ingest_progress(job)
+        logger.error(f"無法續傳串流匯入 {job.id}: 來源不可用")
+        self._refresh_job_progress(job)
+    
+    @staticmethod
+    def _skip_records(records, count: int):
+        """跳過前 count 筆記錄，關閉時一併關閉來源"""
+        try:
+            yield from itertools.islice(records, count, None)
+        finally:
+            records.close()
+    
+    def _ingest_worker(self, job: BatchJob, records, chunk_size: int, window: int,
+                       cleanup_path: Optional[str] = None):
+        """背景匯入線程：分塊建立任務，並以未結束任務數做背壓"""
+        try:
+            for chunk in iter_chunks(records, chunk_size):
+                with self._ingest_condition:
+                    while (job.status != TaskStatus.CANCELLED
+                           and len(job.tasks) - job.finished_tasks >= window):
+                        self._ingest_condition.wait(timeout=1.0)
+                if job.status == TaskStatus.CANCELLED:
+                    break
+                self._append_tasks(job, chunk)
+        except Exception as e:
+            job.ingest_stats["error"] = str(e)
+            logger.error(f"串流匯入失敗 {job.id}: {str(e)}")
+        finally:
+            records.close()
+            if cleanup_path and os.path.exists(cleanup_path):
+                os.remove(cleanup_path)
+            job.ingest_complete = True
+            self._journal_ingest_progress(job)
+            self._refresh_job_progress(job)
+            logger.info(f"串流匯入結束 {job.id}: {len(job.tasks)} 個任務")
+    
+    def _append_tasks(self, job: BatchJob, records: List[tuple]):
+        """
+        將一塊任務加入串流匯入中的作業
+        
+        Args:
+            records: (來源行號, 任務定義) 列表；無效的記錄計為 rejected 並記錄行號與原因，不中斷匯入
+        """
+        start_index = job.ingest_stats["next_index"]
+        job.ingest_stats["next_index"] += len(records)
+        
+        self._prefetch_cost_history([task_data for _, task_data in records])
+        
+        accepted = []
+        known_ids = set()
+        for index, (line_number, task_data) in enumerate(records, start_index):
+            # 續傳時跳過中斷前已記錄、但匯入進度尚未記錄的任務
+            if f"{job.id}_task_{index}" in self.tasks:
+                continue
+            try:
+                task = self._build_task(job.id, index, task_data, job.payload_store, job.deadline)
+            except ValueError as e:
+                self._reject_ingest_row(job, line_number, str(e))
+                continue
+            # 只允許依賴已匯入的任務，因此不會形成環
+            missing = [dep_id for dep_id in task.dependencies
+                       if dep_id not in known_ids and dep_id not in self.tasks]
+            if missing:
+                self._reject_ingest_row(job, line_number, f"依賴任務不存在或尚未匯入: {', '.join(missing[:5])}")
+                continue
+            accepted.append(task)
+            known_ids.add(task.id)
+        
+        with self.lock:
+            if job.status == TaskStatus.CANCELLED:
+                return
+            for task in accepted:
+                self.tasks[task.id] = task
+            job.tasks.extend(accepted)
+            job.task_counts[TaskStatus.PENDING.value] += len(accepted)
+            self._register_dependencies(accepted)
+        
+        self._journal_tasks_created(job.id, accepted)
+        self._journal_ingest_progress(job)
+        self.stats["total_tasks"] += len(accepted)
+        
+        for task in accepted:
+            if not self._can_start_task(task):
+                continue
+            if job.status == TaskStatus.PROCESSING:
+                self._enqueue_task(task)
+            elif job.status == TaskStatus.PAUSED:
+                self._transition(task, TaskStatus.PAUSED)
+    
+    def _reject_ingest_row(self, job: BatchJob, line_number: int, reason: str):
+        """記錄匯入時被拒絕的行（只保留前 MAX_REJECTED_ROWS 筆明細）"""
+        job.ingest_stats["rejected"] += 1
+        if len(job.ingest_stats["rejected_rows"]) < MAX_REJECTED_ROWS:
+            job.ingest_stats["rejected_rows"].append({"row": line_number, "reason": reason})
+        logger.warning(f"略過無效的匯入行 {job.id} 第 {line_number} 行: {reason}")
+    
     def start_job(self, job_id: str) -> Dict:
         """
         啟動批量作業
@@ -214,20 +893,21 @@ class BatchProcessor:
         if job.status != TaskStatus.PENDING:
             return {"success": False, "error": f"作業狀態不允許啟動: {job.status.value}"}
         
-        # 將任務添加到隊列
-        for task in job.tasks:
-            if self._can_start_task(task):
-                priority_value = -task.priority.value  # 負值使高優先級排在前面
-                self.task_queue.put((priority_value, time.time(), task.id))
-                task.status = TaskStatus.QUEUED
-        
-        job.status = TaskStatus.PROCESSING
         job.started_at = datetime.now()
+        self._transition_job(job, TaskStatus.PROCESSING)
         
         # 如果處理器未運行，啟動它
         if not self.is_running:
             self.start_processor()
         
+        # 將任務添加到隊列
+        for task in job.tasks:
+            if self._can_start_task(task):
+                self._enqueue_task(task)
+        
+        # 上游已失敗或取消時，作業可能在啟動時即已結束
+        self._refresh_job_progress(job)
+        
         logger.info(f"啟動批量作業: {job_id}")
         return {"success": True, "job_id": job_id, "queued_tasks": len(job.tasks)}
     
@@ -241,12 +921,13 @@ class BatchProcessor:
             return {"success": False, "error": f"作業不在處理中: {job.status.value}"}
         
         self.paused_jobs.add(job_id)
-        job.status = TaskStatus.PAUSED
+        self._transition_job(job, TaskStatus.PAUSED)
         
-        # 暫停正在處理的任務
+        # 暫停並中止正在處理的任務（恢復時重新執行）
         for task in job.tasks:
             if task.status == TaskStatus.PROCESSING:
-                task.status = TaskStatus.PAUSED
+                self._transition(task, TaskStatus.PAUSED)
+        self._abort_in_flight(job_id, TaskStatus.PAUSED)
         
         logger.info(f"暫停批量作業: {job_id}")
         return {"success": True, "job_id": job_id}
@@ -260,111 +941,830 @@ class BatchProcessor:
         if job.status != TaskStatus.PAUSED:
             return {"success": False, "error": f"作業未暫停: {job.status.value}"}
         
+        if self.budget.is_exhausted(job_id):
+            return {"success": False, "error": "作業或用戶預算已用盡，請先調整預算"}
+        
         self.paused_jobs.discard(job_id)
-        job.status = TaskStatus.PROCESSING
+        job.pause_reason = None
+        self._transition_job(job, TaskStatus.PROCESSING)
         
-        # 恢復暫停的任務
+        # 恢復暫停的任務（仍在運行的任務完成後自行更新狀態）
         for task in job.tasks:
-            if task.status == TaskStatus.PAUSED:
-                task.status = TaskStatus.QUEUED
-                priority_value = -task.priority.value
-                self.task_queue.put((priority_value, time.time(), task.id))
+            if task.status == TaskStatus.PAUSED and task.id not in self.active_tasks:
+                self._enqueue_task(task)
         
         logger.info(f"恢復批量作業: {job_id}")
         return {"success": True, "job_id": job_id}
     
+    def set_job_budget(self, job_id: str, budget: Optional[float]) -> Dict:
+        """調整作業預算（因預算暫停的作業需再調用 resume_job 恢復）"""
+        if job_id not in self.jobs:
+            return {"success": False, "error": f"作業不存在: {job_id}"}
+        
+        job = self.jobs[job_id]
+        job.budget = budget
+        self.budget.set_job_budget(job_id, budget)
+        logger.info(f"調整作業預算: {job_id} -> {budget}")
+        return {"success": True, "job_id": job_id, "budget": self.budget.get_job_budget(job_id)}
+    
+    def _pause_for_budget(self, job_id: str):
+        """預算不足時暫停作業；執行中的任務繼續完成，不中止"""
+        job = self.jobs.get(job_id)
+        if job is None or job.status != TaskStatus.PROCESSING:
+            return
+        self.paused_jobs.add(job_id)
+        job.pause_reason = "budget_exhausted"
+        self._transition_job(job, TaskStatus.PAUSED)
+        logger.warning(f"作業預算不足，已暫停: {job_id}")
+    
     def cancel_job(self, job_id: str) -> Dict:
         """取消批量作業"""
         if job_id not in self.jobs:
             return {"success": False, "error": f"作業不存在: {job_id}"}
         
         job = self.jobs[job_id]
-        job.status = TaskStatus.CANCELLED
         job.completed_at = datetime.now()
+        self._transition_job(job, TaskStatus.CANCELLED)
         
-        # 取消所有相關任務
+        # 取消所有相關任務，並級聯取消其他作業中的下游任務
+        cancelled = []
         for task in job.tasks:
             if task.status in [TaskStatus.PENDING, TaskStatus.QUEUED, TaskStatus.PAUSED]:
-                task.status = TaskStatus.CANCELLED
+                self._transition(task, TaskStatus.CANCELLED)
+                cancelled.append(task)
         
         self.paused_jobs.discard(job_id)
+        with self.lock:
+            self.scheduler.remove_job(job_id)
+        for task in cancelled:
+            self._cascade_downstream(task)
+        
+        # 中止正在執行的任務，停止後續費用
+        self._abort_in_flight(job_id, TaskStatus.CANCELLED)
+        
+        # 作業結束，通知完成回調（回調可依 job.status 區分取消）
+        self._schedule_coroutine(self._call_completion_callbacks(job))
         logger.info(f"取消批量作業: {job_id}")
         return {"success": True, "job_id": job_id}
     
+    def _abort_in_flight(self, job_id: str, status: TaskStatus):
+        """請求中止作業中正在執行的任務（可從任意線程調用）"""
+        if self._loop is None or not self.is_running:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._abort_job_tasks, job_id, status)
+        except RuntimeError:
+            pass  # 事件循環已關閉
+    
+    def _abort_job_tasks(self, job_id: str, status: TaskStatus):
+        """
+        取消作業中執行中任務的 asyncio.Task（僅在事件循環線程中運行）
+        
+        取消會傳遞到處理器協程：aiohttp 請求被中斷，支援的服務會取消遠端預測。
+        線程 / 進程通道中已開始的工作無法中斷，但槽位會立即釋放。
+        """
+        for task_id, asyncio_task in list(self.active_tasks.items()):
+            task = self.tasks.get(task_id)
+            if task is None or self._job_id_of(task) != job_id or asyncio_task.done():
+                continue
+            self.abort_requests[task_id] = status
+            asyncio_task.cancel()
+    
+    def _record_aborted_task(self, task: BatchTask, status: TaskStatus, partial_cost: float):
+        """記錄被中止的任務：本次執行的時間與部分費用計入統計"""
+        elapsed = (datetime.now() - task.started_at).total_seconds() if task.started_at else 0.0
+        self.stats["aborted_tasks"] += 1
+        self.stats["aborted_processing_seconds"] += elapsed
+        self.stats["aborted_partial_cost"] += partial_cost
+        
+        if status == TaskStatus.PAUSED:
+            # 暫停：恢復後從頭執行
+            task.progress = 0.0
+            task.started_at = None
+            if task.status != TaskStatus.PAUSED:
+                self._transition(task, TaskStatus.PAUSED)
+            logger.info(f"任務已中止（暫停）: {task.id}，已執行 {elapsed:.1f} 秒")
+            return
+        
+        task.error = f"任務已取消（執行 {elapsed:.1f} 秒後中止）"
+        task.completed_at = datetime.now()
+        if task.status != TaskStatus.CANCELLED:
+            self._transition(task, TaskStatus.CANCELLED)
+            self._cascade_downstream(task)
+        self._update_job_progress(task)
+        logger.info(f"任務已中止（取消）: {task.id}，已執行 {elapsed:.1f} 秒，部分費用 {partial_cost:.4f}")
+    
     def _can_start_task(self, task: BatchTask) -> bool:
         """檢查任務是否可以開始"""
         if task.status != TaskStatus.PENDING:
             return False
         
-        # 檢查依賴任務是否完成
-        for dep_id in task.dependencies:
-            if dep_id in self.tasks:
-                dep_task = self.tasks[dep_id]
-                if dep_task.status != TaskStatus.COMPLETED:
-                    return False
+        # 所有依賴任務均已完成
+        return self.unmet_dependencies.get(task.id, 0) == 0
+    
+    def _resolve_dependencies(self, job_id: str, dependencies: List) -> List[str]:
+        """將作業內索引形式的依賴轉換為任務ID"""
+        resolved = []
+        for dep in dependencies or []:
+            if isinstance(dep, int):
+                resolved.append(f"{job_id}_task_{dep}")
+            else:
+                resolved.append(str(dep))
+        return resolved
+    
+    def _validate_dependency_graph(self, tasks: List[BatchTask]):
+        """
+        檢查新作業的依賴圖
+        
+        依賴必須指向本作業或已存在的任務，且本作業內不得形成環。
         
+        Raises:
+            ValueError: 依賴不存在或存在循環依賴
+        """
+        task_ids = {task.id for task in tasks}
+        in_degree = {task.id: 0 for task in tasks}
+        successors: Dict[str, List[str]] = {task.id: [] for task in tasks}
+        
+        for task in tasks:
+            for dep_id in task.dependencies:
+                if dep_id == task.id:
+                    raise ValueError(f"任務不能依賴自身: {task.id}")
+                if dep_id in task_ids:
+                    successors[dep_id].append(task.id)
+                    in_degree[task.id] += 1
+                elif dep_id not in self.tasks:
+                    raise ValueError(f"依賴任務不存在: {dep_id}")
+        
+        # Kahn 拓撲排序：無法排序的節點即位於環上
+        ready = deque(task_id for task_id, degree in in_degree.items() if degree == 0)
+        visited = 0
+        while ready:
+            task_id = ready.popleft()
+            visited += 1
+            for succ_id in successors[task_id]:
+                in_degree[succ_id] -= 1
+                if in_degree[succ_id] == 0:
+                    ready.append(succ_id)
+        
+        if visited != len(tasks):
+            cycle_nodes = sorted(task_id for task_id, degree in in_degree.items() if degree > 0)
+            raise ValueError(f"檢測到循環依賴: {', '.join(cycle_nodes[:10])}")
+    
+    def _register_dependencies(self, tasks: List[BatchTask],
+                               journaled_status: Optional[Dict[str, str]] = None):
+        """
+        建立反向依賴索引與未滿足依賴計數
+        
+        依賴任務已不在記憶體中（所屬作業已清理或恢復失敗）時，若日誌記錄其已完成則視為已滿足，
+        否則下游任務直接失敗；依賴任務已失敗或取消時，下游同樣結束（與 _cascade_downstream 一致）。
+        
+        Args:
+            tasks: 新登記的任務
+            journaled_status: 日誌中各任務的最新狀態（恢復時提供）
+        """
+        unresolved = []
+        for task in tasks:
+            unmet = 0
+            for dep_id in task.dependencies:
+                dep = self.tasks.get(dep_id)
+                if dep is None:
+                    dep_status = (journaled_status or {}).get(dep_id)
+                    if dep_status != TaskStatus.COMPLETED.value:
+                        unresolved.append((task, dep_id, dep_status))
+                    continue
+                self.dependents.setdefault(dep_id, []).append(task.id)
+                if dep.status in [TaskStatus.FAILED, TaskStatus.CANCELLED]:
+                    unresolved.append((task, dep_id, dep.status.value))
+                elif dep.status != TaskStatus.COMPLETED:
+                    unmet += 1
+            self.unmet_dependencies[task.id] = unmet
+        
+        for task, dep_id, dep_status in unresolved:
+            if task.status not in [TaskStatus.PENDING, TaskStatus.PAUSED]:
+                continue
+            if dep_status is None:
+                task.error = f"依賴任務不存在: {dep_id}（所屬作業可能已清理）"
+            else:
+                task.error = f"依賴任務未完成: {dep_id} ({dep_status})"
+            task.completed_at = datetime.now()
+            if dep_status == TaskStatus.CANCELLED.value:
+                self._transition(task, TaskStatus.CANCELLED)
+            else:
+                self._transition(task, TaskStatus.FAILED)
+                self.stats["failed_tasks"] += 1
+            self._cascade_downstream(task)
+            self._update_job_progress(task)
+    
+    def _release_dependents(self, task: BatchTask):
+        """任務完成後，僅釋放其依賴已全部滿足的直接後繼"""
+        ready = []
+        with self.lock:
+            for succ_id in self.dependents.get(task.id, []):
+                remaining = self.unmet_dependencies.get(succ_id, 0) - 1
+                self.unmet_dependencies[succ_id] = max(0, remaining)
+                if remaining == 0:
+                    ready.append(self.tasks[succ_id])
+        
+        for succ in ready:
+            if succ.status != TaskStatus.PENDING:
+                continue
+            job = self.jobs.get(self._job_id_of(succ))
+            if job is None:
+                continue
+            if job.status == TaskStatus.PROCESSING:
+                self._enqueue_task(succ)
+            elif job.status == TaskStatus.PAUSED:
+                self._transition(succ, TaskStatus.PAUSED)
+    
+    def _cascade_downstream(self, task: BatchTask):
+        """
+        將失敗或取消沿依賴圖向下游傳播
+        
+        上游失敗時下游標記為失敗，上游取消時下游標記為取消。
+        """
+        cascade_status = TaskStatus.FAILED if task.status == TaskStatus.FAILED else TaskStatus.CANCELLED
+        affected_jobs: Dict[str, BatchTask] = {}
+        pending = deque([task.id])
+        while pending:
+            upstream_id = pending.popleft()
+            for succ_id in self.dependents.get(upstream_id, []):
+                succ = self.tasks.get(succ_id)
+                if succ is None or succ.status not in [TaskStatus.PENDING, TaskStatus.PAUSED]:
+                    continue
+                succ.error = f"依賴任務未完成: {upstream_id} ({cascade_status.value})"
+                succ.completed_at = datetime.now()
+                self._transition(succ, cascade_status)
+                if cascade_status == TaskStatus.FAILED:
+                    self.stats["failed_tasks"] += 1
+                affected_jobs[self._job_id_of(succ)] = succ
+                pending.append(succ_id)
+        
+        for succ in affected_jobs.values():
+            self._update_job_progress(succ)
+    
+    @staticmethod
+    def _job_id_of(task: BatchTask) -> str:
+        """從任務ID解析所屬作業ID"""
+        return task.id.split("_task_")[0]
+    
+    def _transition(self, task: BatchTask, new_status: TaskStatus):
+        """
+        任務狀態轉換的唯一入口
+        
+        同步維護所屬作業的狀態直方圖，使進度與狀態查詢為 O(1)，
+        並寫入日誌、通知進度回調（級聯、截止時間跳過等路徑同樣經此發布事件）。
+        """
+        with self.lock:
+            old_status = task.status
+            if old_status == new_status:
+                return
+            task.status = new_status
+            job = self.jobs.get(self._job_id_of(task))
+            if job is not None:
+                job.task_counts[old_status.value] -= 1
+                job.task_counts[new_status.value] += 1
+                if not job.ingest_complete:
+                    self._ingest_condition.notify_all()
+        
+        if self.journal is not None:
+            self.journal.append(EVENT_TASK_STATUS, self._job_id_of(task), task.id,
+                                new_status.value, self._task_state(task))
+        
+        # 首次排隊不通知（大型作業啟動時避免事件洪流），其餘狀態變更（含重試排隊）均通知
+        if new_status != TaskStatus.QUEUED or old_status == TaskStatus.FAILED:
+            self._notify_progress(task)
+    
+    def _transition_job(self, job: BatchJob, new_status: TaskStatus):
+        """作業狀態轉換（同步寫入日誌）"""
+        with self.lock:
+            job.status = new_status
+            if not job.ingest_complete:
+                self._ingest_condition.notify_all()
+        if self.journal is not None:
+            self.journal.append(EVENT_JOB_STATUS, job.id, None, new_status.value, {
+                "started_at": job.started_at.isoformat() if job.started_at else None,
+                "completed_at": job.completed_at.isoformat() if job.completed_at else None
+            })
+    
+    @staticmethod
+    def _task_state(task: BatchTask) -> Dict[str, Any]:
+        """任務可變狀態的日誌快照"""
+        state = {
+            "retry_count": task.retry_count,
+            "error": task.error,
+            "progress": task.progress,
+            "cost": task.cost,
+            "started_at": task.started_at.isoformat() if task.started_at else None,
+            "completed_at": task.completed_at.isoformat() if task.completed_at else None
+        }
+        if task.status == TaskStatus.COMPLETED:
+            state["result"] = task.result
+        return state
+    
+    def _journal_job_created(self, job: BatchJob):
+        """記錄作業及其任務定義"""
+        if self.journal is None:
+            return
+        records = [(EVENT_JOB_CREATED, job.id, None, job.status.value, {
+            "name": job.name,
+            "concurrent_limit": job.concurrent_limit,
+            "auto_retry_failed": job.auto_retry_failed,
+            "pause_on_error": job.pause_on_error,
+            "deadline": job.deadline.isoformat() if job.deadline else None,
+            "budget": job.budget,
+            "user_id": job.user_id,
+            "ingest": job.ingest_source,
+            "created_at": job.created_at.isoformat()
+        })]
+        self.journal.append_many(records)
+        self._journal_tasks_created(job.id, job.tasks)
+        self._claim_jobs([job.id])
+    
+    def _journal_tasks_created(self, job_id: str, tasks: List[BatchTask]):
+        """記錄任務定義"""
+        if self.journal is None:
+            return
+        records = []
+        for task in tasks:
+            records.append((EVENT_TASK_CREATED, job_id, task.id, task.status.value, {
+                "type": task.task_type,
+                "data": task.data,
+                "priority": task.priority.value,
+                "max_retries": task.max_retries,
+                "timeout": task.timeout_seconds,
+                "dependencies": task.dependencies,
+                "deadline": task.deadline.isoformat() if task.deadline else None,
+                "created_at": task.created_at.isoformat()
+            }))
+        self.journal.append_many(records)
+    
+    def _journal_ingest_progress(self, job: BatchJob):
+        """記錄串流匯入進度（在該塊任務定義之後），恢復時據此續傳"""
+        if self.journal is None:
+            return
+        stats = job.ingest_stats
+        self.journal.append(EVENT_JOB_INGEST, job.id, None, job.status.value, {
+            "complete": job.ingest_complete,
+            "next_index": stats["next_index"],
+            "rejected": stats["rejected"],
+            "rejected_rows": stats["rejected_rows"],
+            "error": stats["error"]
+        })
+    
+    def _claim_jobs(self, job_ids: List[str]) -> List[str]:
+        """取得作業租約並確保續約線程運行；日誌不可用時返回空列表"""
+        try:
+            claimed = self.journal.claim_jobs(job_ids, self.owner_id, self.lease_ttl)
+        except Exception as e:
+            logger.error(f"取得作業租約失敗: {str(e)}")
+            return []
+        if claimed and self._lease_thread is None:
+            self._lease_thread = threading.Thread(target=self._lease_loop, name="BatchLeaseHeartbeat", daemon=True)
+            self._lease_thread.start()
+        return claimed
+    
+    def _lease_loop(self):
+        """定期續約本處理器的作業租約，並接管租約已過期（持有者已中斷）的作業"""
+        while not self._lease_stop.wait(self.lease_ttl / 3):
+            try:
+                self.journal.renew_leases(self.owner_id, self.lease_ttl)
+                if self.journal.has_expired_leases(self.owner_id):
+                    self.recover_from_journal()
+            except Exception as e:
+                logger.error(f"作業租約續約失敗: {str(e)}")
+    
+    def recover_from_journal(self) -> Dict:
+        """
+        從日誌重放恢復作業
+        
+        已完成的任務保留結果；QUEUED/PROCESSING 的任務重新排隊，
+        處理中的作業會自動繼續執行，暫停的作業保持暫停。
+        只恢復能取得租約的作業（沒有租約或持有者的租約已過期），
+        其他工作進程正在執行的作業不會被重複載入。
+        
+        Returns:
+            Dict: 恢復結果
+        """
+        if self.journal is None:
+            return {"success": False, "error": "未啟用作業日誌"}
+        
+        try:
+            snapshots = self.journal.load()
+        except Exception as e:
+            logger.error(f"讀取作業日誌失敗: {str(e)}")
+            return {"success": False, "error": f"讀取作業日誌失敗: {str(e)}"}
+        
+        # 所有作業中任務的最新狀態，用於判斷已不在記憶體中的依賴是否已完成
+        journaled_status = {task_id: task_snapshot["status"]
+                            for snapshot in snapshots
+                            for task_id, task_snapshot in snapshot.get("tasks", {}).items()}
+        
+        # 所有作業（含其他進程持有的）引用的結果檔案都不可被清理
+        journaled_refs = set()
+        for snapshot in snapshots:
+            for task_snapshot in snapshot.get("tasks", {}).values():
+                result = (task_snapshot.get("state") or {}).get("result")
+                if ResultStore.is_ref(result):
+                    journaled_refs.add(result[RESULT_REF_KEY])
+        
+        claimed = set(self._claim_jobs([snapshot["job_id"] for snapshot in snapshots
+                                        if snapshot["job_id"] not in self.jobs]))
+        
+        restored: List[BatchJob] = []
+        failed_jobs: List[str] = []
+        requeued_tasks = 0
+        with self.lock:
+            for snapshot in snapshots:
+                job_id = snapshot["job_id"]
+                if job_id in self.jobs or job_id not in claimed:
+                    continue
+                # 單個作業的日誌損壞不影響其他作業的恢復
+                try:
+                    job, requeued = self._job_from_snapshot(snapshot)
+                except Exception as e:
+                    logger.error(f"恢復作業失敗 {job_id}: {str(e)}")
+                    failed_jobs.append(job_id)
+                    continue
+                
+                for task in job.tasks:
+                    if self.result_store is not None and self.result_store.is_ref(task.result):
+                        self.result_store.retain(task.id, task.result)
+                    self.tasks[task.id] = task
+                self.jobs[job_id] = job
+                self.scheduler.register_job(job_id, job.concurrent_limit)
+                # 已記錄的任務費用計入作業的已用預算
+                self.budget.register_job(job_id, job.budget, job.user_id,
+                                         spent=sum(task.cost for task in job.tasks))
+                requeued_tasks += requeued
+                restored.append(job)
+            
+            # 所有作業載入後再建立依賴索引（可能跨作業）
+            for job in restored:
+                try:
+                    self._register_dependencies(job.tasks, journaled_status)
+                except Exception as e:
+                    logger.error(f"恢復作業依賴失敗 {job.id}: {str(e)}")
+                    failed_jobs.append(job.id)
+        
+        for job in restored:
+            self.stats["total_jobs"] += 1
+            self.stats["total_tasks"] += len(job.tasks)
+            if job.tasks:
+                job.progress = job.task_counts[TaskStatus.COMPLETED.value] / len(job.tasks) * 100
+            
+            if job.status == TaskStatus.PAUSED:
+                self.paused_jobs.add(job.id)
+            elif job.status == TaskStatus.PROCESSING:
+                if not self.is_running:
+                    self.start_processor()
+                try:
+                    for task in job.tasks:
+                        if task.status == TaskStatus.PAUSED or self._can_start_task(task):
+                            self._enqueue_task(task)
+                    self._refresh_job_progress(job)
+                except Exception as e:
+                    logger.error(f"恢復作業排隊失敗 {job.id}: {str(e)}")
+                    if job.id not in failed_jobs:
+                        failed_jobs.append(job.id)
+        
+        for job in restored:
+            if not job.ingest_complete:
+                self._resume_ingest(job)
+        
+        # 引用計數重建後清理中斷前寫入但未記錄的結果檔案
+        if self.result_store is not None:
+            self.result_store.collect_garbage(keep=journaled_refs)
+        
+        logger.info(f"從日誌恢復 {len(restored)} 個作業，重新排隊 {requeued_tasks} 個任務")
+        if failed_jobs:
+            logger.warning(f"{len(failed_jobs)} 個作業恢復失敗: {', '.join(failed_jobs[:10])}")
+        return {
+            "success": True,
+            "recovered_jobs": len(restored),
+            "requeued_tasks": requeued_tasks,
+            "failed_jobs": failed_jobs
+        }
+    
+    def _job_from_snapshot(self, snapshot: Dict[str, Any]) -> tuple:
+        """
+        由日誌快照重建作業（不修改處理器狀態）
+        
+        Returns:
+            tuple: (作業, 重新排隊的任務數)
+        """
+        tasks = []
+        requeued = 0
+        for task_snapshot in snapshot["tasks"].values():
+            task = self._task_from_snapshot(task_snapshot)
+            if task.status in [TaskStatus.QUEUED, TaskStatus.PROCESSING]:
+                task.status = TaskStatus.PENDING
+                requeued += 1
+            tasks.append(task)
+        
+        config = snapshot["job"]
+        job = BatchJob(
+            id=snapshot["job_id"],
+            name=config.get("name", snapshot["job_id"]),
+            tasks=tasks,
+            status=TaskStatus(snapshot["status"]),
+            created_at=self._parse_time(config.get("created_at")),
+            started_at=self._parse_time(snapshot.get("started_at")),
+            completed_at=self._parse_time(snapshot.get("completed_at")),
+            concurrent_limit=config.get("concurrent_limit", 3),
+            auto_retry_failed=config.get("auto_retry_failed", True),
+            pause_on_error=config.get("pause_on_error", False),
+            deadline=self._parse_time(config.get("deadline")),
+            budget=config.get("budget"),
+            user_id=config.get("user_id")
+        )
+        if config.get("ingest"):
+            ingest = snapshot.get("ingest") or {}
+            job.ingest_source = config["ingest"]
+            job.ingest_complete = ingest.get("complete", False)
+            job.ingest_stats = {"parsed": 0, "skipped": 0,
+                                "rejected": ingest.get("rejected", 0),
+                                "rejected_rows": ingest.get("rejected_rows", []),
+                                "next_index": ingest.get("next_index", 0),
+                                "error": ingest.get("error")}
+            job.payload_store = PayloadStore()
+        return job, requeued
+    
+    @staticmethod
+    def _parse_time(value: Optional[str]) -> Optional[datetime]:
+        """解析 ISO 格式時間"""
+        return datetime.fromisoformat(value) if value else None
+    
+    def _task_from_snapshot(self, snapshot: Dict[str, Any]) -> BatchTask:
+        """由日誌快照重建任務"""
+        definition = snapshot["definition"]
+        state = snapshot["state"]
+        return BatchTask(
+            id=snapshot["task_id"],
+            task_type=definition.get("type", "unknown"),
+            data=definition.get("data", {}),
+            priority=TaskPriority(definition.get("priority", 2)),
+            status=TaskStatus(snapshot["status"]),
+            created_at=self._parse_time(definition.get("created_at")),
+            started_at=self._parse_time(state.get("started_at")),
+            completed_at=self._parse_time(state.get("completed_at")),
+            result=state.get("result"),
+            error=state.get("error"),
+            progress=state.get("progress", 0.0),
+            retry_count=state.get("retry_count", 0),
+            cost=state.get("cost", 0.0),
+            max_retries=definition.get("max_retries", 3),
+            timeout_seconds=definition.get("timeout", 300),
+            dependencies=definition.get("dependencies", []),
+            deadline=self._parse_time(definition.get("deadline"))
+        )
+    
+    def _enqueue_task(self, task: BatchTask):
+        """將任務放入所屬作業的就緒隊列並喚醒調度器（必然逾期的任務不入隊）"""
+        with self.lock:
+            if self._check_deadline(task):
+                return
+            self._transition(task, TaskStatus.QUEUED)
+            urgency = self.duration_estimator.slack_key(task.task_type, task.deadline_ts)
+            self.scheduler.push(self._job_id_of(task), task, urgency)
+        self._wakeup()
+    
+    def _check_deadline(self, task: BatchTask) -> bool:
+        """
+        檢查任務是否必然逾期（現在開始、以觀測到的最短耗時執行也趕不上截止時間）
+        
+        Returns:
+            bool: 任務已被標記失敗（skip_missed_deadlines 時），不應再執行
+        """
+        if task.deadline_ts is None:
+            return False
+        if time.time() + self.duration_estimator.lower_bound(task.task_type) <= task.deadline_ts:
+            return False
+        
+        if not self.skip_missed_deadlines:
+            if task.id not in self.deadline_at_risk:
+                self.deadline_at_risk.add(task.id)
+                logger.warning(f"任務預計逾期，仍繼續執行: {task.id}")
+            return False
+        
+        task.error = f"預計無法在截止時間 {task.deadline.isoformat()} 前完成，已跳過"
+        task.completed_at = datetime.now()
+        self._transition(task, TaskStatus.FAILED)
+        self.stats["deadline_skipped"] += 1
+        self.stats["failed_tasks"] += 1
+        logger.warning(f"任務必然逾期，跳過執行: {task.id}")
+        self._cascade_downstream(task)
+        self._update_job_progress(task)
         return True
     
+    def _wakeup(self):
+        """請求事件循環執行一次調度（可從任意線程調用）"""
+        loop = self._loop
+        if loop is None or not self.is_running:
+            return
+        with self.lock:
+            if self._dispatch_scheduled:
+                return
+            self._dispatch_scheduled = True
+        try:
+            loop.call_soon_threadsafe(self._dispatch)
+        except RuntimeError:
+            # 事件循環已關閉
+            with self.lock:
+                self._dispatch_scheduled = False
+    
     def start_processor(self):
-        """啟動批量處理器"""
+        """啟動批量處理器（在專屬線程中運行自有的事件循環）"""
         if self.is_running:
             return
         
         self.is_running = True
-        self.processor_thread = threading.Thread(target=self._process_loop, daemon=True)
+        self._loop = asyncio.new_event_loop()
+        loop_ready = threading.Event()
+        self.processor_thread = threading.Thread(
+            target=self._run_loop, args=(loop_ready,),
+            name="BatchProcessorLoop", daemon=True
+        )
         self.processor_thread.start()
+        loop_ready.wait(timeout=5)
         logger.info("批量處理器已啟動")
     
     def stop_processor(self):
-        """停止批量處理器"""
+        """停止批量處理器（同時停止租約續約，租約過期後作業可由其他處理器接管）"""
+        self._lease_stop.set()
+        if not self.is_running:
+            return
+        
         self.is_running = False
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+            except RuntimeError:
+                pass
         if self.processor_thread:
             self.processor_thread.join(timeout=5)
+        if self.process_executor is not None:
+            self.process_executor.shutdown(wait=False, cancel_futures=True)
+            self.process_executor = None
         logger.info("批量處理器已停止")
     
-    def _process_loop(self):
-        """處理器主循環"""
+    def _run_loop(self, loop_ready: threading.Event):
+        """事件循環線程入口"""
         start_time = time.time()
+        loop = self._loop
+        asyncio.set_event_loop(loop)
+        loop.call_soon(loop_ready.set)
+        # 處理啟動前已入隊的任務
+        self._dispatch_scheduled = True
+        loop.call_soon(self._dispatch)
         
-        while self.is_running:
-            try:
-                # 從隊列獲取任務
-                try:
-                    priority, queued_time, task_id = self.task_queue.get(timeout=1)
-                except queue.Empty:
-                    time.sleep(0.1)
-                    continue
+        try:
+            loop.run_forever()
+        finally:
+            # 取消仍在運行的任務並關閉事件循環
+            pending = asyncio.all_tasks(loop)
+            for pending_task in pending:
+                pending_task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.close()
+            self._loop = None
+            self._dispatch_scheduled = False
+            
+            # 更新運行時間統計
+            self.stats["uptime_seconds"] += time.time() - start_time
+    
+    def _dispatch(self):
+        """調度器：在空閒槽位上啟動就緒任務（僅在事件循環線程中運行）"""
+        with self.lock:
+            self._dispatch_scheduled = False
+        
+        while self.is_running and len(self.active_tasks) < self.max_workers:
+            with self.lock:
+                selected = self.scheduler.pop()
+                if selected is None:
+                    return
+                job_id, task_id = selected
                 
-                # 檢查是否超過並發限制
-                if len(self.active_tasks) >= self.max_workers:
-                    # 重新排隊
-                    self.task_queue.put((priority, queued_time, task_id))
-                    time.sleep(0.1)
+                task = self.tasks.get(task_id)
+                if task is None or not self._can_process_task(task):
+                    self.scheduler.release_if_idle(job_id)
                     continue
-                
-                # 獲取任務
-                if task_id not in self.tasks:
+                # 每次調度只解碼一次任務資料（PayloadStore 中的資料每次訪問都會解碼）
+                data = task.data
+                if not self._acquire_provider_slot(task, job_id, data):
+                    self.scheduler.release_if_idle(job_id)
                     continue
-                
-                task = self.tasks[task_id]
-                
-                # 檢查任務是否可以處理
-                if not self._can_process_task(task):
+                if not self._reserve_budget(task, job_id, data):
+                    self._release_provider_slot(task)
+                    self.scheduler.release_if_idle(job_id)
                     continue
-                
-                # 啟動任務處理
-                asyncio_task = asyncio.create_task(self._process_task(task))
-                self.active_tasks[task_id] = asyncio_task
-                
-                # 清理完成的任務
-                self._cleanup_completed_tasks()
-                
+                self.scheduler.task_started(job_id)
+            
+            try:
+                asyncio_task = self._loop.create_task(self._process_task(task, data))
             except Exception as e:
-                logger.error(f"處理器循環錯誤: {str(e)}")
-                time.sleep(1)
+                logger.error(f"調度任務失敗 {task_id}: {str(e)}")
+                self._settle_budget(task, 0.0)
+                self._release_provider_slot(task)
+                with self.lock:
+                    self.scheduler.task_finished(job_id)
+                continue
+            self.active_tasks[task_id] = asyncio_task
+            asyncio_task.add_done_callback(
+                lambda _t, job_id=job_id, task_id=task_id: self._on_task_done(job_id, task_id)
+            )
+    
+    @staticmethod
+    def _provider_of(data: Dict[str, Any]) -> Optional[str]:
+        """任務調用的服務商（沒有指定服務商的任務不受服務商併發限制）"""
+        return data.get("api_provider") or data.get("provider") or None
+    
+    def _provider_limiter(self, provider: str) -> AdaptiveLimiter:
+        """服務商的自適應限制器；首次建立時以全局併發數為初始上限，之後由 AIMD 調整"""
+        return self.limiters.get(provider, initial_limit=self.max_workers)
+    
+    def _acquire_provider_slot(self, task: BatchTask, job_id: str, data: Dict[str, Any]) -> bool:
+        """取得服務商併發名額；名額已滿時任務保持排隊，等待該服務商釋放名額"""
+        provider = self._provider_of(data)
+        if provider is None:
+            return True
+        
+        limiter = self._provider_limiter(provider)
+        if limiter.try_acquire():
+            self.provider_slots[task.id] = provider
+            return True
         
-        # 更新運行時間統計
-        self.stats["uptime_seconds"] += time.time() - start_time
+        waiting = self.provider_waiting.get(provider)
+        if waiting is None:
+            waiting = self.provider_waiting[provider] = deque()
+            limiter.add_listener(functools.partial(self._on_provider_release, provider))
+        waiting.append((job_id, task.id))
+        return False
+    
+    def _release_provider_slot(self, task: BatchTask, latency: Optional[float] = None,
+                               error: Optional[BaseException] = None):
+        """釋放服務商名額並回報本次調用的耗時與錯誤"""
+        provider = self.provider_slots.pop(task.id, None)
+        if provider is not None:
+            self._provider_limiter(provider).release(latency, error)
+    
+    def _on_provider_release(self, provider: str):
+        """服務商釋放名額（可能來自其他線程）：在事件循環中放回等待的任務"""
+        loop = self._loop
+        if not self.provider_waiting.get(provider) or loop is None or not self.is_running:
+            return
+        try:
+            loop.call_soon_threadsafe(self._resume_provider_tasks, provider)
+        except RuntimeError:
+            pass
+    
+    def _resume_provider_tasks(self, provider: str):
+        """按服務商的空閒名額數將等待的任務放回就緒隊列"""
+        waiting = self.provider_waiting.get(provider)
+        if not waiting:
+            return
+        
+        with self.lock:
+            for _ in range(max(1, self._provider_limiter(provider).available)):
+                if not waiting:
+                    break
+                job_id, task_id = waiting.popleft()
+                task = self.tasks.get(task_id)
+                if task is not None and task.status == TaskStatus.QUEUED:
+                    self._enqueue_task(task)
+    
+    def _reserve_budget(self, task: BatchTask, job_id: str, data: Dict[str, Any]) -> bool:
+        """按預估成本預留預算；預算不足時任務轉為暫停並暫停作業"""
+        amount = self.budget.estimate(task.task_type, data)
+        if not self.budget.reserve(job_id, amount):
+            self._transition(task, TaskStatus.PAUSED)
+            self._pause_for_budget(job_id)
+            return False
+        self.task_reservations[task.id] = amount
+        return True
+    
+    def _settle_budget(self, task: BatchTask, actual: float, observed: bool = False,
+                       data: Optional[Dict[str, Any]] = None):
+        """以實際成本結算任務的預留（observed 為 True 時計入成本估計）"""
+        reserved = self.task_reservations.pop(task.id, None)
+        if reserved is None:
+            return
+        self.budget.reconcile(self._job_id_of(task), reserved, actual,
+                              task.task_type if observed else None, data)
+    
+    def _on_task_done(self, job_id: str, task_id: str):
+        """任務結束事件：釋放槽位並立即補位"""
+        self.active_tasks.pop(task_id, None)
+        with self.lock:
+            self.scheduler.task_finished(job_id)
+        
+        # 中止期間作業已恢復：被暫停的任務重新入隊
+        task = self.tasks.get(task_id)
+        if (task is not None and task.status == TaskStatus.PAUSED
+                and job_id not in self.paused_jobs and self.jobs.get(job_id) is not None
+                and self.jobs[job_id].status == TaskStatus.PROCESSING):
+            self._enqueue_task(task)
+        self._dispatch()
     
     def _can_process_task(self, task: BatchTask) -> bool:
         """檢查任務是否可以處理"""
@@ -375,113 +1775,221 @@ class BatchProcessor:
         # 檢查任務類型是否有處理器
         if task.task_type not in self.task_processors:
             logger.error(f"未找到任務處理器: {task.task_type}")
-            task.status = TaskStatus.FAILED
             task.error = f"未找到任務處理器: {task.task_type}"
+            self._transition(task, TaskStatus.FAILED)
+            self._cascade_downstream(task)
+            self._update_job_progress(task)
             return False
         
-        # 檢查作業是否暫停
-        job_id = task.id.split("_task_")[0]
+        # 檢查作業是否暫停（恢復時會重新入隊）
+        job_id = self._job_id_of(task)
         if job_id in self.paused_jobs:
+            self._transition(task, TaskStatus.PAUSED)
+            return False
+        
+        # 排隊期間可能已無法趕上截止時間
+        if self._check_deadline(task):
             return False
         
         return True
     
-    async def _process_task(self, task: BatchTask):
-        """處理單個任務"""
+    async def _process_task(self, task: BatchTask, data: Dict[str, Any]):
+        """處理單個任務（data 為調度時解碼的任務資料）"""
+        cost_token = bind_task(task)
+        cost_before = task.cost
+        shared = False
+        call_started = None
+        call_latency = None  # 服務商調用結束（成功或失敗）時的耗時
+        failure = None
         try:
-            task.status = TaskStatus.PROCESSING
             task.started_at = datetime.now()
+            self._transition(task, TaskStatus.PROCESSING)
             
-            # 調用進度回調
-            await self._call_progress_callbacks(task)
-            
-            # 獲取處理器函數
-            processor = self.task_processors[task.task_type]
-            
-            # 設置超時
+            # 設置超時（相同的生成請求進行中時共用其結果）
+            key = generation_request_key(task.task_type, data) if self.coalesce_requests else None
+            call_started = time.monotonic()
             try:
-                result = await asyncio.wait_for(
-                    processor(task.data),
+                result, shared = await asyncio.wait_for(
+                    self.singleflight.do(key, lambda: self._run_processor(task.task_type, data)),
                     timeout=task.timeout_seconds
                 )
+                call_latency = time.monotonic() - call_started
+                if shared:
+                    logger.info(f"任務共用進行中的相同請求結果: {task.id}")
+                elif task.cost == cost_before:
+                    # 進程通道等無法記錄到任務上下文的處理器由結果攜帶費用
+                    task.cost += result_cost(result)
+                
+                # 大型結果寫入磁碟（編碼與寫入在線程池中進行），任務只保留引用
+                if self.result_store is not None:
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, self.result_store.put, task.id, result
+                    )
                 
-                task.status = TaskStatus.COMPLETED
                 task.result = result
                 task.progress = 100.0
                 task.completed_at = datetime.now()
+                self._transition(task, TaskStatus.COMPLETED)
                 
                 self.stats["completed_tasks"] += 1
+                self._record_task_time(task)
                 
-                # 更新作業進度
+                # 釋放後繼任務並更新作業進度
+                self._release_dependents(task)
                 self._update_job_progress(task)
                 
                 logger.info(f"任務完成: {task.id}")
                 
             except asyncio.TimeoutError:
-                task.status = TaskStatus.FAILED
-                task.error = f"任務超時 ({task.timeout_seconds}秒)"
-                logger.error(f"任務超時: {task.id}")
+                # 超時按一般失敗處理（可重試）
+                raise TimeoutError(f"任務超時 ({task.timeout_seconds}秒)")
+            
+        except asyncio.CancelledError:
+            status = self.abort_requests.pop(task.id, None)
+            if status is None:
+                raise  # 非作業控制引起的取消（如事件循環關閉）
+            self._record_aborted_task(task, status, task.cost - cost_before)
             
         except Exception as e:
-            task.status = TaskStatus.FAILED
+            failure = e
+            if call_started is not None and call_latency is None:
+                call_latency = time.monotonic() - call_started
             task.error = str(e)
             task.completed_at = datetime.now()
+            self._transition(task, TaskStatus.FAILED)
             
             self.stats["failed_tasks"] += 1
             logger.error(f"任務處理失敗 {task.id}: {str(e)}")
             
-            # 檢查是否需要重試
-            if task.retry_count < task.max_retries:
+            # 檢查是否需要重試（退避期間不佔用工作槽位）
+            job = self.jobs.get(self._job_id_of(task))
+            auto_retry = job.auto_retry_failed if job is not None else True
+            if auto_retry and task.retry_count < task.max_retries:
                 task.retry_count += 1
-                task.status = TaskStatus.QUEUED
-                priority_value = -task.priority.value
-                self.task_queue.put((priority_value, time.time(), task.id))
-                logger.info(f"任務重試 {task.id}: {task.retry_count}/{task.max_retries}")
+                delay = self.retry_policy.compute_delay(task.retry_count, e)
+                self.retry_stats.record(delay, get_retry_after(e) is not None)
+                self._park_task(task, delay)
+                logger.info(f"任務重試 {task.id}: {task.retry_count}/{task.max_retries}，{delay:.2f} 秒後重新排隊")
+            else:
+                # 最終失敗：級聯至下游並檢查作業是否結束
+                self._cascade_downstream(task)
+                self._update_job_progress(task)
         
         finally:
-            # 從活動任務中移除
-            if task.id in self.active_tasks:
-                del self.active_tasks[task.id]
-            
-            # 調用進度回調
-            await self._call_progress_callbacks(task)
+            self.abort_requests.pop(task.id, None)
+            unbind_task(cost_token)
+            # 結算預算：以處理器記錄的費用為準；未記錄費用的成功任務按預估成本計，
+            # 共用他人結果的任務與未產生費用的失敗任務不計費
+            actual = task.cost - cost_before
+            if actual > 0:
+                self._settle_budget(task, actual, observed=True, data=data)
+            elif task.status == TaskStatus.COMPLETED and not shared:
+                self._settle_budget(task, self.task_reservations.get(task.id, 0.0))
+            else:
+                self._settle_budget(task, 0.0)
+            # 釋放服務商名額：共用結果或被中止的調用不計入延遲樣本
+            if call_latency is not None and not shared:
+                self._release_provider_slot(task, call_latency, failure)
+            else:
+                self._release_provider_slot(task)
     
-    def _cleanup_completed_tasks(self):
-        """清理已完成的任務"""
-        completed_tasks = []
-        for task_id, asyncio_task in self.active_tasks.items():
-            if asyncio_task.done():
-                completed_tasks.append(task_id)
+    async def _run_processor(self, task_type: str, data: Dict[str, Any]) -> Any:
+        """按處理器的執行通道調用處理函數"""
+        processor = self.task_processors[task_type]
+        lane = self.task_lanes.get(task_type, ExecutionLane.ASYNC)
+        
+        if lane == ExecutionLane.ASYNC:
+            return await processor(data)
         
-        for task_id in completed_tasks:
-            del self.active_tasks[task_id]
+        loop = asyncio.get_running_loop()
+        if lane == ExecutionLane.THREAD:
+            # 複製上下文，使處理器中的 record_task_cost 記錄到當前任務
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self.executor, functools.partial(context.run, processor, data))
+        
+        # 進程通道：超時只放棄等待，已提交的子進程工作會執行至結束
+        payload, segments = export_payload(data)
+        try:
+            return await loop.run_in_executor(self.process_executor, run_in_process, processor, payload)
+        finally:
+            release_segments(segments)
     
-    def _update_job_progress(self, task: BatchTask):
-        """更新作業進度"""
-        job_id = task.id.split("_task_")[0]
-        if job_id not in self.jobs:
+    def _park_task(self, task: BatchTask, delay: float):
+        """將重試任務暫存至延遲隊列，退避結束後再放入就緒隊列"""
+        self._transition(task, TaskStatus.QUEUED)
+        self.parked_tasks[task.id] = self._loop.call_later(delay, self._release_parked_task, task.id)
+    
+    def _release_parked_task(self, task_id: str):
+        """退避結束：重新排隊（作業已取消或暫停時跳過）"""
+        self.parked_tasks.pop(task_id, None)
+        task = self.tasks.get(task_id)
+        if task is None or task.status != TaskStatus.QUEUED:
             return
+        if self._job_id_of(task) in self.paused_jobs:
+            self._transition(task, TaskStatus.PAUSED)
+            return
+        self._enqueue_task(task)
+    
+    def _record_task_time(self, task: BatchTask):
+        """以增量方式更新平均任務處理時間、任務類型耗時估計與截止時間達成情況"""
+        duration = task.completed_ts - task.started_ts
+        self._timed_tasks += 1
+        self.stats["average_task_time"] += (duration - self.stats["average_task_time"]) / self._timed_tasks
+        self.duration_estimator.observe(task.task_type, duration)
         
-        job = self.jobs[job_id]
-        completed_tasks = sum(1 for t in job.tasks if t.status == TaskStatus.COMPLETED)
-        job.progress = (completed_tasks / len(job.tasks)) * 100
-        
-        # 檢查作業是否完成
-        all_completed = all(t.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED] for t in job.tasks)
-        if all_completed:
-            job.status = TaskStatus.COMPLETED
-            job.completed_at = datetime.now()
-            self.stats["completed_jobs"] += 1
+        if task.deadline_ts is not None:
+            if task.completed_ts <= task.deadline_ts:
+                self.stats["deadline_met"] += 1
+            else:
+                self.stats["deadline_missed"] += 1
+            self.deadline_at_risk.discard(task.id)
+    
+    def _update_job_progress(self, task: BatchTask):
+        """更新任務所屬作業的進度"""
+        job = self.jobs.get(self._job_id_of(task))
+        if job is not None:
+            self._refresh_job_progress(job)
+    
+    def _refresh_job_progress(self, job: BatchJob):
+        """更新作業進度並檢查作業是否結束"""
+        with self.lock:
+            if job.tasks:
+                job.progress = (job.task_counts[TaskStatus.COMPLETED.value] / len(job.tasks)) * 100
             
-            # 調用完成回調
-            asyncio.create_task(self._call_completion_callbacks(job))
+            # 檢查作業是否完成（已取消的作業保持取消狀態，串流匯入須先讀完來源）
+            if job.status not in [TaskStatus.PROCESSING, TaskStatus.PAUSED] or not job.ingest_complete:
+                return
+            if job.finished_tasks != len(job.tasks):
+                return
+            job.completed_at = datetime.now()
+            # 匯入出錯（如中斷後來源不可用）的作業缺少部分記錄，不視為完成
+            if job.ingest_stats and job.ingest_stats.get("error"):
+                self._transition_job(job, TaskStatus.FAILED)
+                self.stats["failed_jobs"] += 1
+            else:
+                self._transition_job(job, TaskStatus.COMPLETED)
+                self.stats["completed_jobs"] += 1
+        
+        # 調用完成回調
+        self._schedule_coroutine(self._call_completion_callbacks(job))
     
-    async def _call_progress_callbacks(self, task: BatchTask):
-        """調用進度回調函數"""
+    def _schedule_coroutine(self, coro):
+        """在處理器事件循環上執行協程（可從任意線程調用）"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            coro.close()
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(coro, loop)
+        except RuntimeError:
+            coro.close()
+    
+    def _notify_progress(self, task: BatchTask):
+        """調用進度回調（同步回調立即執行，協程回調排程至事件循環）"""
         for callback in self.progress_callbacks:
             try:
                 if asyncio.iscoroutinefunction(callback):
-                    await callback(task)
+                    self._schedule_coroutine(callback(task))
                 else:
                     callback(task)
             except Exception as e:
@@ -506,9 +2014,7 @@ class BatchProcessor:
         job = self.jobs[job_id]
         
         # 統計任務狀態
-        task_stats = {}
-        for status in TaskStatus:
-            task_stats[status.value] = sum(1 for t in job.tasks if t.status == status)
+        task_stats = dict(job.task_counts)
         
         # 計算處理時間
         processing_time = None
@@ -530,7 +2036,19 @@ class BatchProcessor:
             "task_statistics": task_stats,
             "concurrent_limit": job.concurrent_limit,
             "auto_retry_failed": job.auto_retry_failed,
-            "pause_on_error": job.pause_on_error
+            "pause_on_error": job.pause_on_error,
+            "deadline": job.deadline.isoformat() if job.deadline else None,
+            "pause_reason": job.pause_reason,
+            "budget": self.budget.get_job_budget(job_id),
+            "ingest": {
+                "complete": job.ingest_complete,
+                "parsed": job.ingest_stats["parsed"],
+                "skipped": job.ingest_stats["skipped"],
+                "rejected": job.ingest_stats["rejected"],
+                "rejected_rows": list(job.ingest_stats["rejected_rows"]),
+                "error": job.ingest_stats["error"]
+            } if job.ingest_stats is not None else None,
+            "payload_store": job.payload_store.get_stats() if job.payload_store is not None else None
         }
     
     def get_task_status(self, task_id: str) -> Dict:
@@ -558,20 +2076,50 @@ class BatchProcessor:
             "completed_at": task.completed_at.isoformat() if task.completed_at else None,
             "processing_time_seconds": round(processing_time, 2) if processing_time else None,
             "retry_count": task.retry_count,
+            "cost": task.cost,
             "max_retries": task.max_retries,
             "error": task.error,
             "dependencies": task.dependencies,
-            "has_result": task.result is not None
+            "unmet_dependencies": self.unmet_dependencies.get(task_id, 0),
+            "deadline": task.deadline.isoformat() if task.deadline else None,
+            "deadline_at_risk": task_id in self.deadline_at_risk,
+            "has_result": task.result is not None,
+            "result_spilled": self.result_store is not None and self.result_store.is_ref(task.result)
         }
     
+    def get_task_result(self, task_id: str) -> Dict:
+        """獲取任務結果（寫入磁碟的結果經 mmap 載入）"""
+        task = self.tasks.get(task_id)
+        if task is None:
+            return {"success": False, "error": f"任務不存在: {task_id}"}
+        if task.status != TaskStatus.COMPLETED:
+            return {"success": False, "error": f"任務尚未完成: {task_id}"}
+        
+        result = task.result
+        if self.result_store is not None:
+            try:
+                result = self.result_store.load(result)
+            except OSError as e:
+                logger.error(f"讀取任務結果失敗 {task_id}: {str(e)}")
+                return {"success": False, "error": f"讀取任務結果失敗: {str(e)}"}
+        return {"success": True, "task_id": task_id, "result": result}
+    
+    def iter_task_result(self, task_id: str):
+        """
+        以 JSON 位元組分塊產出已完成任務的結果（寫入磁碟的結果不整體載入記憶體）
+        
+        Raises:
+            KeyError: 任務不存在或尚未完成
+        """
+        task = self.tasks.get(task_id)
+        if task is None or task.status != TaskStatus.COMPLETED:
+            raise KeyError(task_id)
+        if self.result_store is None:
+            return iter([json.dumps(task.result, ensure_ascii=False, default=str).encode('utf-8')])
+        return self.result_store.iter_chunks(task.result)
+    
     def get_system_stats(self) -> Dict:
         """獲取系統統計"""
-        # 計算平均任務處理時間
-        completed_tasks = [t for t in self.tasks.values() if t.status == TaskStatus.COMPLETED and t.started_at and t.completed_at]
-        if completed_tasks:
-            total_time = sum((t.completed_at - t.started_at).total_seconds() for t in completed_tasks)
-            self.stats["average_task_time"] = total_time / len(completed_tasks)
-        
         return {
             "success": True,
             "system_status": {
@@ -580,9 +2128,21 @@ class BatchProcessor:
                 "max_workers": self.max_workers,
                 "max_concurrent_jobs": self.max_concurrent_jobs,
                 "active_tasks": len(self.active_tasks),
-                "queued_tasks": self.task_queue.qsize(),
-                "registered_processors": list(self.task_processors.keys())
+                "parked_retry_tasks": len(self.parked_tasks),
+                "queued_tasks": self.scheduler.queued_count,
+                "registered_processors": list(self.task_processors.keys()),
+                "processor_lanes": {task_type: lane.value for task_type, lane in self.task_lanes.items()},
+                "process_workers": self.process_workers if self.process_executor is not None else 0
             },
+            "scheduler": self.scheduler.get_stats(),
+            "journal": self.journal.get_stats() if self.journal is not None else None,
+            "retry_delays": self.retry_stats.to_dict(),
+            "coalescing": {"enabled": self.coalesce_requests, **self.singleflight.get_stats()},
+            "duration_estimates": self.duration_estimator.get_stats(),
+            "budget": self.budget.get_stats(),
+            "provider_limits": self.limiters.get_stats(),
+            "provider_waiting": {provider: len(waiting) for provider, waiting in self.provider_waiting.items() if waiting},
+            "result_store": self.result_store.get_stats() if self.result_store is not None else None,
             "statistics": self.stats,
             "performance_metrics": {
                 "tasks_per_minute": (self.stats["completed_tasks"] / max(1, self.stats["uptime_seconds"] / 60)) if self.stats["uptime_seconds"] > 0 else 0,
@@ -600,14 +2160,29 @@ class BatchProcessor:
             if job.created_at < cutoff_date and job.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]:
                 old_jobs.append(job_id)
                 
-                # 清理相關任務
-                for task in job.tasks:
-                    if task.id in self.tasks:
-                        del self.tasks[task.id]
+                with self.lock:
+                    self.scheduler.remove_job(job_id)
+                if self.journal is not None:
+                    self.journal.remove_job(job_id)
+                
+                # 清理相關任務及依賴索引
+                with self.lock:
+                    for task in job.tasks:
+                        self.tasks.pop(task.id, None)
+                        self.dependents.pop(task.id, None)
+                        self.unmet_dependencies.pop(task.id, None)
+                        self.deadline_at_risk.discard(task.id)
+                        if self.result_store is not None:
+                            self.result_store.release(task.id)
                 
                 # 清理作業
+                self.budget.remove_job(job_id)
                 del self.jobs[job_id]
         
+        # 壓縮日誌，只保留各任務的最新狀態
+        if self.journal is not None and old_jobs:
+            self.journal.compact()
+        
         logger.info(f"清理 {len(old_jobs)} 個舊作業")
         return {
             "success": True,
@@ -642,23 +2217,15 @@ class BatchProcessor:
                         continue
                 
                 # 統計任務狀態
+                counts = job.task_counts
                 task_stats = {
                     "total": len(job.tasks),
-                    "completed": 0,
-                    "failed": 0,
-                    "processing": 0,
-                    "pending": 0
+                    "completed": counts[TaskStatus.COMPLETED.value],
+                    "failed": counts[TaskStatus.FAILED.value],
+                    "processing": counts[TaskStatus.PROCESSING.value]
                 }
-                
-                for task in job.tasks:
-                    if task.status == TaskStatus.COMPLETED:
-                        task_stats["completed"] += 1
-                    elif task.status == TaskStatus.FAILED:
-                        task_stats["failed"] += 1
-                    elif task.status == TaskStatus.PROCESSING:
-                        task_stats["processing"] += 1
-                    else:
-                        task_stats["pending"] += 1
+                task_stats["pending"] = (task_stats["total"] - task_stats["completed"]
+                                         - task_stats["failed"] - task_stats["processing"])
                 
                 jobs_list.append({
                     "id": job.id,
@@ -0,0 +1,232 @@
+"""
+內容定址二進位存儲 v2.7
+圖片等二進位內容按 SHA-256 存於本地磁碟（按雜湊前綴分兩層子目錄），同一內容只存一份；
+緩存層只保存指向雜湊的小型記錄，讀取時返回檔案路徑、檔案物件或 mmap，不複製整份內容
+"""
+
+import os
+import re
+import mmap
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Any, BinaryIO, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# 常見圖片格式的檔案簽名
+_IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif')
+)
+
+class BlobStore:
+    """按內容雜湊定址的本地二進位存儲"""
+
+    def __init__(self, root: str = None, max_bytes: Optional[int] = None,
+                 max_idle_seconds: Optional[float] = 7 * 86400, gc_interval: float = 600):
+        """
+        初始化存儲
+
+        Args:
+            root: 存儲目錄，預設為項目根目錄下 data/cache_blobs
+            max_bytes: 磁碟用量上限，超過時按最久未訪問刪除，None 表示不限
+            max_idle_seconds: 超過此秒數未被訪問的內容在清理時刪除，None 表示不按時間清理
+            gc_interval: 寫入時觸發清理的最短間隔（秒）
+        """
+        if root is None:
+            project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+            root = os.path.join(project_root, 'data', 'cache_blobs')
+
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_idle_seconds = max_idle_seconds
+        self.gc_interval = gc_interval
+        os.makedirs(self.root, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self._last_gc = time.time()
+        self.stats = {
+            "stored": 0,
+            "deduplicated": 0,
+            "bytes_written": 0,
+            "reads": 0,
+            "missing": 0,
+            "removed": 0
+        }
+
+    @staticmethod
+    def is_digest(value: Any) -> bool:
+        """判斷是否為有效的內容雜湊"""
+        return isinstance(value, str) and _DIGEST_PATTERN.match(value) is not None
+
+    def path(self, digest: str) -> str:
+        """
+        內容的檔案路徑（可直接交給 send_file 以 sendfile 傳送）
+
+        Raises:
+            ValueError: 雜湊格式無效
+        """
+        if not self.is_digest(digest):
+            raise ValueError(f"無效的內容雜湊: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    # 寫入
+
+    def put(self, data: bytes) -> str:
+        """
+        保存內容（已存在時只更新訪問時間）
+
+        Returns:
+            str: 內容的 SHA-256 雜湊
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            self._touch(path)
+            self.stats["deduplicated"] += 1
+            return digest
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # 寫入臨時檔案後原子替換，讀取方與並發寫入同一內容的進程不會看到部分內容
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        self.stats["stored"] += 1
+        self.stats["bytes_written"] += len(data)
+
+        if time.time() - self._last_gc >= self.gc_interval:
+            self.collect_garbage()
+        return digest
+
+    # 讀取
+
+    def exists(self, digest: str) -> bool:
+        """內容是否存在"""
+        return self.is_digest(digest) and os.path.exists(self.path(digest))
+
+    def open(self, digest: str) -> BinaryIO:
+        """
+        以唯讀檔案物件打開內容
+
+        Raises:
+            FileNotFoundError: 內容不存在（已被清理）
+        """
+        path = self.path(digest)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            self.stats["missing"] += 1
+            raise
+        self._touch(path)
+        self.stats["reads"] += 1
+        return f
+
+    def mmap(self, digest: str) -> mmap.mmap:
+        """
+        以唯讀 mmap 映射內容（調用方負責 close）
+
+        Raises:
+            FileNotFoundError: 內容不存在（已被清理）
+        """
+        with self.open(digest) as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def guess_mime_type(self, digest: str, default: str = 'application/octet-stream') -> str:
+        """按檔案簽名判斷圖片類型"""
+        try:
+            with open(self.path(digest), 'rb') as f:
+                header = f.read(12)
+        except (OSError, ValueError):
+            return default
+        for signature, mime_type in _IMAGE_SIGNATURES:
+            if header.startswith(signature):
+                return mime_type
+        if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+            return 'image/webp'
+        return default
+
+    def delete(self, digest: str) -> bool:
+        """刪除內容"""
+        try:
+            os.unlink(self.path(digest))
+        except (FileNotFoundError, ValueError):
+            return False
+        self.stats["removed"] += 1
+        return True
+
+    @staticmethod
+    def _touch(path: str):
+        """更新訪問時間（作為清理依據的最近使用時間）"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    # 清理
+
+    def collect_garbage(self) -> Dict[str, int]:
+        """
+        刪除閒置過久的內容，並在超過磁碟用量上限時按最久未訪問刪除
+
+        Returns:
+            Dict: 剩餘檔案數、位元組數與本次刪除數
+        """
+        with self.lock:
+            self._last_gc = time.time()
+            entries = []
+            for directory, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+            removed = 0
+            cutoff = time.time() - self.max_idle_seconds if self.max_idle_seconds is not None else None
+            total = sum(size for _, size, _ in entries)
+            entries.sort()
+            kept = len(entries)
+            for mtime, size, path in entries:
+                over_budget = self.max_bytes is not None and total > self.max_bytes
+                # 殘留的臨時檔案（寫入中斷）按閒置時間一併清理
+                idle = cutoff is not None and mtime < cutoff
+                if not over_budget and not idle:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total -= size
+                kept -= 1
+                removed += 1
+
+            if removed:
+                self.stats["removed"] += removed
+                logger.info(f"清理 {removed} 個緩存二進位內容")
+            return {"files": kept, "bytes": total, "removed": removed}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取存儲統計"""
+        return {
+            **self.stats,
+            "root": self.root,
+            "max_bytes": self.max_bytes
+        }
@@ -0,0 +1,209 @@
+"""
+緩存序列化器 v2.7
+RedisCache 以二進位格式存儲值：首位元組標記序列化格式與是否壓縮，
+其後為序列化內容；大型值以 zlib 壓縮。以 JSON 起始字元開頭的無標記值按舊版 JSON 文字解碼，
+只接受允許讀取的格式，其他值視為無法解碼（由 RedisCache 視為未命中）
+"""
+
+import json
+import zlib
+import pickle
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 首位元組：低 7 位為格式代碼，最高位表示內容經 zlib 壓縮
+_COMPRESSED_FLAG = 0x80
+
+# 舊版 JSON 文字值的起始字元（與格式代碼不重疊）
+_LEGACY_JSON_START = frozenset(b'{["-0123456789tfn')
+
+# 預設允許讀取的格式（不含 pickle：反序列化可執行任意代碼）
+SAFE_READERS = frozenset({"json", "msgpack"})
+
+class UndecodableValueError(ValueError):
+    """緩存值的格式未知、不允許讀取或內容損壞"""
+
+class Serializer:
+    """序列化器基類"""
+
+    name = "base"
+    code = 0
+
+    def dumps(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+class JSONSerializer(Serializer):
+    """JSON（UTF-8）"""
+
+    name = "json"
+    code = 0x01
+
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+class PickleSerializer(Serializer):
+    """
+    pickle 協議 5
+
+    支援任意 Python 物件；只應在 Redis 僅由受信任的服務訪問時使用（反序列化可執行任意代碼）。
+    """
+
+    name = "pickle"
+    code = 0x02
+
+    def dumps(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol=5)
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+class MsgpackSerializer(Serializer):
+    """MessagePack（需要 msgpack 套件；bytes 值原樣保存，不需 base64）"""
+
+    name = "msgpack"
+    code = 0x03
+
+    def __init__(self):
+        if not MSGPACK_AVAILABLE:
+            raise RuntimeError("msgpack 模組未安裝")
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+_SERIALIZERS = {
+    JSONSerializer.name: JSONSerializer,
+    PickleSerializer.name: PickleSerializer,
+    MsgpackSerializer.name: MsgpackSerializer
+}
+
+class CacheCodec:
+    """帶格式標記與可選壓縮的編碼器（只讀取允許的格式）"""
+
+    def __init__(self, serializer: Optional[Serializer] = None,
+                 compress_threshold: Optional[int] = 1024, compress_level: int = 1,
+                 allowed_readers: Optional[Iterable[str]] = None):
+        """
+        Args:
+            serializer: 寫入使用的序列化器，預設 msgpack 可用時為 msgpack，否則為 JSON
+            compress_threshold: 序列化後超過此位元組數時以 zlib 壓縮，None 表示不壓縮
+            compress_level: zlib 壓縮等級
+            allowed_readers: 除寫入格式外允許讀取的格式名稱，預設為 SAFE_READERS；
+                pickle 只有作為寫入格式或在此明確列出時才會被讀取
+
+        Raises:
+            ValueError: allowed_readers 包含未知的格式
+        """
+        self.serializer = serializer or default_serializer()
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        allowed = set(SAFE_READERS if allowed_readers is None else allowed_readers)
+        unknown = allowed - set(_SERIALIZERS)
+        if unknown:
+            raise ValueError(f"未知的序列化器: {', '.join(sorted(unknown))}")
+        self.allowed_readers = frozenset(allowed | {self.serializer.name})
+        self._readers: Dict[int, Serializer] = {self.serializer.code: self.serializer}
+        self.stats = {
+            "encoded_bytes": 0,
+            "raw_bytes": 0,
+            "compressed_values": 0
+        }
+
+    def encode(self, value: Any) -> bytes:
+        """序列化並按需壓縮"""
+        payload = self.serializer.dumps(value)
+        header = self.serializer.code
+        self.stats["raw_bytes"] += len(payload)
+        if self.compress_threshold is not None and len(payload) > self.compress_threshold:
+            compressed = zlib.compress(payload, self.compress_level)
+            # 不可壓縮的內容（如已壓縮的圖片）保持原樣
+            if len(compressed) < len(payload):
+                payload = compressed
+                header |= _COMPRESSED_FLAG
+                self.stats["compressed_values"] += 1
+        self.stats["encoded_bytes"] += len(payload) + 1
+        return bytes((header,)) + payload
+
+    def decode(self, data: bytes) -> Any:
+        """
+        解碼允許讀取的格式；以 JSON 起始字元開頭的無標記值按舊版 JSON 文字解碼
+
+        Raises:
+            UndecodableValueError: 格式未知、不允許讀取或內容損壞
+        """
+        try:
+            if isinstance(data, str):
+                return json.loads(data)
+            if not data:
+                raise UndecodableValueError("空的緩存值")
+            header = data[0]
+            if header in _LEGACY_JSON_START:
+                return json.loads(data)
+            reader = self._reader(header & ~_COMPRESSED_FLAG)
+            payload = memoryview(data)[1:]
+            if header & _COMPRESSED_FLAG:
+                payload = zlib.decompress(payload)
+            return reader.loads(bytes(payload))
+        except UndecodableValueError:
+            raise
+        except Exception as e:
+            raise UndecodableValueError(f"緩存值解碼失敗: {e}") from e
+
+    def _reader(self, code: int) -> Serializer:
+        reader = self._readers.get(code)
+        if reader is not None:
+            return reader
+        for serializer_class in _SERIALIZERS.values():
+            if serializer_class.code != code:
+                continue
+            if serializer_class.name not in self.allowed_readers:
+                raise UndecodableValueError(f"不允許讀取的緩存格式: {serializer_class.name}")
+            try:
+                reader = self._readers[code] = serializer_class()
+            except RuntimeError as e:
+                raise UndecodableValueError(f"無法解碼緩存值: {e}") from e
+            return reader
+        raise UndecodableValueError(f"未知的緩存格式代碼: {code:#04x}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取編碼統計"""
+        return {
+            **self.stats,
+            "serializer": self.serializer.name,
+            "allowed_readers": sorted(self.allowed_readers),
+            "compress_threshold": self.compress_threshold,
+            "compression_ratio": (self.stats["encoded_bytes"] / self.stats["raw_bytes"]) if self.stats["raw_bytes"] else None
+        }
+
+def default_serializer() -> Serializer:
+    """預設序列化器：msgpack 可用時為 msgpack，否則為 JSON"""
+    return MsgpackSerializer() if MSGPACK_AVAILABLE else JSONSerializer()
+
+def get_serializer(name: str) -> Serializer:
+    """
+    按名稱建立序列化器
+
+    Raises:
+        ValueError: 未知的序列化器
+        RuntimeError: 序列化器依賴的模組未安裝
+    """
+    serializer_class = _SERIALIZERS.get(name)
+    if serializer_class is None:
+        raise ValueError(f"未知的序列化器: {name}")
+    return serializer_class()
@@ -4,15 +4,29 @@ AI 批量圖片生成器 - 高級緩存服務
 提供記憶體緩存、Redis 支援和智能緩存失效機制
 """
 
+import os
+import sys
 import json
+import base64
+import binascii
 import time
+import heapq
+import math
+import random
 import hashlib
 import logging
-from typing import Any, Optional, Dict, Union
+import uuid
+from typing import Any, BinaryIO, Callable, Iterable, Optional, Dict, List, Tuple, Union
 from datetime import datetime, timedelta
 from functools import wraps
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import threading
 
+from .blob_store import BlobStore
+from .singleflight import SingleFlight
+from .cache_serializers import CacheCodec, Serializer, UndecodableValueError
+
 try:
     import redis
     REDIS_AVAILABLE = True
@@ -21,131 +35,297 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# 每個緩存項目在值之外的近似開銷（項目字典、有序字典節點與堆記錄）
+ENTRY_OVERHEAD = 256
+
+def estimate_size(value: Any) -> int:
+    """
+    估算值佔用的記憶體位元組數
+    
+    遞歸累加容器（dict/list/tuple/set）及其元素的 sys.getsizeof，
+    同一物件只計一次；其他物件只計其本身。
+    """
+    seen = set()
+    total = 0
+    stack = [value]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+    return total
+
 class MemoryCache:
-    """記憶體緩存實現"""
+    """
+    記憶體緩存實現（有序字典維護 LRU 順序，過期時間以最小堆惰性清理）
+    
+    每個項目寫入時量測大小並計入位元組總量；設定 max_bytes 時總量不會超過上限，
+    按 LRU 或 GDSF（Greedy-Dual-Size-Frequency，優先淘汰大且少用的項目）驅逐。
+    """
+    
+    EVICTION_POLICIES = ('lru', 'gdsf')
     
-    def __init__(self, max_size: int = 1000, default_ttl: int = 3600):
-        self.cache: Dict[str, Dict] = {}
+    def __init__(self, max_size: Optional[int] = 1000, default_ttl: int = 3600,
+                 max_bytes: Optional[int] = None, eviction_policy: str = 'lru'):
+        """
+        Args:
+            max_size: 最大項目數，None 表示不限
+            default_ttl: 預設過期秒數，0 表示不過期
+            max_bytes: 位元組上限（按 estimate_size 量測），None 表示只按項目數限制
+            eviction_policy: 'lru' 或 'gdsf'
+        """
+        if eviction_policy not in self.EVICTION_POLICIES:
+            raise ValueError(f"不支援的驅逐策略: {eviction_policy}")
+        self.cache: "OrderedDict[str, Dict]" = OrderedDict()  # 最久未訪問的項目在前
         self.max_size = max_size
+        self.max_bytes = max_bytes
         self.default_ttl = default_ttl
-        self.access_times: Dict[str, float] = {}
-        self.lock = threading.RLock()
+        self.eviction_policy = eviction_policy
+        self.expiry_heap: List[Tuple[float, str]] = []  # (過期時間, 鍵)，被覆蓋或刪除的記錄惰性丟棄
+        self.lock = threading.Lock()
+        
+        # GDSF：項目優先級 = 膨脹值 + 命中次數 / 大小，驅逐優先級最低者並以其優先級作為新的膨脹值
+        self.priority_heap: List[Tuple[float, int, str]] = []  # (優先級, 序號, 鍵)
+        self.inflation = 0.0
+        self._sequence = 0
+        
+        # 運行中累計的統計（不需遍歷緩存）
+        self.total_bytes = 0
+        self.counters = {
+            'evictions': 0,
+            'evicted_bytes': 0,
+            'expirations': 0,
+            'rejected_oversize': 0
+        }
     
-    def _is_expired(self, item: Dict) -> bool:
+    def _is_expired(self, item: Dict, now: Optional[float] = None) -> bool:
         """檢查緩存項目是否過期"""
-        if 'expires_at' not in item:
+        expires_at = item.get('expires_at')
+        if expires_at is None:
             return False
-        return time.time() > item['expires_at']
+        return (now or time.time()) > expires_at
     
-    def _cleanup_expired(self):
-        """清理過期的緩存項目"""
-        with self.lock:
-            expired_keys = [
-                key for key, item in self.cache.items() 
-                if self._is_expired(item)
-            ]
-            for key in expired_keys:
-                del self.cache[key]
-                if key in self.access_times:
-                    del self.access_times[key]
+    def _remove(self, key: str) -> Optional[Dict]:
+        """移除項目並扣除其大小（持有鎖）"""
+        item = self.cache.pop(key, None)
+        if item is not None:
+            self.total_bytes -= item['size']
+        return item
+    
+    def _cleanup_expired(self, now: Optional[float] = None):
+        """從堆頂清理已過期的緩存項目（持有鎖，攤銷 O(log n)）"""
+        now = now or time.time()
+        heap = self.expiry_heap
+        while heap and heap[0][0] < now:
+            expires_at, key = heapq.heappop(heap)
+            item = self.cache.get(key)
+            # 鍵已被刪除或以新的過期時間覆蓋時，堆中記錄已失效
+            if item is not None and item['expires_at'] == expires_at:
+                self._remove(key)
+                self.counters['expirations'] += 1
+        
+        # 覆蓋寫入累積的失效記錄過多時重建堆
+        if len(heap) > 2 * len(self.cache) + 64:
+            self.expiry_heap = [(item['expires_at'], key) for key, item in self.cache.items()
+                                if item['expires_at'] is not None]
+            heapq.heapify(self.expiry_heap)
+    
+    def _over_capacity(self) -> bool:
+        if self.max_size is not None and len(self.cache) > self.max_size:
+            return True
+        return self.max_bytes is not None and self.total_bytes > self.max_bytes
     
     def _evict_lru(self):
-        """使用 LRU 策略驅逐最舊的項目"""
-        if len(self.cache) <= self.max_size:
-            return
+        """驅逐項目直至項目數與位元組總量均不超過上限（持有鎖）"""
+        while self.cache and self._over_capacity():
+            if self.eviction_policy == 'gdsf':
+                key = self._pop_lowest_priority()
+            else:
+                key = next(iter(self.cache))
+            item = self._remove(key)
+            self.counters['evictions'] += 1
+            self.counters['evicted_bytes'] += item['size']
+    
+    # GDSF 優先級
+    
+    def _push_priority(self, key: str, item: Dict):
+        """按命中次數與大小計算優先級並登記（持有鎖）"""
+        self._sequence += 1
+        item['priority'] = self.inflation + item['hits'] / item['size']
+        item['seq'] = self._sequence
+        heapq.heappush(self.priority_heap, (item['priority'], self._sequence, key))
         
-        with self.lock:
-            # 找到最舊的項目
-            oldest_key = min(self.access_times.keys(), key=lambda k: self.access_times[k])
-            del self.cache[oldest_key]
-            del self.access_times[oldest_key]
+        # 命中更新累積的失效記錄過多時重建堆
+        if len(self.priority_heap) > 2 * len(self.cache) + 64:
+            self.priority_heap = [(entry['priority'], entry['seq'], entry_key)
+                                  for entry_key, entry in self.cache.items()]
+            heapq.heapify(self.priority_heap)
+    
+    def _pop_lowest_priority(self) -> str:
+        """取出優先級最低的有效項目，並以其優先級更新膨脹值（持有鎖）"""
+        while True:
+            priority, seq, key = heapq.heappop(self.priority_heap)
+            item = self.cache.get(key)
+            if item is not None and item['seq'] == seq:
+                self.inflation = priority
+                return key
     
     def get(self, key: str) -> Optional[Any]:
         """獲取緩存值"""
         with self.lock:
-            if key not in self.cache:
+            item = self.cache.get(key)
+            if item is None:
                 return None
             
-            item = self.cache[key]
             if self._is_expired(item):
-                del self.cache[key]
-                if key in self.access_times:
-                    del self.access_times[key]
+                self._remove(key)
+                self.counters['expirations'] += 1
                 return None
             
-            # 更新訪問時間
-            self.access_times[key] = time.time()
+            # 移至末尾表示最近訪問
+            self.cache.move_to_end(key)
+            if self.eviction_policy == 'gdsf':
+                item['hits'] += 1
+                self._push_priority(key, item)
             return item['value']
     
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        """設置緩存值"""
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        """
+        設置緩存值
+        
+        Returns:
+            bool: 是否已緩存（單個項目超過 max_bytes 時不緩存，並移除該鍵的舊值）
+        """
+        now = time.time()
+        expires_at = None
+        if ttl is not None:
+            expires_at = now + ttl
+        elif self.default_ttl > 0:
+            expires_at = now + self.default_ttl
+        # 量測大小在鎖外進行
+        size = estimate_size(value) + sys.getsizeof(key) + ENTRY_OVERHEAD
+        
         with self.lock:
-            # 清理過期項目
-            self._cleanup_expired()
+            # 清理已到期的項目
+            self._cleanup_expired(now)
+            self._remove(key)
             
-            # LRU 驅逐
-            self._evict_lru()
-            
-            expires_at = None
-            if ttl is not None:
-                expires_at = time.time() + ttl
-            elif self.default_ttl > 0:
-                expires_at = time.time() + self.default_ttl
+            if self.max_bytes is not None and size > self.max_bytes:
+                self.counters['rejected_oversize'] += 1
+                return False
             
-            self.cache[key] = {
+            item = {
                 'value': value,
                 'expires_at': expires_at,
-                'created_at': time.time()
+                'created_at': now,
+                'size': size,
+                'hits': 1
             }
-            self.access_times[key] = time.time()
+            self.cache[key] = item
+            self.total_bytes += size
+            if expires_at is not None:
+                heapq.heappush(self.expiry_heap, (expires_at, key))
+            if self.eviction_policy == 'gdsf':
+                self._push_priority(key, item)
+            
+            # 超出項目數或位元組上限時驅逐
+            self._evict_lru()
+            return True
     
     def delete(self, key: str) -> bool:
         """刪除緩存項目"""
         with self.lock:
-            if key in self.cache:
-                del self.cache[key]
-                if key in self.access_times:
-                    del self.access_times[key]
-                return True
-            return False
+            return self._remove(key) is not None
     
     def clear(self) -> None:
         """清空所有緩存"""
         with self.lock:
             self.cache.clear()
-            self.access_times.clear()
+            self.expiry_heap.clear()
+            self.priority_heap.clear()
+            self.inflation = 0.0
+            self.total_bytes = 0
     
     def stats(self) -> Dict[str, Any]:
-        """獲取緩存統計信息"""
+        """獲取緩存統計信息（由累計值得出，不遍歷緩存）"""
         with self.lock:
+            # 先清理已到期項目，其餘項目均未過期
+            self._cleanup_expired()
             total_items = len(self.cache)
-            expired_items = sum(1 for item in self.cache.values() if self._is_expired(item))
             
             return {
                 'total_items': total_items,
-                'active_items': total_items - expired_items,
-                'expired_items': expired_items,
+                'active_items': total_items,
+                'expired_items': 0,
                 'max_size': self.max_size,
-                'memory_usage_estimate': len(str(self.cache)) * 8  # 粗略估算
+                'max_bytes': self.max_bytes,
+                'eviction_policy': self.eviction_policy,
+                'memory_usage_estimate': self.total_bytes,
+                'bytes_utilization': (self.total_bytes / self.max_bytes * 100) if self.max_bytes else None,
+                **self.counters
             }
 
+# 比較令牌後刪除鎖，避免釋放已過期並被他人取得的鎖
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
 class RedisCache:
-    """Redis 緩存實現"""
+    """
+    Redis 緩存實現
+    
+    使用顯式連接池與二進位值（CacheCodec：可插拔序列化器，大型值 zlib 壓縮），
+    批量讀寫經 MGET 與管線在一次往返內完成。
+    """
     
     def __init__(self, host: str = 'localhost', port: int = 6379, db: int = 0, 
-                 password: Optional[str] = None, default_ttl: int = 3600):
+                 password: Optional[str] = None, default_ttl: int = 3600,
+                 max_connections: int = 50, serializer: Optional[Serializer] = None,
+                 compress_threshold: Optional[int] = 1024, connection_pool=None,
+                 allowed_readers: Optional[Iterable[str]] = None):
+        """
+        Args:
+            host / port / db / password: Redis 連接參數
+            default_ttl: 預設過期秒數
+            max_connections: 連接池的最大連接數（工作線程共用）
+            serializer: 值的序列化器，預設 msgpack 可用時為 msgpack，否則為 JSON
+            compress_threshold: 序列化後超過此位元組數的值以 zlib 壓縮，None 表示不壓縮
+            connection_pool: 自訂連接池（提供時忽略連接參數）
+            allowed_readers: 除寫入格式外允許讀取的格式（預設 JSON 與 msgpack，不含 pickle）；
+                其他格式的值視為未命中
+        """
         self.default_ttl = default_ttl
         self.redis_client = None
+        self.connection_pool = None
+        self.codec = CacheCodec(serializer, compress_threshold=compress_threshold,
+                                allowed_readers=allowed_readers)
+        self.stats = {
+            'round_trips': 0,
+            'bytes_sent': 0,
+            'bytes_received': 0,
+            'undecodable': 0
+        }
         
         if REDIS_AVAILABLE:
             try:
-                self.redis_client = redis.Redis(
+                self.connection_pool = connection_pool or redis.ConnectionPool(
                     host=host, port=port, db=db, password=password,
-                    decode_responses=True, socket_timeout=5
+                    max_connections=max_connections, socket_timeout=5,
+                    socket_connect_timeout=5, health_check_interval=30
                 )
+                self.redis_client = redis.Redis(connection_pool=self.connection_pool)
                 # 測試連接
                 self.redis_client.ping()
-                logger.info("Redis 緩存已連接")
+                logger.info(f"Redis 緩存已連接（序列化: {self.codec.serializer.name}）")
             except Exception as e:
                 logger.warning(f"Redis 連接失敗: {e}")
                 self.redis_client = None
@@ -157,44 +337,109 @@ class RedisCache:
         """檢查 Redis 是否可用"""
         return self.redis_client is not None
     
+    def _encode(self, value: Any) -> bytes:
+        data = self.codec.encode(value)
+        self.stats['bytes_sent'] += len(data)
+        return data
+    
+    def _decode(self, data: Optional[bytes]) -> Optional[Any]:
+        """解碼值；格式未知、不允許讀取或損壞的值視為未命中"""
+        if data is None:
+            return None
+        self.stats['bytes_received'] += len(data)
+        try:
+            return self.codec.decode(data)
+        except UndecodableValueError as e:
+            self.stats['undecodable'] += 1
+            logger.warning(f"忽略無法解碼的 Redis 值: {e}")
+            return None
+    
     def get(self, key: str) -> Optional[Any]:
         """獲取緩存值"""
         if not self.is_available:
             return None
         
         try:
-            value = self.redis_client.get(key)
-            if value is None:
-                return None
-            return json.loads(value)
+            self.stats['round_trips'] += 1
+            return self._decode(self.redis_client.get(key))
         except Exception as e:
             logger.error(f"Redis get 錯誤: {e}")
             return None
     
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        批量獲取緩存值（一次 MGET 往返）
+        
+        Returns:
+            Dict: 鍵 -> 值，只包含命中的鍵
+        """
+        if not self.is_available or not keys:
+            return {}
+        
+        try:
+            self.stats['round_trips'] += 1
+            values = self.redis_client.mget(keys)
+        except Exception as e:
+            logger.error(f"Redis mget 錯誤: {e}")
+            return {}
+        
+        found = {}
+        for key, data in zip(keys, values):
+            if data is None:
+                continue
+            value = self._decode(data)
+            if value is not None:
+                found[key] = value
+        return found
+    
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """設置緩存值"""
         if not self.is_available:
             return False
         
         try:
-            serialized_value = json.dumps(value, ensure_ascii=False)
             ttl = ttl or self.default_ttl
-            return self.redis_client.setex(key, ttl, serialized_value)
+            self.stats['round_trips'] += 1
+            return bool(self.redis_client.set(key, self._encode(value), ex=max(1, math.ceil(ttl))))
         except Exception as e:
             logger.error(f"Redis set 錯誤: {e}")
             return False
     
+    def set_many(self, mapping: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """批量設置緩存值（非事務管線，一次往返）"""
+        if not self.is_available or not mapping:
+            return False
+        
+        try:
+            ttl = max(1, math.ceil(ttl or self.default_ttl))
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, value in mapping.items():
+                pipe.set(key, self._encode(value), ex=ttl)
+            self.stats['round_trips'] += 1
+            return all(pipe.execute())
+        except Exception as e:
+            logger.error(f"Redis set_many 錯誤: {e}")
+            return False
+    
     def delete(self, key: str) -> bool:
         """刪除緩存項目"""
         if not self.is_available:
             return False
         
         try:
+            self.stats['round_trips'] += 1
             return bool(self.redis_client.delete(key))
         except Exception as e:
             logger.error(f"Redis delete 錯誤: {e}")
             return False
     
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取往返次數、傳輸位元組與編碼統計"""
+        stats = {**self.stats, 'codec': self.codec.get_stats()}
+        if self.connection_pool is not None:
+            stats['max_connections'] = getattr(self.connection_pool, 'max_connections', None)
+        return stats
+    
     def clear(self) -> bool:
         """清空所有緩存"""
         if not self.is_available:
@@ -205,20 +450,197 @@ class RedisCache:
         except Exception as e:
             logger.error(f"Redis clear 錯誤: {e}")
             return False
+    
+    def acquire_lock(self, name: str, timeout: float) -> Optional[str]:
+        """
+        取得分佈式鎖（SET NX PX）
+        
+        Returns:
+            Optional[str]: 成功時返回釋放鎖所需的令牌，鎖被佔用或 Redis 不可用時返回 None
+        """
+        if not self.is_available:
+            return None
+        
+        token = uuid.uuid4().hex
+        try:
+            if self.redis_client.set(name, token, nx=True, px=int(timeout * 1000)):
+                return token
+        except Exception as e:
+            logger.error(f"Redis 取得鎖錯誤: {e}")
+        return None
+    
+    def lock_held(self, name: str) -> bool:
+        """分佈式鎖是否仍被持有（Redis 錯誤時視為未持有，由調用方嘗試取得鎖）"""
+        if not self.is_available:
+            return False
+        
+        try:
+            return bool(self.redis_client.exists(name))
+        except Exception as e:
+            logger.error(f"Redis 查詢鎖錯誤: {e}")
+            return False
+    
+    def release_lock(self, name: str, token: str) -> bool:
+        """釋放分佈式鎖（僅當鎖仍由該令牌持有時刪除）"""
+        if not self.is_available:
+            return False
+        
+        try:
+            return bool(self.redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, name, token))
+        except Exception as e:
+            logger.error(f"Redis 釋放鎖錯誤: {e}")
+            return False
+
+# 緩存失效廣播頻道
+INVALIDATION_CHANNEL = 'cache:invalidate'
+
+class InvalidationBus:
+    """緩存失效廣播通道（基類），各工作進程的 CacheService 經此同步刪除與清空"""
+    
+    def publish(self, message: Dict[str, Any]) -> bool:
+        """廣播失效訊息"""
+        raise NotImplementedError
+    
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        """登記收到失效訊息時的回調（可能在背景線程中調用）"""
+        raise NotImplementedError
+    
+    def close(self) -> None:
+        """停止接收訊息"""
+
+class LocalInvalidationBus(InvalidationBus):
+    """進程內的失效廣播（沒有 Redis 時的替代，同一進程內的 CacheService 共用頻道）"""
+    
+    _channels: Dict[str, List[Callable]] = {}
+    _channels_lock = threading.Lock()
+    
+    def __init__(self, channel: str = INVALIDATION_CHANNEL):
+        self.channel = channel
+        self.callbacks: List[Callable] = []
+    
+    def publish(self, message: Dict[str, Any]) -> bool:
+        with self._channels_lock:
+            callbacks = list(self._channels.get(self.channel, []))
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception as e:
+                logger.error(f"緩存失效訊息處理失敗: {e}")
+        return True
+    
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        with self._channels_lock:
+            self._channels.setdefault(self.channel, []).append(callback)
+        self.callbacks.append(callback)
+    
+    def close(self) -> None:
+        with self._channels_lock:
+            subscribers = self._channels.get(self.channel, [])
+            for callback in self.callbacks:
+                if callback in subscribers:
+                    subscribers.remove(callback)
+        self.callbacks.clear()
+
+class RedisInvalidationBus(InvalidationBus):
+    """經 Redis pub/sub 的跨進程失效廣播"""
+    
+    def __init__(self, redis_client, channel: str = INVALIDATION_CHANNEL):
+        self.redis_client = redis_client
+        self.channel = channel
+        self.pubsub = None
+        self.listener = None
+    
+    def publish(self, message: Dict[str, Any]) -> bool:
+        try:
+            self.redis_client.publish(self.channel, json.dumps(message))
+            return True
+        except Exception as e:
+            logger.error(f"Redis 失效廣播錯誤: {e}")
+            return False
+    
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        def handle(raw):
+            try:
+                data = raw['data']
+                callback(json.loads(data.decode('utf-8') if isinstance(data, bytes) else data))
+            except Exception as e:
+                logger.error(f"緩存失效訊息處理失敗: {e}")
+        
+        self.pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(**{self.channel: handle})
+        self.listener = self.pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+    
+    def close(self) -> None:
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        if self.pubsub is not None:
+            self.pubsub.close()
+            self.pubsub = None
 
 class CacheService:
-    """統一緩存服務"""
+    """
+    統一緩存服務（兩級緩存）
     
-    def __init__(self, use_redis: bool = True, memory_cache_size: int = 1000,
-                 default_ttl: int = 3600):
-        self.memory_cache = MemoryCache(memory_cache_size, default_ttl)
+    讀取先查進程內的 L1（記憶體），未命中再查 L2（Redis）並回填 L1。
+    寫入、刪除與清空經失效廣播通知其他工作進程丟棄其 L1 副本；
+    L1 項目帶有版本戳，早於該鍵最近一次失效版本的項目（如回填與失效競爭時讀到的舊值）視為過期。
+    """
+    
+    def __init__(self, use_redis: bool = True, memory_cache_size: Optional[int] = 1000,
+                 default_ttl: int = 3600, memory_cache_bytes: Optional[int] = None,
+                 eviction_policy: str = 'lru', l1_ttl: Optional[int] = 300,
+                 invalidation_bus: Optional[InvalidationBus] = None,
+                 max_tombstones: int = 10000):
+        """
+        Args:
+            use_redis: 是否使用 Redis 緩存
+            memory_cache_size: 記憶體緩存最大項目數
+            default_ttl: 預設過期秒數
+            memory_cache_bytes: 記憶體緩存位元組上限（每個工作進程），None 表示只按項目數限制
+            eviction_policy: 記憶體緩存驅逐策略，'lru' 或 'gdsf'
+            l1_ttl: 有 L2 時 L1 副本的最長保留秒數（限制失效訊息遺失時的過期時間），None 表示與 L2 相同
+            invalidation_bus: 失效廣播通道，預設 Redis 可用時使用 pub/sub，否則為進程內通道
+            max_tombstones: 保留的鍵失效版本數（超出時丟棄最舊的記錄，由 l1_ttl 兜底）
+        """
+        self.memory_cache = MemoryCache(memory_cache_size, default_ttl,
+                                        max_bytes=memory_cache_bytes, eviction_policy=eviction_policy)
         self.redis_cache = RedisCache(default_ttl=default_ttl) if use_redis else None
+        self.default_ttl = default_ttl
+        self.l1_ttl = l1_ttl
         self.stats = {
             'hits': 0,
+            'l1_hits': 0,
+            'l2_hits': 0,
             'misses': 0,
             'sets': 0,
-            'deletes': 0
+            'deletes': 0,
+            'l1_fills': 0,
+            'stale_l1': 0,
+            'invalidations_sent': 0,
+            'invalidations_received': 0
         }
+        
+        # 版本戳：混合邏輯時鐘（本地納秒時間與收到的最大版本取大者），跨進程單調
+        self.instance_id = uuid.uuid4().hex
+        self.lock = threading.Lock()
+        self._clock = 0
+        self.tombstones: "OrderedDict[str, int]" = OrderedDict()  # 鍵 -> 最近一次失效的版本
+        self.max_tombstones = max_tombstones
+        self.cleared_at = 0  # 最近一次清空的版本
+        
+        if invalidation_bus is None:
+            if self.l2_available:
+                invalidation_bus = RedisInvalidationBus(self.redis_cache.redis_client)
+            else:
+                invalidation_bus = LocalInvalidationBus()
+        self.invalidation_bus = invalidation_bus
+        self.invalidation_bus.subscribe(self._on_invalidation)
+    
+    @property
+    def l2_available(self) -> bool:
+        """L2（Redis）是否可用"""
+        return self.redis_cache is not None and self.redis_cache.is_available
     
     def _generate_key(self, prefix: str, *args, **kwargs) -> str:
         """生成緩存鍵"""
@@ -227,40 +649,171 @@ class CacheService:
         # 使用 MD5 創建固定長度的鍵
         return hashlib.md5(key_data.encode()).hexdigest()
     
+    # 版本與失效
+    
+    def _next_version(self) -> int:
+        with self.lock:
+            self._clock = max(time.time_ns(), self._clock + 1)
+            return self._clock
+    
+    def _mark_invalidated(self, key: str, version: int):
+        """記錄鍵的失效版本（持有鎖）"""
+        if version > self.tombstones.get(key, 0):
+            self.tombstones[key] = version
+            self.tombstones.move_to_end(key)
+            while len(self.tombstones) > self.max_tombstones:
+                self.tombstones.popitem(last=False)
+    
+    def _is_current(self, key: str, version: int) -> bool:
+        """版本是否不早於該鍵最近一次失效（及最近一次清空）"""
+        with self.lock:
+            return version >= max(self.tombstones.get(key, 0), self.cleared_at)
+    
+    def _broadcast(self, op: str, version: int, key: Optional[str] = None,
+                   keys: Optional[List[str]] = None):
+        message = {'op': op, 'key': key, 'version': version, 'origin': self.instance_id}
+        if keys is not None:
+            message['keys'] = keys
+        if self.invalidation_bus.publish(message):
+            self.stats['invalidations_sent'] += 1
+    
+    def _on_invalidation(self, message: Dict[str, Any]):
+        """處理其他工作進程的失效訊息：丟棄 L1 副本並記錄失效版本"""
+        if message.get('origin') == self.instance_id:
+            return
+        version = int(message.get('version', 0))
+        keys = message.get('keys') or [message.get('key')]
+        with self.lock:
+            self._clock = max(self._clock, version)
+            if message.get('op') == 'clear':
+                self.cleared_at = max(self.cleared_at, version)
+            else:
+                for key in keys:
+                    self._mark_invalidated(key, version)
+        
+        if message.get('op') == 'clear':
+            self.memory_cache.clear()
+        else:
+            for key in keys:
+                self.memory_cache.delete(key)
+        self.stats['invalidations_received'] += 1
+    
+    # 讀寫
+    
     def get(self, key: str) -> Optional[Any]:
-        """獲取緩存值（先查 Redis，再查記憶體）"""
-        # 首先嘗試 Redis
-        if self.redis_cache and self.redis_cache.is_available:
-            value = self.redis_cache.get(key)
-            if value is not None:
+        """獲取緩存值（先查 L1 記憶體，再查 L2 Redis 並回填 L1）"""
+        entry = self.memory_cache.get(key)
+        if entry is not None:
+            version, value = entry
+            if self._is_current(key, version):
                 self.stats['hits'] += 1
-                # 同時存入記憶體緩存以加速後續訪問
-                self.memory_cache.set(key, value)
+                self.stats['l1_hits'] += 1
                 return value
+            self.memory_cache.delete(key)
+            self.stats['stale_l1'] += 1
         
-        # 然後嘗試記憶體緩存
-        value = self.memory_cache.get(key)
-        if value is not None:
-            self.stats['hits'] += 1
-            return value
+        if self.l2_available:
+            envelope = self.redis_cache.get(key)
+            if envelope is not None:
+                version, value = self._unwrap(envelope)
+                # 讀取期間該鍵已被改寫或刪除時不回填，避免舊值留在 L1
+                if self._is_current(key, version):
+                    self.memory_cache.set(key, (version, value), self.l1_ttl)
+                    self.stats['l1_fills'] += 1
+                self.stats['hits'] += 1
+                self.stats['l2_hits'] += 1
+                return value
         
         self.stats['misses'] += 1
         return None
     
+    @staticmethod
+    def _unwrap(envelope: Any) -> Tuple[int, Any]:
+        """拆解 L2 中帶版本的值（無版本的舊格式值視為版本 0）"""
+        if isinstance(envelope, dict) and set(envelope) == {'v', 'd'}:
+            return int(envelope['v']), envelope['d']
+        return 0, envelope
+    
+    def _l1_ttl(self, ttl: Optional[int]) -> Optional[int]:
+        """L1 副本的保留秒數：有 L2 時不超過 l1_ttl"""
+        if not self.l2_available or self.l1_ttl is None:
+            return ttl
+        return min(ttl if ttl is not None else self.default_ttl, self.l1_ttl)
+    
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        """設置緩存值（同時存入 Redis 和記憶體）"""
+        """設置緩存值（寫入 L1 與 L2，並通知其他工作進程丟棄舊副本）"""
         self.stats['sets'] += 1
+        version = self._next_version()
+        with self.lock:
+            self._mark_invalidated(key, version)
         
         # 存入記憶體緩存
-        self.memory_cache.set(key, value, ttl)
+        self.memory_cache.set(key, (version, value), self._l1_ttl(ttl))
         
         # 存入 Redis 緩存
-        if self.redis_cache and self.redis_cache.is_available:
-            self.redis_cache.set(key, value, ttl)
+        if self.l2_available:
+            self.redis_cache.set(key, {'v': version, 'd': value}, ttl)
+        
+        self._broadcast('set', version, key)
+    
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        批量獲取緩存值（L1 未命中的鍵以一次 MGET 從 L2 讀取並回填）
+        
+        Returns:
+            Dict: 鍵 -> 值，只包含命中的鍵
+        """
+        found: Dict[str, Any] = {}
+        missing = []
+        for key in keys:
+            entry = self.memory_cache.get(key)
+            if entry is not None and self._is_current(key, entry[0]):
+                found[key] = entry[1]
+                self.stats['l1_hits'] += 1
+                continue
+            if entry is not None:
+                self.memory_cache.delete(key)
+                self.stats['stale_l1'] += 1
+            missing.append(key)
+        
+        if missing and self.l2_available:
+            for key, envelope in self.redis_cache.get_many(missing).items():
+                version, value = self._unwrap(envelope)
+                if self._is_current(key, version):
+                    self.memory_cache.set(key, (version, value), self.l1_ttl)
+                    self.stats['l1_fills'] += 1
+                found[key] = value
+                self.stats['l2_hits'] += 1
+        
+        self.stats['hits'] += len(found)
+        self.stats['misses'] += len(keys) - len(found)
+        return found
+    
+    def set_many(self, mapping: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        """批量設置緩存值（L2 以一次管線寫入，失效訊息合併為一條）"""
+        if not mapping:
+            return
+        self.stats['sets'] += len(mapping)
+        version = self._next_version()
+        with self.lock:
+            for key in mapping:
+                self._mark_invalidated(key, version)
+        
+        l1_ttl = self._l1_ttl(ttl)
+        for key, value in mapping.items():
+            self.memory_cache.set(key, (version, value), l1_ttl)
+        
+        if self.l2_available:
+            self.redis_cache.set_many({key: {'v': version, 'd': value} for key, value in mapping.items()}, ttl)
+        
+        self._broadcast('set', version, keys=list(mapping))
     
     def delete(self, key: str) -> bool:
-        """刪除緩存項目"""
+        """刪除緩存項目（並通知其他工作進程）"""
         self.stats['deletes'] += 1
+        version = self._next_version()
+        with self.lock:
+            self._mark_invalidated(key, version)
         
         deleted = False
         
@@ -269,35 +822,189 @@ class CacheService:
             deleted = True
         
         # 從 Redis 緩存刪除
-        if self.redis_cache and self.redis_cache.is_available:
+        if self.l2_available:
             if self.redis_cache.delete(key):
                 deleted = True
         
+        self._broadcast('delete', version, key)
         return deleted
     
     def clear(self) -> None:
-        """清空所有緩存"""
+        """清空所有緩存（並通知其他工作進程）"""
+        version = self._next_version()
+        with self.lock:
+            self.cleared_at = version
+            self.tombstones.clear()
         self.memory_cache.clear()
-        if self.redis_cache and self.redis_cache.is_available:
+        if self.l2_available:
             self.redis_cache.clear()
+        self._broadcast('clear', version)
     
     def get_stats(self) -> Dict[str, Any]:
         """獲取緩存統計信息"""
         stats = self.stats.copy()
         stats['memory_cache'] = self.memory_cache.stats()
-        stats['redis_available'] = self.redis_cache.is_available if self.redis_cache else False
+        stats['redis_available'] = self.l2_available
+        stats['redis'] = self.redis_cache.get_stats() if self.l2_available else None
+        stats['invalidation_bus'] = type(self.invalidation_bus).__name__
+        stats['cached_decorator'] = get_cached_stats()
+        stats['tombstones'] = len(self.tombstones)
         
         total_requests = stats['hits'] + stats['misses']
         stats['hit_rate'] = (stats['hits'] / total_requests * 100) if total_requests > 0 else 0
+        stats['l1_hit_rate'] = (stats['l1_hits'] / total_requests * 100) if total_requests > 0 else 0
         
         return stats
 
-# 全局緩存服務實例
-cache_service = CacheService()
+# 全局緩存服務實例（記憶體緩存按位元組設硬上限；圖片結果大小差異大，以 GDSF 優先保留小而常用的項目）
+cache_service = CacheService(
+    memory_cache_bytes=int(os.getenv('CACHE_MEMORY_MAX_BYTES', str(256 * 1024 * 1024))),
+    eviction_policy=os.getenv('CACHE_EVICTION_POLICY', 'gdsf')
+)
+
+# @cached 的合併與背景刷新
+_cached_flight = SingleFlight()
+_refreshing: set = set()
+_refresh_lock = threading.Lock()
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+
+cached_stats = {
+    'computes': 0,
+    'coalesced_waits': 0,
+    'distributed_waits': 0,
+    'distributed_timeouts': 0,
+    'lock_handoffs': 0,
+    'early_recomputes': 0,
+    'stale_served': 0,
+    'background_refreshes': 0,
+    'refresh_errors': 0
+}
+
+def _count(name: str):
+    with _refresh_lock:
+        cached_stats[name] += 1
 
-def cached(ttl: int = 3600, key_prefix: str = "default"):
-    """緩存裝飾器"""
+def get_cached_stats() -> Dict[str, int]:
+    """獲取 @cached 的合併與刷新計數"""
+    with _refresh_lock:
+        return {**cached_stats, 'refreshing': len(_refreshing),
+                'in_flight': _cached_flight.get_stats()['in_flight']}
+
+def _unwrap_cached(entry: Any) -> Optional[Tuple[Any, float, float]]:
+    """拆解 @cached 的緩存記錄為 (值, 計算耗時, 邏輯過期時間)；舊格式的值視為未過期"""
+    if isinstance(entry, dict) and '$cached' in entry:
+        return entry['$cached'], entry.get('delta', 0.0), entry.get('expires_at', math.inf)
+    return entry, 0.0, math.inf
+
+def cached(ttl: int = 3600, key_prefix: str = "default", stale_ttl: int = 0,
+           early_expiration_beta: float = 1.0, distributed_lock: bool = False,
+           lock_timeout: float = 30.0, lock_wait: float = 5.0):
+    """
+    緩存裝飾器（防止緩存擊穿）
+    
+    - 同一進程內相同鍵的並發未命中只計算一次，其餘請求等待共用結果
+    - 概率提前過期（XFetch）：越接近過期、計算越慢，越可能由單個請求提前重新計算
+    - stale_ttl > 0 時過期後的 stale_ttl 秒內先返回舊值，並只在背景刷新一次
+    - distributed_lock=True 且 Redis 可用時，跨工作進程也只有取得鎖的進程計算，
+      其餘進程輪詢緩存；鎖被釋放而緩存仍未寫入（持有者失敗或結果為 None）時
+      立即嘗試取得鎖自行計算，等待超過 lock_wait 時不再等待直接計算
+    
+    Args:
+        ttl: 值的有效秒數
+        key_prefix: 緩存鍵前綴
+        stale_ttl: 過期後仍可返回舊值的秒數，0 表示不啟用
+        early_expiration_beta: 提前過期的強度，0 表示不提前
+        distributed_lock: 是否使用 Redis 分佈式鎖
+        lock_timeout: 分佈式鎖的持有上限（秒）
+        lock_wait: 等待其他進程計算的上限（秒），不超過 lock_timeout 的一半
+    """
+    max_wait = min(lock_wait, lock_timeout / 2)
+    
     def decorator(func):
+        def fresh_value(cache_key: str):
+            value, _, expires_at = _unwrap_cached(cache_service.get(cache_key))
+            return value if value is not None and time.time() < expires_at else None
+        
+        def wait_for_holder(redis_cache: 'RedisCache', cache_key: str, lock_name: str):
+            """
+            等待持有鎖的進程寫入結果
+            
+            Returns:
+                (值, 令牌)：取得結果時令牌為 None；鎖釋放後由本進程取得鎖時返回令牌；
+                等待超時返回 (None, None)
+            """
+            _count('distributed_waits')
+            deadline = time.time() + max_wait
+            while time.time() < deadline:
+                time.sleep(0.05)
+                value = fresh_value(cache_key)
+                if value is not None:
+                    return value, None
+                if not redis_cache.lock_held(lock_name):
+                    token = redis_cache.acquire_lock(lock_name, lock_timeout)
+                    if token is not None:
+                        _count('lock_handoffs')
+                        # 持有者可能在檢查緩存後才寫入並釋放鎖
+                        value = fresh_value(cache_key)
+                        if value is not None:
+                            redis_cache.release_lock(lock_name, token)
+                            return value, None
+                        return None, token
+            _count('distributed_timeouts')
+            return None, None
+        
+        def compute(cache_key: str, args, kwargs):
+            """計算並寫入緩存（取得分佈式鎖時其他進程等待結果）"""
+            lock_name = f"lock:{cache_key}"
+            token = None
+            redis_cache = cache_service.redis_cache if cache_service.l2_available else None
+            if distributed_lock and redis_cache is not None:
+                token = redis_cache.acquire_lock(lock_name, lock_timeout)
+                if token is None:
+                    value, token = wait_for_holder(redis_cache, cache_key, lock_name)
+                    if value is not None:
+                        return value
+                    # 取得了釋放後的鎖，或等待超時（持有者可能已中斷），自行計算
+            
+            try:
+                started = time.time()
+                result = func(*args, **kwargs)
+                _count('computes')
+                if result is not None:
+                    now = time.time()
+                    cache_service.set(cache_key, {
+                        '$cached': result,
+                        'delta': now - started,
+                        'expires_at': now + ttl
+                    }, ttl + stale_ttl)
+                return result
+            finally:
+                if token is not None:
+                    redis_cache.release_lock(lock_name, token)
+        
+        def refresh_in_background(cache_key: str, args, kwargs):
+            """啟動背景刷新（同一鍵同時只有一個）"""
+            global _refresh_executor
+            with _refresh_lock:
+                if cache_key in _refreshing:
+                    return
+                _refreshing.add(cache_key)
+                cached_stats['background_refreshes'] += 1
+                if _refresh_executor is None:
+                    _refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='cache-refresh')
+            
+            def run():
+                try:
+                    _cached_flight.do(cache_key, compute, cache_key, args, kwargs)
+                except Exception as e:
+                    _count('refresh_errors')
+                    logger.error(f"緩存背景刷新失敗 {func.__name__}: {e}")
+                finally:
+                    with _refresh_lock:
+                        _refreshing.discard(cache_key)
+            
+            _refresh_executor.submit(run)
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
             # 生成緩存鍵
@@ -306,22 +1013,48 @@ def cached(ttl: int = 3600, key_prefix: str = "default"):
             )
             
             # 嘗試從緩存獲取
-            cached_result = cache_service.get(cache_key)
-            if cached_result is not None:
-                return cached_result
-            
-            # 執行函數並緩存結果
-            result = func(*args, **kwargs)
-            cache_service.set(cache_key, result, ttl)
+            entry = cache_service.get(cache_key)
+            if entry is not None:
+                value, delta, expires_at = _unwrap_cached(entry)
+                now = time.time()
+                if now < expires_at:
+                    # XFetch：now - delta * beta * ln(U) 越過過期時間時提前重新計算
+                    early = (early_expiration_beta > 0 and delta > 0 and
+                             now - delta * early_expiration_beta * math.log(random.random() or 1e-12) >= expires_at)
+                    if not early:
+                        return value
+                    _count('early_recomputes')
+                    if stale_ttl > 0:
+                        refresh_in_background(cache_key, args, kwargs)
+                        return value
+                elif stale_ttl > 0:
+                    # 已過期但仍在 stale 窗口內：返回舊值並在背景刷新
+                    _count('stale_served')
+                    refresh_in_background(cache_key, args, kwargs)
+                    return value
             
+            # 執行函數並緩存結果（並發的相同請求共用一次計算）
+            result, shared = _cached_flight.do(cache_key, compute, cache_key, args, kwargs)
+            if shared:
+                _count('coalesced_waits')
             return result
         
         return wrapper
     return decorator
 
+# 圖片生成結果的二進位層（圖片位元組按內容雜湊存於本地磁碟）
+image_blob_store = BlobStore(max_bytes=int(os.getenv('CACHE_BLOB_MAX_BYTES', str(5 * 1024 * 1024 * 1024))))
+
 # 特定於 AI 圖片生成的緩存函數
 class ImageGenerationCache:
-    """圖片生成專用緩存"""
+    """
+    圖片生成專用緩存
+    
+    結果中的 base64 圖片解碼後寫入內容定址的二進位層，記憶體與 Redis 只保存
+    帶有雜湊（blob）與下載路徑（blob_url）的小型記錄；相同圖片在所有緩存項目間只存一份。
+    """
+    
+    blob_store = image_blob_store
     
     @staticmethod
     def get_prompt_cache_key(prompt: str, negative_prompt: str, image_size: str, 
@@ -331,18 +1064,83 @@ class ImageGenerationCache:
             "image_gen", prompt, negative_prompt, image_size, api_provider, model
         )
     
+    @classmethod
+    def _externalize(cls, value: Any) -> Any:
+        """將結果中的 base64 圖片寫入二進位層，替換為雜湊記錄"""
+        if isinstance(value, list):
+            return [cls._externalize(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        
+        record = {key: cls._externalize(item) for key, item in value.items() if key != 'base64'}
+        encoded = value.get('base64')
+        if encoded is None:
+            return record
+        try:
+            data = base64.b64decode(encoded, validate=True)
+        except (TypeError, ValueError, binascii.Error):
+            # 非標準 base64 內容保持原樣
+            record['base64'] = encoded
+            return record
+        digest = cls.blob_store.put(data)
+        record['blob'] = digest
+        record['blob_size'] = len(data)
+        record['blob_url'] = f'/cache_blobs/{digest}'
+        return record
+    
+    @classmethod
+    def _internalize(cls, value: Any) -> Any:
+        """
+        將雜湊記錄還原為 base64 圖片（經 mmap 讀取）
+        
+        Raises:
+            FileNotFoundError: 圖片內容已被清理
+        """
+        if isinstance(value, list):
+            return [cls._internalize(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        
+        record = {key: cls._internalize(item) for key, item in value.items()}
+        digest = value.get('blob')
+        if cls.blob_store.is_digest(digest):
+            mapped = cls.blob_store.mmap(digest)
+            try:
+                record['base64'] = base64.b64encode(mapped).decode('ascii')
+            finally:
+                mapped.close()
+        return record
+    
+    @classmethod
+    def _blob_digests(cls, value: Any) -> List[str]:
+        """結果中引用的所有圖片雜湊"""
+        if isinstance(value, list):
+            return [digest for item in value for digest in cls._blob_digests(item)]
+        if not isinstance(value, dict):
+            return []
+        digests = [digest for item in value.values() for digest in cls._blob_digests(item)]
+        if cls.blob_store.is_digest(value.get('blob')):
+            digests.append(value['blob'])
+        return digests
+    
     @staticmethod
     def cache_generation_result(prompt: str, negative_prompt: str, image_size: str,
                               api_provider: str, result: Dict, model: str = "",
                               ttl: int = 86400) -> None:  # 24小時
-        """緩存圖片生成結果"""
+        """緩存圖片生成結果（圖片位元組寫入二進位層）"""
         cache_key = ImageGenerationCache.get_prompt_cache_key(
             prompt, negative_prompt, image_size, api_provider, model
         )
         
+        try:
+            record = ImageGenerationCache._externalize(result)
+        except OSError as e:
+            logger.error(f"寫入圖片二進位層失敗，跳過緩存: {str(e)}")
+            return
+        
         # 添加緩存時間戳
         cached_result = {
-            **result,
+            **record,
             'cached_at': datetime.now().isoformat(),
             'cache_ttl': ttl
         }
@@ -352,17 +1150,52 @@ class ImageGenerationCache:
     
     @staticmethod
     def get_cached_generation(prompt: str, negative_prompt: str, image_size: str,
-                            api_provider: str, model: str = "") -> Optional[Dict]:
-        """獲取緩存的圖片生成結果"""
+                            api_provider: str, model: str = "",
+                            inline_images: bool = True) -> Optional[Dict]:
+        """
+        獲取緩存的圖片生成結果
+        
+        Args:
+            inline_images: True 時還原 base64 圖片；False 時只返回雜湊記錄，
+                圖片經 open_blob / blob_path 或 blob_url 讀取，不在記憶體中複製
+        """
         cache_key = ImageGenerationCache.get_prompt_cache_key(
             prompt, negative_prompt, image_size, api_provider, model
         )
         
         result = cache_service.get(cache_key)
-        if result:
-            logger.info(f"使用緩存的圖片生成結果: {cache_key[:16]}...")
+        if not result:
+            return result
+        
+        # 圖片內容已被清理的記錄視為未命中
+        try:
+            if inline_images:
+                result = ImageGenerationCache._internalize(result)
+            elif not all(map(ImageGenerationCache.blob_store.exists, ImageGenerationCache._blob_digests(result))):
+                raise FileNotFoundError(cache_key)
+        except FileNotFoundError:
+            logger.warning(f"緩存的圖片內容已被清理，移除記錄: {cache_key[:16]}...")
+            cache_service.delete(cache_key)
+            return None
         
+        logger.info(f"使用緩存的圖片生成結果: {cache_key[:16]}...")
         return result
+    
+    @staticmethod
+    def open_blob(digest: str) -> BinaryIO:
+        """
+        以檔案物件打開緩存的圖片
+        
+        Raises:
+            FileNotFoundError: 圖片不存在
+            ValueError: 雜湊格式無效
+        """
+        return ImageGenerationCache.blob_store.open(digest)
+    
+    @staticmethod
+    def blob_path(digest: str) -> str:
+        """緩存圖片的檔案路徑（可交給 send_file 以 sendfile 傳送）"""
+        return ImageGenerationCache.blob_store.path(digest)
 
 # API 響應緩存
 @cached(ttl=1800, key_prefix="api_response")  # 30分鐘
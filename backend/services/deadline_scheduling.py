@@ -0,0 +1,101 @@
+"""
+截止時間調度支援 v2.7
+提供截止時間解析與按任務類型統計的執行時間估計，
+供 BatchProcessor 以最少鬆弛時間（least-slack）排序任務並提早識別必然逾期的任務
+"""
+
+import math
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+# 無截止時間任務的排序鍵（排在所有有截止時間的任務之後）
+NO_DEADLINE = math.inf
+
+class InvalidDeadlineError(ValueError):
+    """截止時間格式錯誤"""
+
+def parse_deadline(value: Any) -> Optional[datetime]:
+    """
+    解析截止時間
+
+    Args:
+        value: datetime、ISO 8601 字串或 epoch 秒數
+
+    Raises:
+        InvalidDeadlineError: 無法解析
+    """
+    if value is None or value == "":
+        return None
+    try:
+        if isinstance(value, datetime):
+            deadline = value
+        elif isinstance(value, (int, float)):
+            deadline = datetime.fromtimestamp(value)
+        else:
+            deadline = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    except (TypeError, ValueError, OverflowError, OSError) as e:
+        raise InvalidDeadlineError(f"無效的截止時間: {value!r}") from e
+    # 帶時區的時間轉換為本地時間，與任務的其他時間戳一致
+    if deadline.tzinfo is not None:
+        deadline = deadline.astimezone().replace(tzinfo=None)
+    return deadline
+
+class TaskDurationEstimator:
+    """按任務類型統計執行時間（指數移動平均與觀測最小值）"""
+
+    def __init__(self, smoothing: float = 0.2, default_estimate: float = 30.0):
+        """
+        Args:
+            smoothing: 移動平均的新樣本權重
+            default_estimate: 沒有任何觀測時的估計秒數
+        """
+        self.smoothing = smoothing
+        self.default_estimate = default_estimate
+        self.by_type: Dict[str, Dict[str, float]] = {}
+        self.overall_mean: Optional[float] = None
+
+    def observe(self, task_type: str, duration: float):
+        """記錄一次成功執行的耗時"""
+        entry = self.by_type.get(task_type)
+        if entry is None:
+            self.by_type[task_type] = {"count": 1, "mean": duration, "min": duration}
+        else:
+            entry["count"] += 1
+            entry["mean"] += self.smoothing * (duration - entry["mean"])
+            entry["min"] = min(entry["min"], duration)
+
+        if self.overall_mean is None:
+            self.overall_mean = duration
+        else:
+            self.overall_mean += self.smoothing * (duration - self.overall_mean)
+
+    def estimate(self, task_type: str) -> float:
+        """預期耗時：該類型的移動平均，其次為全體平均，最後為預設值"""
+        entry = self.by_type.get(task_type)
+        if entry is not None:
+            return entry["mean"]
+        if self.overall_mean is not None:
+            return self.overall_mean
+        return self.default_estimate
+
+    def lower_bound(self, task_type: str) -> float:
+        """耗時下限：該類型觀測到的最短耗時，沒有觀測時為 0（無法斷定逾期）"""
+        entry = self.by_type.get(task_type)
+        return entry["min"] if entry is not None else 0.0
+
+    def slack_key(self, task_type: str, deadline_ts: Optional[float]) -> float:
+        """最晚開始時間（截止時間減預期耗時），越小越緊迫"""
+        if deadline_ts is None:
+            return NO_DEADLINE
+        return deadline_ts - self.estimate(task_type)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取估計統計"""
+        return {
+            task_type: {
+                "samples": int(entry["count"]),
+                "estimate_seconds": round(entry["mean"], 3),
+                "min_seconds": round(entry["min"], 3)
+            }
+            for task_type, entry in self.by_type.items()
+        }
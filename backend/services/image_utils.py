@@ -11,6 +11,13 @@ GENERATED_IMAGES_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'asse
 if not os.path.exists(GENERATED_IMAGES_DIR):
     os.makedirs(GENERATED_IMAGES_DIR)
 
+# 上傳目錄（與 image_processing API 的 UPLOAD_FOLDER 預設一致，相對路徑按項目根目錄解析）
+UPLOAD_DIR = os.path.join(os.path.dirname(__file__), '..', '..', os.getenv('UPLOAD_FOLDER', os.path.join('assets', 'images')))
+
+# 後處理輸出上限（防止單一任務分配過大的圖片耗盡工作進程記憶體）
+MAX_SCALE_FACTOR = 4.0
+MAX_OUTPUT_DIMENSION = 8192
+
 def save_generated_image(image_data, prompt, index, provider='unknown'):
     """
     一個共享的函式，用於解碼、儲存圖片並回傳相關資訊。
@@ -47,4 +54,88 @@ def save_generated_image(image_data, prompt, index, provider='unknown'):
         logger.error(f"保存圖片失敗: {str(e)}")
         # 在失敗時回傳可識別的錯誤資訊
         error_filename = f"error_{provider}_{index+1}.png"
-        return error_filename, "", 0 
\ No newline at end of file
+        return error_filename, "", 0
+
+
+def _resolve_image_path(image_path):
+    """
+    解析來源圖片路徑，只允許生成圖片目錄或上傳目錄下的檔案
+
+    Raises:
+        ValueError: 路徑不在允許的目錄下
+    """
+    resolved = os.path.realpath(image_path)
+    for root in (GENERATED_IMAGES_DIR, UPLOAD_DIR):
+        root = os.path.realpath(root)
+        if os.path.commonpath([resolved, root]) == root:
+            return resolved
+    raise ValueError(f"不允許的圖片路徑: {image_path}")
+
+
+def _clamp_size(width, height):
+    """將輸出尺寸限制在 1..MAX_OUTPUT_DIMENSION，超出時按比例縮小"""
+    width, height = max(1, int(width)), max(1, int(height))
+    ratio = min(1.0, MAX_OUTPUT_DIMENSION / width, MAX_OUTPUT_DIMENSION / height)
+    return max(1, int(width * ratio)), max(1, int(height * ratio))
+
+
+def post_process_image(task_data):
+    """
+    批量後處理任務（在進程通道中執行）
+
+    Args:
+        task_data (dict):
+            image_path: 來源圖片路徑，須位於生成圖片目錄或上傳目錄下（或以 image_bytes 提供原始位元組）
+            operation: upscale / resize / filter
+            scale_factor: upscale 倍數，預設 2，上限 MAX_SCALE_FACTOR
+            width, height: resize 目標尺寸，上限 MAX_OUTPUT_DIMENSION
+            filter_type: blur / sharpen / grayscale / enhance
+
+    Returns:
+        dict: 輸出檔案路徑與尺寸（只回傳路徑，不回傳圖片位元組），輸出寫入生成圖片目錄
+
+    Raises:
+        ValueError: 路徑不在允許的目錄下或操作不支援
+    """
+    from PIL import ImageEnhance, ImageFilter
+
+    image_path = task_data.get('image_path')
+    if image_path is not None:
+        source = _resolve_image_path(image_path)
+    else:
+        source = io.BytesIO(task_data['image_bytes'])
+    operation = task_data.get('operation', 'upscale')
+
+    with Image.open(source) as img:
+        if operation == 'upscale':
+            scale_factor = min(max(float(task_data.get('scale_factor', 2)), 0.01), MAX_SCALE_FACTOR)
+            result = img.resize(_clamp_size(img.width * scale_factor, img.height * scale_factor), Image.LANCZOS)
+        elif operation == 'resize':
+            result = img.resize(_clamp_size(task_data['width'], task_data['height']), Image.LANCZOS)
+        elif operation == 'filter':
+            filter_type = task_data.get('filter_type', 'enhance')
+            if filter_type == 'blur':
+                result = img.filter(ImageFilter.GaussianBlur(radius=2))
+            elif filter_type == 'sharpen':
+                result = img.filter(ImageFilter.SHARPEN)
+            elif filter_type == 'grayscale':
+                result = img.convert('L').convert('RGB')
+            else:
+                result = ImageEnhance.Sharpness(img).enhance(1.2)
+                result = ImageEnhance.Contrast(result).enhance(1.1)
+                result = ImageEnhance.Color(result).enhance(1.1)
+        else:
+            raise ValueError(f"不支援的後處理操作: {operation}")
+
+    base_name = os.path.splitext(os.path.basename(image_path or 'image.png'))[0]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    filename = f"{base_name}_{operation}_{timestamp}.png"
+    filepath = os.path.join(GENERATED_IMAGES_DIR, filename)
+    result.save(filepath, 'PNG')
+
+    return {
+        'filename': filename,
+        'file_path': filepath,
+        'image_size': f"{result.width}x{result.height}",
+        'file_size': os.path.getsize(filepath)
+    }
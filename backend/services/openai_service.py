@@ -1,9 +1,16 @@
 import openai
 import logging
 from .image_utils import save_generated_image
+from .task_cost import record_task_cost
 
 logger = logging.getLogger(__name__)
 
+# DALL-E 每張圖片的價格（美元，標準品質）
+IMAGE_PRICES = {
+    'dall-e-3': {'1024x1024': 0.040, '1024x1792': 0.080, '1792x1024': 0.080},
+    'dall-e-2': {'1024x1024': 0.020, '512x512': 0.018, '256x256': 0.016}
+}
+
 class OpenAIService:
     def __init__(self, api_key):
         if not api_key:
@@ -31,6 +38,8 @@ class OpenAIService:
             }
             
             response = openai.Image.create(**params)
+            # 在批量任務中執行時，將本次生成的費用記錄到任務
+            record_task_cost(IMAGE_PRICES.get(model_name, {}).get(image_size, 0.0) * len(response['data']))
             
             images = []
             for i, image_data in enumerate(response['data']):
@@ -0,0 +1,74 @@
+"""
+進程執行通道 v2.7
+CPU 密集型任務在 ProcessPoolExecutor 中執行；大型二進位資料經共享記憶體傳遞，
+避免將圖片位元組整個 pickle 後經管道複製到子進程
+"""
+
+import logging
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 超過此大小的二進位欄位改以共享記憶體傳遞
+SHARED_MEMORY_THRESHOLD = 64 * 1024
+
+_SHM_MARKER = "__shared_memory__"
+
+def export_payload(data: Dict[str, Any],
+                   threshold: int = SHARED_MEMORY_THRESHOLD) -> Tuple[Dict[str, Any], List[shared_memory.SharedMemory]]:
+    """
+    將任務資料中的大型二進位欄位移至共享記憶體
+
+    檔案路徑等其他欄位原樣傳遞。
+
+    Returns:
+        Tuple[Dict, List[SharedMemory]]: (可傳給子進程的資料, 需在任務結束後釋放的共享記憶體段)
+    """
+    exported = {}
+    segments = []
+    try:
+        for key, value in data.items():
+            if isinstance(value, (bytes, bytearray, memoryview)) and len(value) >= threshold:
+                segment = shared_memory.SharedMemory(create=True, size=len(value))
+                segment.buf[:len(value)] = value
+                segments.append(segment)
+                exported[key] = {_SHM_MARKER: segment.name, "size": len(value)}
+            else:
+                exported[key] = value
+    except Exception:
+        release_segments(segments)
+        raise
+    return exported, segments
+
+def release_segments(segments: List[shared_memory.SharedMemory]):
+    """關閉並刪除共享記憶體段"""
+    for segment in segments:
+        try:
+            segment.close()
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"釋放共享記憶體失敗 {segment.name}: {str(e)}")
+
+def run_in_process(func: Callable[[Dict[str, Any]], Any], data: Dict[str, Any]) -> Any:
+    """
+    子進程入口：還原共享記憶體欄位後調用處理函數
+
+    func 必須是模組層級的同步函數（可被 pickle）。
+    """
+    attached = []
+    try:
+        resolved = {}
+        for key, value in data.items():
+            if isinstance(value, dict) and _SHM_MARKER in value:
+                segment = shared_memory.SharedMemory(name=value[_SHM_MARKER])
+                attached.append(segment)
+                resolved[key] = bytes(segment.buf[:value["size"]])
+            else:
+                resolved[key] = value
+        return func(resolved)
+    finally:
+        for segment in attached:
+            segment.close()
@@ -12,6 +12,8 @@ from typing import Dict, List, Optional, Any, Union
 from datetime import datetime
 import logging
 
+from .task_cost import record_task_cost
+
 # 設置日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,6 +25,8 @@ class ReplicateService:
         self.api_token = api_token or os.getenv('REPLICATE_API_TOKEN')
         self.base_url = 'https://api.replicate.com/v1'
         self.session = None
+        # 預測計算時間的單價（美元/秒，預設為 Nvidia A40 (Large) 的公開價格）
+        self.price_per_second = float(os.getenv('REPLICATE_PRICE_PER_SECOND', '0.000725'))
         
         # 支援的熱門模型列表
         self.popular_models = {
@@ -257,7 +261,10 @@ class ReplicateService:
                         self.usage_stats['successful_requests'] += 1
                     elif prediction['status'] == 'failed':
                         result['error'] = prediction.get('error')
+                        result['metrics'] = prediction.get('metrics', {})
                         self.usage_stats['failed_requests'] += 1
+                    elif prediction['status'] == 'canceled':
+                        result['metrics'] = prediction.get('metrics', {})
                     
                     return result
                 else:
@@ -274,6 +281,35 @@ class ReplicateService:
                 'error': str(e)
             }
     
+    async def cancel_prediction(self, prediction_id: str) -> Dict[str, Any]:
+        """取消進行中的預測（停止遠端計費）"""
+        try:
+            session = await self._get_session()
+            
+            async with session.post(f'{self.base_url}/predictions/{prediction_id}/cancel') as response:
+                if response.status == 200:
+                    prediction = await response.json()
+                    logger.info(f'已取消預測: {prediction_id}')
+                    return {
+                        'success': True,
+                        'prediction_id': prediction_id,
+                        'status': prediction.get('status'),
+                        'metrics': prediction.get('metrics', {})
+                    }
+                else:
+                    error_text = await response.text()
+                    return {
+                        'success': False,
+                        'error': f'HTTP {response.status}: {error_text}'
+                    }
+                    
+        except Exception as e:
+            logger.error(f'取消預測失敗: {str(e)}')
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
     async def wait_for_prediction(self, prediction_id: str, max_wait_time: int = 300) -> Dict[str, Any]:
         """等待預測完成"""
         start_time = time.time()
@@ -287,6 +323,8 @@ class ReplicateService:
             status = result['status']
             
             if status in ['succeeded', 'failed', 'canceled']:
+                # 失敗與取消的預測同樣按已使用的計算時間計費
+                result['cost'] = self._record_prediction_cost(result.get('metrics'))
                 return result
             
             # 等待 5 秒後重試
@@ -298,6 +336,15 @@ class ReplicateService:
             'prediction_id': prediction_id
         }
     
+    def _record_prediction_cost(self, metrics: Optional[Dict[str, Any]]) -> float:
+        """按預測的計算秒數計算費用，累計至使用統計並記錄到當前任務"""
+        predict_time = (metrics or {}).get('predict_time') or 0.0
+        cost = predict_time * self.price_per_second
+        if cost > 0:
+            self.usage_stats['total_cost'] += cost
+            record_task_cost(cost)
+        return cost
+    
     async def generate_image(self, model_key: str, prompt: str, **kwargs) -> Dict[str, Any]:
         """生成圖片的便捷方法"""
         try:
@@ -327,8 +374,19 @@ class ReplicateService:
             if not prediction_result['success']:
                 return prediction_result
             
-            # 等待完成
-            final_result = await self.wait_for_prediction(prediction_result['prediction_id'])
+            # 等待完成；呼叫方取消時同時取消遠端預測
+            try:
+                final_result = await self.wait_for_prediction(prediction_result['prediction_id'])
+            except asyncio.CancelledError:
+                try:
+                    cancel_result = await asyncio.wait_for(
+                        self.cancel_prediction(prediction_result['prediction_id']), timeout=10
+                    )
+                    # 取消前已使用的計算時間計入任務的部分費用
+                    self._record_prediction_cost(cancel_result.get('metrics'))
+                except asyncio.TimeoutError:
+                    logger.warning(f'取消預測逾時: {prediction_result["prediction_id"]}')
+                raise
             
             if final_result['success'] and final_result['status'] == 'succeeded':
                 return {
@@ -337,7 +395,8 @@ class ReplicateService:
                     'model': model_info['name'],
                     'prompt': prompt,
                     'prediction_id': prediction_result['prediction_id'],
-                    'metrics': final_result.get('metrics', {})
+                    'metrics': final_result.get('metrics', {}),
+                    'cost': final_result.get('cost', 0.0)
                 }
             else:
                 return {
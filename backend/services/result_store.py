@@ -0,0 +1,245 @@
+"""
+任務結果磁碟存儲 v2.7
+大型任務結果（如含 base64 圖片的生成結果）以 JSON 寫入磁碟，按內容雜湊定址，
+記憶體與作業日誌中只保留小型結果引用；讀取經 mmap，可整體載入或分塊串流
+"""
+
+import os
+import json
+import mmap
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Any, Dict, Iterator, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 結果引用的標記鍵
+REF_KEY = "$result_ref"
+
+class ResultStore:
+    """按內容雜湊定址的任務結果存儲"""
+
+    def __init__(self, root: str = None, spill_threshold: int = 64 * 1024,
+                 chunk_size: int = 256 * 1024):
+        """
+        初始化存儲
+
+        Args:
+            root: 存儲目錄，預設為項目根目錄下 data/task_results
+            spill_threshold: JSON 編碼後超過此位元組數的結果寫入磁碟，其餘保留在記憶體
+            chunk_size: 串流讀取的分塊大小
+        """
+        if root is None:
+            project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+            root = os.path.join(project_root, 'data', 'task_results')
+
+        self.root = root
+        self.spill_threshold = spill_threshold
+        self.chunk_size = chunk_size
+        os.makedirs(os.path.join(self.root, 'objects'), exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.refs: Dict[str, Set[str]] = {}     # 內容雜湊 -> 引用的任務ID
+        self.task_refs: Dict[str, str] = {}     # 任務ID -> 內容雜湊
+        self.stats = {
+            "spilled": 0,
+            "deduplicated": 0,
+            "kept_in_memory": 0,
+            "bytes_written": 0,
+            "files_removed": 0,
+            "write_errors": 0
+        }
+
+    # 引用
+
+    @staticmethod
+    def is_ref(value: Any) -> bool:
+        """判斷值是否為結果引用"""
+        return isinstance(value, dict) and REF_KEY in value
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+
+    # 寫入
+
+    def put(self, task_id: str, result: Any) -> Any:
+        """
+        保存任務結果
+
+        Args:
+            task_id: 任務ID（用於引用計數）
+            result: 任務結果
+
+        Returns:
+            小型結果原樣返回；大型結果寫入磁碟後返回引用（dict，可 JSON 序列化）。
+            無法 JSON 編碼或寫入失敗的結果原樣返回。
+        """
+        if result is None or isinstance(result, (bool, int, float)) or self.is_ref(result):
+            return result
+        try:
+            encoded = json.dumps(result, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        except (TypeError, ValueError):
+            self.stats["kept_in_memory"] += 1
+            return result
+        if len(encoded) <= self.spill_threshold:
+            self.stats["kept_in_memory"] += 1
+            return result
+
+        digest = hashlib.sha256(encoded).hexdigest()
+        ref = {REF_KEY: digest, "size": len(encoded)}
+        if isinstance(result, list):
+            ref["items"] = len(result)
+
+        # 先登記引用再寫入，避免同內容的最後一個引用釋放時刪除剛確認存在的檔案
+        self.retain(task_id, ref)
+        path = self._path(digest)
+        try:
+            # 相同內容（如合併請求的共用結果）只寫一次
+            if os.path.exists(path):
+                self.stats["deduplicated"] += 1
+            else:
+                self._write_atomic(path, encoded)
+                self.stats["spilled"] += 1
+                self.stats["bytes_written"] += len(encoded)
+        except OSError as e:
+            self.stats["write_errors"] += 1
+            logger.error(f"任務結果寫入磁碟失敗 {task_id}: {str(e)}")
+            self.release(task_id)
+            return result
+        return ref
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        """寫入臨時檔案後原子替換，讀取方不會看到部分內容"""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def retain(self, task_id: str, ref: Dict[str, Any]):
+        """登記任務對結果的引用（恢復時用於重建引用計數）"""
+        digest = ref[REF_KEY]
+        with self.lock:
+            previous = self.task_refs.get(task_id)
+            if previous == digest:
+                return
+            self.task_refs[task_id] = digest
+            self.refs.setdefault(digest, set()).add(task_id)
+        if previous is not None:
+            self._drop(task_id, previous)
+
+    def release(self, task_id: str):
+        """釋放任務的結果引用，最後一個引用釋放時刪除檔案"""
+        with self.lock:
+            digest = self.task_refs.pop(task_id, None)
+        if digest is not None:
+            self._drop(task_id, digest)
+
+    def _drop(self, task_id: str, digest: str):
+        with self.lock:
+            holders = self.refs.get(digest)
+            if holders is None:
+                return
+            holders.discard(task_id)
+            if holders:
+                return
+            del self.refs[digest]
+            self._remove(digest)
+
+    def _remove(self, digest: str):
+        try:
+            os.unlink(self._path(digest))
+            self.stats["files_removed"] += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"刪除任務結果檔案失敗 {digest[:12]}: {str(e)}")
+
+    # 讀取
+
+    def load(self, value: Any) -> Any:
+        """
+        載入結果：引用經 mmap 讀取並解碼，其他值原樣返回
+
+        Raises:
+            FileNotFoundError: 結果檔案已被清理
+        """
+        if not self.is_ref(value):
+            return value
+        with open(self._path(value[REF_KEY]), 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return json.loads(mapped[:])
+
+    def iter_chunks(self, value: Any) -> Iterator[bytes]:
+        """
+        以 JSON 位元組分塊產出結果（引用經 mmap 分塊讀取，不整體載入記憶體）
+
+        Raises:
+            FileNotFoundError: 結果檔案已被清理
+        """
+        if not self.is_ref(value):
+            yield json.dumps(value, ensure_ascii=False, default=str).encode('utf-8')
+            return
+        with open(self._path(value[REF_KEY]), 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for offset in range(0, len(mapped), self.chunk_size):
+                    yield mapped[offset:offset + self.chunk_size]
+
+    # 清理
+
+    def collect_garbage(self, min_age_seconds: float = 3600, keep: Optional[Set[str]] = None) -> int:
+        """
+        刪除沒有任何任務引用的結果檔案（如進程中斷前已寫入但未記錄的結果）
+
+        Args:
+            min_age_seconds: 只刪除修改時間早於此秒數的檔案，避免與進行中的寫入競爭
+            keep: 額外保留的內容雜湊（如作業日誌中其他工作進程的任務引用的結果）
+
+        Returns:
+            int: 刪除的檔案數
+        """
+        cutoff = time.time() - min_age_seconds
+        removed = 0
+        objects_dir = os.path.join(self.root, 'objects')
+        for prefix in os.listdir(objects_dir):
+            directory = os.path.join(objects_dir, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                with self.lock:
+                    referenced = name in self.refs or (keep is not None and name in keep)
+                try:
+                    if referenced or os.path.getmtime(path) > cutoff:
+                        continue
+                    os.unlink(path)
+                    removed += 1
+                except OSError:
+                    continue
+        if removed:
+            self.stats["files_removed"] += removed
+            logger.info(f"清理 {removed} 個未被引用的任務結果檔案")
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取存儲統計"""
+        with self.lock:
+            return {
+                **self.stats,
+                "referenced_results": len(self.refs),
+                "referencing_tasks": len(self.task_refs),
+                "spill_threshold": self.spill_threshold,
+                "root": self.root
+            }
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+AI 批量圖片生成器 - 重試策略
+提供指數退避、隨機抖動與 Retry-After 解析，供批量與異步處理器共用
+"""
+
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+class RetryableError(Exception):
+    """可重試的服務錯誤（如 429/503），可攜帶服務端建議的等待秒數"""
+
+    def __init__(self, message: str, retry_after: Any = None,
+                 status_code: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = parse_retry_after(retry_after)
+        self.status_code = status_code
+
+def parse_retry_after(value: Any) -> Optional[float]:
+    """
+    解析 Retry-After 標頭
+
+    Args:
+        value: 秒數或 HTTP 日期字串
+
+    Returns:
+        Optional[float]: 需等待的秒數，無法解析時返回 None
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return max(0.0, float(value))
+
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def get_retry_after(error: Optional[BaseException]) -> Optional[float]:
+    """
+    從異常（及其因果鏈）中取得服務端建議的重試等待時間
+
+    支援 RetryableError.retry_after，以及帶有 response.headers 的 HTTP 異常
+    （requests.HTTPError、aiohttp.ClientResponseError 等）。
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            return parse_retry_after(retry_after)
+
+        headers = getattr(error, 'headers', None)
+        if headers is None:
+            response = getattr(error, 'response', None)
+            headers = getattr(response, 'headers', None)
+        if headers is not None:
+            try:
+                header_value = headers.get('Retry-After')
+            except AttributeError:
+                header_value = None
+            if header_value is not None:
+                return parse_retry_after(header_value)
+
+        error = error.__cause__ or error.__context__
+    return None
+
+class RetryPolicy:
+    """指數退避重試策略（equal jitter）"""
+
+    def __init__(self, base_delay: float = 1.0, max_delay: float = 60.0,
+                 multiplier: float = 2.0, jitter: float = 0.5):
+        """
+        Args:
+            base_delay: 首次重試的基礎延遲（秒）
+            max_delay: 退避延遲上限（秒），不限制服務端要求的 Retry-After
+            multiplier: 每次重試的延遲倍數
+            jitter: 隨機抖動比例（0-1），延遲在 [d*(1-jitter), d] 之間均勻分佈
+        """
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = min(1.0, max(0.0, jitter))
+
+    def compute_delay(self, retry_count: int, error: Optional[BaseException] = None) -> float:
+        """
+        計算第 retry_count 次重試前的等待時間
+
+        服務端提供 Retry-After 時以其為下限，並加上少量抖動避免同時喚醒。
+        """
+        backoff = min(self.max_delay, self.base_delay * (self.multiplier ** max(0, retry_count - 1)))
+        delay = backoff * (1 - self.jitter * random.random())
+
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after + random.uniform(0, self.base_delay * self.jitter))
+        return delay
+
+class RetryDelayStats:
+    """重試延遲分佈統計"""
+
+    BUCKETS = [(1, "<1s"), (5, "1-5s"), (15, "5-15s"), (60, "15-60s"), (float('inf'), ">=60s")]
+
+    def __init__(self):
+        self.count = 0
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+        self.retry_after_honored = 0
+        self.histogram = {label: 0 for _, label in self.BUCKETS}
+
+    def record(self, delay: float, honored_retry_after: bool = False):
+        """記錄一次重試延遲"""
+        self.count += 1
+        self.total_delay += delay
+        self.max_delay = max(self.max_delay, delay)
+        if honored_retry_after:
+            self.retry_after_honored += 1
+        for upper, label in self.BUCKETS:
+            if delay < upper:
+                self.histogram[label] += 1
+                break
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉換為統計字典"""
+        return {
+            "scheduled_retries": self.count,
+            "average_delay_seconds": round(self.total_delay / self.count, 3) if self.count else 0.0,
+            "max_delay_seconds": round(self.max_delay, 3),
+            "retry_after_honored": self.retry_after_honored,
+            "delay_histogram": dict(self.histogram)
+        }
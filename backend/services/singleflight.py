@@ -0,0 +1,154 @@
+"""
+同鍵請求合併（singleflight） v2.7
+相同的生成請求正在執行時，後到的請求等待並共用同一次調用的結果，避免重複付費調用
+"""
+
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 不影響生成結果的欄位，不計入合併鍵
+NON_OUTPUT_FIELDS = frozenset({"coalesce", "estimated_cost"})
+
+def generation_request_key(task_type: str, data: Dict[str, Any]) -> Optional[str]:
+    """
+    生成請求的合併鍵
+
+    以任務類型與完整請求資料（不含 NON_OUTPUT_FIELDS）的規範化雜湊組成，
+    任何會影響結果的欄位（風格、語言、模型、憑證等）不同時都不會合併。
+    沒有提示詞、指定 coalesce=False 或帶有 seed（需要不同結果）時返回 None，表示不合併。
+    """
+    if not isinstance(data, dict) or not data.get("prompt"):
+        return None
+    if data.get("coalesce") is False or data.get("seed") is not None:
+        return None
+
+    canonical = json.dumps(
+        {key: value for key, value in data.items() if key not in NON_OUTPUT_FIELDS},
+        sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str
+    )
+    return f"{task_type}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+class _Call:
+    """一次進行中的調用"""
+
+    __slots__ = ("event", "result", "error", "task", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Future] = None
+        self.waiters = 0
+
+class SingleFlight:
+    """線程安全的請求合併（同步調用，用於 Flask 請求線程）"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.lock = threading.Lock()
+        self.stats = {
+            "executed_calls": 0,
+            "coalesced_calls": 0
+        }
+
+    def do(self, key: Optional[str], fn: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        執行 fn，相同鍵的調用進行中時等待其結果
+
+        Args:
+            key: 合併鍵，None 表示不合併直接執行
+
+        Returns:
+            Tuple[Any, bool]: (結果, 是否共用了其他請求的結果)
+        """
+        if key is None:
+            return fn(*args, **kwargs), False
+
+        with self.lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.stats["coalesced_calls"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats["executed_calls"] += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def get_stats(self) -> Dict[str, int]:
+        """獲取合併統計（coalesced_calls 即節省的調用數）"""
+        with self.lock:
+            return {**self.stats, "in_flight": len(self._calls)}
+
+class AsyncSingleFlight:
+    """事件循環內的請求合併
+
+    共用的調用在獨立的 asyncio.Task 中執行，單個等待者超時或被取消不影響其他等待者；
+    所有等待者都離開後才取消共用調用。只能在同一個事件循環中使用。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.stats = {
+            "executed_calls": 0,
+            "coalesced_calls": 0
+        }
+
+    async def do(self, key: Optional[str], factory: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        """
+        執行 factory() 返回的協程，相同鍵的調用進行中時等待其結果
+
+        Returns:
+            Tuple[Any, bool]: (結果, 是否共用了其他請求的結果)
+        """
+        if key is None:
+            return await factory(), False
+
+        call = self._calls.get(key)
+        shared = call is not None
+        if shared:
+            self.stats["coalesced_calls"] += 1
+        else:
+            call = self._calls[key] = _Call()
+            call.task = asyncio.ensure_future(factory())
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.stats["executed_calls"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        """獲取合併統計（coalesced_calls 即節省的調用數）"""
+        return {**self.stats, "in_flight": len(self._calls)}
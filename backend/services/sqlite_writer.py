@@ -0,0 +1,187 @@
+"""
+SQLite 分組提交寫入器 v2.7
+熱路徑只將寫入操作入隊，由背景線程取出所有已入隊的操作在單個事務內提交 (WAL 模式)；
+BatchJournal 與 TaskArchive 共用此寫入器
+"""
+
+import os
+import queue
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+def default_db_path(filename: str) -> str:
+    """項目根目錄下 data/ 中的資料庫路徑"""
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    return os.path.join(project_root, 'data', filename)
+
+class SQLiteBatchWriter:
+    """
+    以背景線程分組提交的 SQLite 寫入器基類
+
+    子類實現 _create_schema 與 _write_rows，並可通過 _apply_op 處理自訂操作、
+    _after_batch 在每次提交前執行維護工作。行寫入與自訂操作按入隊順序執行。
+    """
+
+    description = "SQLite"          # 日誌訊息中的寫入器名稱
+    extra_stats: Tuple[str, ...] = ()  # 子類額外的統計計數
+
+    def __init__(self, db_path: str, max_batch_size: int = 500, thread_name: str = "SQLiteBatchWriter"):
+        """
+        Args:
+            db_path: 資料庫路徑
+            max_batch_size: 單次分組提交的最大操作數
+            thread_name: 寫入線程名稱
+        """
+        self.db_path = db_path
+        self.max_batch_size = max_batch_size
+        self._ensure_db_directory()
+        self._init_database()
+
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.stats = {
+            "records_written": 0,
+            "commits": 0,
+            "largest_batch": 0,
+            **{key: 0 for key in self.extra_stats}
+        }
+        self._writer = threading.Thread(target=self._writer_loop, name=thread_name, daemon=True)
+        self._writer.start()
+
+    def _ensure_db_directory(self):
+        """確保資料庫目錄存在"""
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+    def _connect(self) -> sqlite3.Connection:
+        """建立 WAL 模式連接"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _init_database(self):
+        """初始化表結構"""
+        conn = self._connect()
+        try:
+            self._create_schema(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # 入隊
+    # ------------------------------------------------------------------
+
+    def _enqueue_row(self, row: Any):
+        """入隊一條待寫入的記錄（非阻塞）"""
+        self._queue.put(("row", row))
+
+    def _enqueue(self, kind: str, arg: Any = None):
+        """入隊一個自訂操作（非阻塞）"""
+        self._queue.put((kind, arg))
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """等待已入隊的操作全部提交"""
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self):
+        """提交剩餘操作並停止寫入線程"""
+        if not self._writer.is_alive():
+            return
+        self._queue.put(("stop", None))
+        self._writer.join(timeout=10)
+
+    # ------------------------------------------------------------------
+    # 背景寫入線程
+    # ------------------------------------------------------------------
+
+    def _writer_loop(self):
+        """分組提交：阻塞等待首個操作，再取出所有已入隊操作一次提交"""
+        conn = self._connect()
+        try:
+            while True:
+                ops = [self._queue.get()]
+                while len(ops) < self.max_batch_size:
+                    try:
+                        ops.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if not self._apply_ops(conn, ops):
+                    break
+        finally:
+            conn.close()
+
+    def _apply_ops(self, conn: sqlite3.Connection, ops: List[tuple]) -> bool:
+        """在單個事務內執行一批操作，返回是否繼續運行"""
+        rows = []
+        waiters: List[threading.Event] = []
+        keep_running = True
+
+        try:
+            for kind, arg in ops:
+                if kind == "row":
+                    rows.append(arg)
+                    continue
+
+                # 其他操作前先寫入之前的記錄，保持順序
+                self._flush_rows(conn, rows)
+                rows = []
+                if kind == "flush":
+                    waiters.append(arg)
+                elif kind == "stop":
+                    keep_running = False
+                else:
+                    self._apply_op(conn, kind, arg, waiters)
+
+            self._flush_rows(conn, rows)
+            self._after_batch(conn)
+            conn.commit()
+            self.stats["commits"] += 1
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(ops))
+        except Exception as e:
+            logger.error(f"{self.description}寫入失敗: {str(e)}")
+            conn.rollback()
+        finally:
+            for waiter in waiters:
+                waiter.set()
+
+        return keep_running
+
+    def _flush_rows(self, conn: sqlite3.Connection, rows: List[Any]):
+        if rows:
+            self._write_rows(conn, rows)
+            self.stats["records_written"] += len(rows)
+
+    # ------------------------------------------------------------------
+    # 子類擴展點
+    # ------------------------------------------------------------------
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        """建立表與索引"""
+        raise NotImplementedError
+
+    def _write_rows(self, conn: sqlite3.Connection, rows: List[Any]):
+        """寫入一批已入隊的記錄"""
+        raise NotImplementedError
+
+    def _apply_op(self, conn: sqlite3.Connection, kind: str, arg: Any, waiters: List[threading.Event]):
+        """執行自訂操作；需要通知等待者時將 Event 加入 waiters（提交後設置）"""
+        raise ValueError(f"未知的寫入操作: {kind}")
+
+    def _after_batch(self, conn: sqlite3.Connection):
+        """每批操作提交前的維護工作"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        """獲取寫入統計"""
+        stats = dict(self.stats)
+        stats["pending_records"] = self._queue.qsize()
+        stats["db_path"] = self.db_path
+        return stats
@@ -1,6 +1,7 @@
 import requests
 import logging
 from .image_utils import save_generated_image
+from .retry_policy import RetryableError
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +40,12 @@ class StabilityService:
             
             response = requests.post(self.API_URL, headers=headers, json=body)
             
+            if response.status_code in (429, 503):
+                raise RetryableError(
+                    f"API請求受限: {response.status_code} {response.text}",
+                    retry_after=response.headers.get('Retry-After'),
+                    status_code=response.status_code
+                )
             if response.status_code != 200:
                 raise Exception(f"API請求失敗: {response.status_code} {response.text}")
             
@@ -74,6 +81,9 @@ class StabilityService:
 
             return images
             
+        except RetryableError as e:
+            logger.warning(f"Stability AI 請求受限: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Stability AI API調用失敗: {str(e)}")
             raise Exception(f"Stability AI API調用失敗: {str(e)}") 
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+異步任務歸檔 v2.7
+AsyncProcessor 淘汰的已結束任務以元數據形式寫入 SQLite (WAL 模式)，
+記憶體只保留近期任務，歷史查詢改由歸檔提供
+"""
+
+import json
+import time
+import sqlite3
+import logging
+from typing import Any, Dict, List, Optional
+
+from .sqlite_writer import SQLiteBatchWriter, default_db_path
+
+logger = logging.getLogger(__name__)
+
+class TaskArchive(SQLiteBatchWriter):
+    """已結束異步任務的 SQLite 歸檔"""
+
+    description = "異步任務歸檔"
+    extra_stats = ("records_purged",)
+
+    def __init__(self, db_path: str = None, retention_days: Optional[float] = 30,
+                 max_batch_size: int = 500):
+        """
+        初始化歸檔
+
+        Args:
+            db_path: 資料庫路徑，預設為項目根目錄下 data/async_task_archive.db
+            retention_days: 歸檔記錄保留天數，None 表示永久保留
+            max_batch_size: 單次分組提交的最大記錄數
+        """
+        self.retention_days = retention_days
+        self._last_purge = 0.0
+        super().__init__(db_path or default_db_path('async_task_archive.db'), max_batch_size,
+                         thread_name="TaskArchiveWriter")
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        """初始化歸檔表結構"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS async_task_archive (
+                task_id TEXT PRIMARY KEY,
+                name TEXT,
+                status TEXT NOT NULL,
+                created_at TEXT,
+                completed_at TEXT,
+                payload TEXT NOT NULL,
+                archived_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_async_task_archive_status ON async_task_archive(status, created_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_async_task_archive_created ON async_task_archive(created_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_async_task_archive_archived ON async_task_archive(archived_at)')
+
+    # ------------------------------------------------------------------
+    # 寫入（僅入隊）
+    # ------------------------------------------------------------------
+
+    def add(self, record: Dict[str, Any]):
+        """
+        歸檔一個任務（非阻塞）
+
+        Args:
+            record: AsyncProcessor.get_task_status 格式的任務元數據
+        """
+        self._enqueue_row((record, time.time()))
+
+    # ------------------------------------------------------------------
+    # 背景寫入線程
+    # ------------------------------------------------------------------
+
+    def _write_rows(self, conn: sqlite3.Connection, rows: List[tuple]):
+        """寫入歸檔記錄"""
+        conn.executemany('''
+            INSERT OR REPLACE INTO async_task_archive
+                (task_id, name, status, created_at, completed_at, payload, archived_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(record["id"], record.get("name"), record["status"],
+               record.get("created_at"), record.get("completed_at"),
+               json.dumps(record, ensure_ascii=False, default=str), archived_at)
+              for record, archived_at in rows])
+
+    def _after_batch(self, conn: sqlite3.Connection):
+        self._purge_expired(conn)
+
+    def _purge_expired(self, conn: sqlite3.Connection):
+        """刪除超過保留天數的歸檔記錄（每小時最多一次）"""
+        if self.retention_days is None or time.time() - self._last_purge < 3600:
+            return
+        self._last_purge = time.time()
+        cursor = conn.execute('DELETE FROM async_task_archive WHERE archived_at < ?',
+                              (time.time() - self.retention_days * 86400,))
+        if cursor.rowcount:
+            self.stats["records_purged"] += cursor.rowcount
+            logger.info(f"清理 {cursor.rowcount} 條過期的異步任務歸檔")
+
+    # ------------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------------
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """查詢單個歸檔任務"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT payload FROM async_task_archive WHERE task_id = ?',
+                               (task_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._decode(row[0]) if row else None
+
+    def query(self, status: Optional[str] = None, limit: Optional[int] = 100,
+              offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        按創建時間倒序查詢歸檔任務
+
+        Args:
+            status: 狀態過濾（使用狀態索引）
+            limit: 最大返回數，None 表示不限
+            offset: 跳過的記錄數
+        """
+        sql = 'SELECT payload FROM async_task_archive'
+        params: List[Any] = []
+        if status is not None:
+            sql += ' WHERE status = ?'
+            params.append(status)
+        sql += ' ORDER BY created_at DESC LIMIT ? OFFSET ?'
+        params.extend([limit if limit is not None else -1, offset])
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        return [self._decode(row[0]) for row in rows]
+
+    def count(self, status: Optional[str] = None) -> int:
+        """歸檔任務數"""
+        conn = self._connect()
+        try:
+            if status is None:
+                return conn.execute('SELECT COUNT(*) FROM async_task_archive').fetchone()[0]
+            return conn.execute('SELECT COUNT(*) FROM async_task_archive WHERE status = ?',
+                                (status,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _decode(payload: str) -> Dict[str, Any]:
+        record = json.loads(payload)
+        record["archived"] = True
+        return record
@@ -0,0 +1,58 @@
+"""
+任務成本記錄 v2.7
+處理器在產生費用時調用 record_task_cost，費用會累加到當前正在執行的任務上；
+任務被取消時已累計的部分費用仍會保留並計入統計
+"""
+
+import contextvars
+from typing import Any, Optional
+
+# 對話模型每百萬 token 的價格（美元）：(輸入, 輸出)
+CHAT_TOKEN_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-3.5-turbo": (0.50, 1.50)
+}
+
+# 當前協程上下文中正在執行的任務（具有 cost 屬性的物件）
+_current_task: contextvars.ContextVar[Optional[Any]] = contextvars.ContextVar("current_task", default=None)
+
+def bind_task(task: Any) -> contextvars.Token:
+    """將任務綁定到當前上下文（每個任務在自己的 asyncio.Task 中綁定）"""
+    return _current_task.set(task)
+
+def unbind_task(token: contextvars.Token):
+    """解除綁定"""
+    _current_task.reset(token)
+
+def record_task_cost(amount: float) -> bool:
+    """
+    為當前任務記錄費用
+
+    在協程處理器及其建立的子任務、以及線程通道的同步函數中有效；進程池中的函數沒有任務上下文，
+    其費用應由返回結果的 cost 欄位攜帶（見 result_cost）。
+
+    Returns:
+        bool: 是否有任務接收此費用
+    """
+    task = _current_task.get()
+    if task is None:
+        return False
+    task.cost += amount
+    return True
+
+def chat_completion_cost(model: str, usage: Any) -> float:
+    """按 token 用量計算對話補全的費用（未知模型或沒有用量資訊時為 0）"""
+    prices = CHAT_TOKEN_PRICES.get(model)
+    if prices is None or usage is None:
+        return 0.0
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+def result_cost(result: Any) -> float:
+    """任務結果攜帶的費用（dict 的 cost 欄位），用於無法記錄到任務上下文的處理器"""
+    if isinstance(result, dict):
+        cost = result.get("cost")
+        if isinstance(cost, (int, float)) and not isinstance(cost, bool) and cost > 0:
+            return float(cost)
+    return 0.0
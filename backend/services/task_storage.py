@@ -0,0 +1,74 @@
+"""
+任務資料緊湊存儲 v2.7
+大型批量作業的任務資料以 JSON 編碼追加至單一緩衝區，任務僅保存偏移量
+"""
+
+import json
+import struct
+import threading
+from collections import OrderedDict
+from typing import Any, Dict
+
+_LENGTH = struct.Struct('<I')
+
+class PayloadStore:
+    """追加式任務資料存儲"""
+
+    def __init__(self, dedup_window: int = 4096):
+        """
+        Args:
+            dedup_window: 用於去重的最近資料數量；相同資料只存一份
+        """
+        self.buffer = bytearray()
+        self.dedup_window = dedup_window
+        self._recent: "OrderedDict[int, int]" = OrderedDict()  # 資料雜湊 -> 偏移量
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+
+    def add(self, data: Dict[str, Any]) -> int:
+        """
+        存入任務資料
+
+        Returns:
+            int: 偏移量
+
+        Raises:
+            TypeError: 資料無法以 JSON 編碼
+        """
+        encoded = json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+        key = hash(encoded)
+
+        with self._lock:
+            offset = self._recent.get(key)
+            if offset is not None and self._read_raw(offset) == encoded:
+                self._recent.move_to_end(key)
+                self.deduplicated += 1
+                return offset
+
+            offset = len(self.buffer)
+            self.buffer += _LENGTH.pack(len(encoded))
+            self.buffer += encoded
+            self.stored += 1
+
+            self._recent[key] = offset
+            if len(self._recent) > self.dedup_window:
+                self._recent.popitem(last=False)
+            return offset
+
+    def get(self, offset: int) -> Dict[str, Any]:
+        """讀取任務資料（每次返回新的字典）"""
+        return json.loads(self._read_raw(offset))
+
+    def _read_raw(self, offset: int) -> bytes:
+        (length,) = _LENGTH.unpack_from(self.buffer, offset)
+        start = offset + _LENGTH.size
+        return bytes(self.buffer[start:start + length])
+
+    def get_stats(self) -> Dict[str, int]:
+        """獲取存儲統計"""
+        return {
+            "stored_payloads": self.stored,
+            "deduplicated_payloads": self.deduplicated,
+            "buffer_bytes": len(self.buffer)
+        }
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+異步處理器調度基準測試
+以固定速率提交任務，比較舊版輪詢調度與名額（Semaphore）調度的
+每任務調度開銷以及從提交到開始執行的延遲分佈
+
+用法: python scripts/benchmark_async_processor.py [任務數] [每秒提交數]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import statistics
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from services.async_processor import AsyncProcessor, AsyncTask, TaskStatus
+
+# 任務執行時間與併發數：容量約 1250 任務/秒，1k 任務/秒時利用率約 80%
+TASK_SECONDS = 0.004
+MAX_CONCURRENT = 5
+
+class LegacyAsyncProcessor(AsyncProcessor):
+    """v2.6 的輪詢調度循環（用於對照）"""
+
+    async def _process_tasks(self):
+        while self.is_running:
+            try:
+                if len(self.running_tasks) >= self.max_concurrent_tasks:
+                    await asyncio.sleep(0.1)
+                    continue
+
+                try:
+                    priority, submit_time, task_id = await asyncio.wait_for(
+                        self.task_queue.get(), timeout=1.0
+                    )
+                except asyncio.TimeoutError:
+                    continue
+
+                if task_id not in self.tasks:
+                    continue
+                task = self.tasks[task_id]
+                if task.status == TaskStatus.CANCELLED:
+                    continue
+
+                running_task = asyncio.create_task(self._execute_task(task))
+                self.running_tasks[task_id] = running_task
+                with self.lock:
+                    self.stats['queue_size'] -= 1
+                    self.stats['running_count'] += 1
+            except Exception:
+                await asyncio.sleep(1)
+
+async def work():
+    await asyncio.sleep(TASK_SECONDS)
+
+async def noop():
+    return None
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+async def run_paced(processor_class, task_count: int, rate: float) -> Dict[str, float]:
+    """按固定速率提交任務，返回提交到開始執行的延遲（毫秒）"""
+    processor = processor_class(max_concurrent_tasks=MAX_CONCURRENT)
+    submitted: Dict[str, float] = {}
+    latencies: List[float] = []
+    processor.add_callback('on_start', lambda task: latencies.append(time.perf_counter() - submitted[task.id]))
+    await processor.start_processor()
+
+    start = time.perf_counter()
+    sent = 0
+    while sent < task_count:
+        due = min(task_count, int((time.perf_counter() - start) * rate) + 1)
+        while sent < due:
+            task = AsyncTask(name=f"bench_{sent}", function=work, max_retries=0)
+            submitted[task.id] = time.perf_counter()
+            await processor.submit_task(task)
+            sent += 1
+        await asyncio.sleep(0.001)
+
+    while processor.stats['completed_tasks'] < task_count:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    await processor.stop_processor()
+
+    latencies = [value * 1000 for value in latencies]
+    return {
+        "p50": statistics.median(latencies),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies),
+        "throughput": task_count / elapsed
+    }
+
+async def run_saturated(processor_class, task_count: int) -> float:
+    """一次提交全部空任務，返回每任務的調度開銷（微秒）"""
+    processor = processor_class(max_concurrent_tasks=MAX_CONCURRENT)
+    for i in range(task_count):
+        await processor.submit_task(AsyncTask(name=f"noop_{i}", function=noop, max_retries=0))
+
+    start = time.perf_counter()
+    await processor.start_processor()
+    while processor.stats['completed_tasks'] < task_count:
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    await processor.stop_processor()
+    return elapsed / task_count * 1e6
+
+async def main():
+    task_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 1000.0
+
+    print(f"任務數: {task_count}，提交速率: {rate:.0f}/s，任務耗時: {TASK_SECONDS * 1000:.0f}ms，併發: {MAX_CONCURRENT}")
+    for label, processor_class in (("舊版輪詢調度", LegacyAsyncProcessor), ("名額調度    ", AsyncProcessor)):
+        paced = await run_paced(processor_class, task_count, rate)
+        overhead = await run_saturated(processor_class, task_count)
+        print(f"{label}: 開始延遲 p50 {paced['p50']:.2f}ms / p99 {paced['p99']:.2f}ms / 最大 {paced['max']:.2f}ms，"
+              f"吞吐 {paced['throughput']:.0f}/s，調度開銷 {overhead:.1f}µs/任務")
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+批量作業日誌基準測試
+比較啟用與未啟用 BatchJournal 時每個任務的處理開銷
+
+用法: python scripts/benchmark_batch_journal.py [任務數]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from services.batch_processor import BatchProcessor, TaskStatus
+from services.batch_journal import BatchJournal
+
+async def noop_processor(task_data):
+    """不做任何工作的處理器，只測量引擎開銷"""
+    return {"index": task_data["index"]}
+
+def run_job(task_count: int, journal: BatchJournal = None) -> float:
+    """執行一個作業，返回總耗時（秒）"""
+    processor = BatchProcessor(max_workers=16, max_concurrent_jobs=1, journal=journal)
+    processor.register_task_processor("noop", noop_processor)
+    job_id = processor.create_job(
+        "benchmark",
+        [{"type": "noop", "data": {"index": i}} for i in range(task_count)],
+        concurrent_limit=16
+    )
+
+    start = time.perf_counter()
+    processor.start_job(job_id)
+    while processor.jobs[job_id].status != TaskStatus.COMPLETED:
+        time.sleep(0.001)
+    if journal is not None:
+        journal.flush()
+    elapsed = time.perf_counter() - start
+
+    processor.stop_processor()
+    return elapsed
+
+def main():
+    task_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    baseline = run_job(task_count)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        journal = BatchJournal(os.path.join(tmp_dir, 'batch_journal.db'))
+        journaled = run_job(task_count, journal)
+        stats = journal.get_stats()
+
+        # 單獨測量熱路徑入隊成本
+        append_count = 100000
+        start = time.perf_counter()
+        for i in range(append_count):
+            journal.append("task_status", "job_bench", f"job_bench_task_{i}", "completed", {"retry_count": 0})
+        append_cost = (time.perf_counter() - start) / append_count
+        journal.close()
+
+    print(f"任務數: {task_count}")
+    print(f"未啟用日誌: {baseline:.3f}s ({baseline / task_count * 1e6:.1f} µs/任務)")
+    print(f"啟用日誌:   {journaled:.3f}s ({journaled / task_count * 1e6:.1f} µs/任務，含最終刷盤)")
+    print(f"日誌開銷:   {(journaled - baseline) / task_count * 1e6:.1f} µs/任務")
+    print(f"append() 入隊成本: {append_cost * 1e6:.2f} µs/次")
+    print(f"寫入記錄: {stats['records_written']}，提交次數: {stats['commits']}，"
+          f"最大分組: {stats['largest_batch']}")
+
+if __name__ == '__main__':
+    main()
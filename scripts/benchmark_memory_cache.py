@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+記憶體緩存基準測試
+在不同緩存規模下比較舊版 MemoryCache（每次寫入全表掃描過期項目、min() 尋找 LRU）
+與有序字典 + 過期堆實現的 get/set 吞吐量
+
+用法: python scripts/benchmark_memory_cache.py [規模...]
+"""
+
+import os
+import sys
+import time
+import random
+import threading
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from services.cache_service import MemoryCache
+
+OPS = 200000
+# 舊版每次寫入為 O(n)，按規模縮減量測的操作數（規模 × 操作數約為此值）
+LEGACY_WORK = 20000000
+
+class LegacyMemoryCache:
+    """v2.6 的記憶體緩存（用於對照）"""
+
+    def __init__(self, max_size: int = 1000, default_ttl: int = 3600):
+        self.cache: Dict[str, Dict] = {}
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.access_times: Dict[str, float] = {}
+        self.lock = threading.RLock()
+
+    def _is_expired(self, item: Dict) -> bool:
+        if 'expires_at' not in item:
+            return False
+        return time.time() > item['expires_at']
+
+    def _cleanup_expired(self):
+        with self.lock:
+            expired_keys = [key for key, item in self.cache.items() if self._is_expired(item)]
+            for key in expired_keys:
+                del self.cache[key]
+                self.access_times.pop(key, None)
+
+    def _evict_lru(self):
+        if len(self.cache) <= self.max_size:
+            return
+        with self.lock:
+            oldest_key = min(self.access_times.keys(), key=lambda k: self.access_times[k])
+            del self.cache[oldest_key]
+            del self.access_times[oldest_key]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            if key not in self.cache:
+                return None
+            item = self.cache[key]
+            if self._is_expired(item):
+                del self.cache[key]
+                self.access_times.pop(key, None)
+                return None
+            self.access_times[key] = time.time()
+            return item['value']
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        with self.lock:
+            self._cleanup_expired()
+            self._evict_lru()
+            expires_at = time.time() + (ttl if ttl is not None else self.default_ttl)
+            self.cache[key] = {'value': value, 'expires_at': expires_at, 'created_at': time.time()}
+            self.access_times[key] = time.time()
+
+def fill(cache, size: int):
+    """預先填滿緩存（耗時不計入）"""
+    if isinstance(cache, MemoryCache):
+        for i in range(size):
+            cache.set(f"key:{i}", i)
+        return
+    # 舊版逐項 set 在大規模下為 O(n²)，直接寫入內部結構
+    now = time.time()
+    for i in range(size):
+        cache.cache[f"key:{i}"] = {'value': i, 'expires_at': now + cache.default_ttl, 'created_at': now}
+        cache.access_times[f"key:{i}"] = now
+
+def measure(cache, size: int, ops: int) -> Dict[str, float]:
+    """返回 get 命中與 set（新鍵，觸發驅逐）的每秒操作數"""
+    keys = [f"key:{random.randrange(size)}" for _ in range(ops)]
+    start = time.perf_counter()
+    for key in keys:
+        cache.get(key)
+    get_rate = ops / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(ops):
+        cache.set(f"new:{i}", i)
+    set_rate = ops / (time.perf_counter() - start)
+    return {"get": get_rate, "set": set_rate}
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 100000, 1000000]
+    print(f"{'規模':>9} | {'實現':<6} | {'get/s':>12} | {'set/s':>12}")
+    for size in sizes:
+        for label, cache_class in (("舊版", LegacyMemoryCache), ("新版", MemoryCache)):
+            cache = cache_class(max_size=size)
+            fill(cache, size)
+            ops = OPS if cache_class is MemoryCache else max(20, min(OPS, LEGACY_WORK // size))
+            rates = measure(cache, size, ops)
+            print(f"{size:>9} | {label:<6} | {rates['get']:>12,.0f} | {rates['set']:>12,.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Redis 緩存基準測試
+模擬圖庫頁面讀取 50 筆緩存記錄，比較舊版 RedisCache（每鍵一次 GET、JSON 文字）
+與批量讀寫（MGET / 管線）及各序列化器的往返次數、送出位元組與每筆值的位元組（即存儲與讀取傳回的大小）
+
+設定 REDIS_URL 時使用該 Redis，否則使用 fakeredis 的進程內伺服器（需安裝 redis 與 fakeredis）
+
+用法: python scripts/benchmark_redis_cache.py [頁數]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+from typing import Any, Dict, List, Optional
+
+import redis
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from services.cache_service import RedisCache
+from services.cache_serializers import JSONSerializer, MsgpackSerializer, PickleSerializer, MSGPACK_AVAILABLE
+
+PAGE_SIZE = 50
+TTL = 3600
+
+# 未設定 REDIS_URL 時共用的 fakeredis 伺服器
+SERVER = None
+
+# 每個連接發出的命令封包與位元組
+traffic = {"round_trips": 0, "bytes_sent": 0}
+
+def counting(connection_class):
+    """統計送出封包的連接類（管線的所有命令在一次送出中計為一次往返）"""
+    class CountingConnection(connection_class):
+        def send_packed_command(self, command, check_health=True):
+            traffic["round_trips"] += 1
+            chunks = command if isinstance(command, (list, tuple)) else [command]
+            traffic["bytes_sent"] += sum(len(chunk) for chunk in chunks)
+            return super().send_packed_command(command, check_health)
+    return CountingConnection
+
+def make_pool(decode_responses: bool = False) -> redis.ConnectionPool:
+    url = os.getenv('REDIS_URL')
+    if url:
+        pool = redis.ConnectionPool.from_url(url, decode_responses=decode_responses)
+        pool.connection_class = counting(pool.connection_class)
+        return pool
+    import fakeredis
+    return redis.ConnectionPool(connection_class=counting(fakeredis.FakeRedisConnection),
+                                server=SERVER, decode_responses=decode_responses)
+
+class LegacyRedisCache:
+    """v2.6 的 Redis 緩存（用於對照）：JSON 文字、每鍵一次往返"""
+
+    def __init__(self):
+        self.redis_client = redis.Redis(connection_pool=make_pool(decode_responses=True))
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.redis_client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl: int = TTL) -> bool:
+        return self.redis_client.set(key, json.dumps(value, ensure_ascii=False), ex=ttl)
+
+def make_record(i: int) -> Dict[str, Any]:
+    """圖庫頁面的一筆緩存記錄（圖片位元組已在二進位層，記錄只含元數據）"""
+    prompt = " ".join(random.choice(["a", "cinematic", "portrait", "of", "a", "cat", "in", "neon", "city",
+                                     "at", "night", "highly", "detailed", "8k", "watercolor"]) for _ in range(40))
+    return {
+        "success": True,
+        "prompt": prompt,
+        "negative_prompt": "blurry, low quality, watermark",
+        "api_provider": "openai",
+        "model": "dall-e-3",
+        "image_size": "1024x1024",
+        "images": [{
+            "mime_type": "image/png",
+            "filename": f"openai_{i}_{j}.png",
+            "url": f"/generated_images/openai_{i}_{j}.png",
+            "blob": f"{random.getrandbits(256):064x}",
+            "blob_size": random.randint(900000, 1600000),
+        } for j in range(4)],
+        "cached_at": "2026-10-17T12:00:00",
+        "cache_ttl": TTL
+    }
+
+def stored_bytes(keys: List[str]) -> int:
+    client = redis.Redis(connection_pool=make_pool())
+    return sum(client.strlen(key) for key in keys)
+
+def run(label: str, cache, pages: int, records: Dict[str, Dict], bulk: bool):
+    prefix = label.replace(" ", "_")
+    keys = [f"{prefix}:{key}" for key in records]
+    if bulk:
+        cache.set_many({f"{prefix}:{key}": value for key, value in records.items()}, TTL)
+    else:
+        for key, value in records.items():
+            cache.set(f"{prefix}:{key}", value, TTL)
+
+    traffic.update(round_trips=0, bytes_sent=0)
+    start = time.perf_counter()
+    for page in range(pages):
+        page_keys = keys[(page * PAGE_SIZE) % len(keys):][:PAGE_SIZE]
+        if bulk:
+            found = cache.get_many(page_keys)
+        else:
+            found = {key: cache.get(key) for key in page_keys}
+        assert len(found) == len(page_keys)
+    elapsed = time.perf_counter() - start
+
+    print(f"{label:<22} | {traffic['round_trips'] / pages:>8.1f} | {traffic['bytes_sent'] / pages:>10,.0f} | "
+          f"{stored_bytes(keys) / len(keys):>10,.0f} | {elapsed / pages * 1000:>8.2f}")
+
+def main():
+    global SERVER
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    if not os.getenv('REDIS_URL'):
+        import fakeredis
+        SERVER = fakeredis.FakeServer()
+
+    random.seed(1)
+    records = {f"gallery:{i}": make_record(i) for i in range(PAGE_SIZE * 4)}
+
+    print(f"每頁 {PAGE_SIZE} 筆，共 {pages} 頁（{'REDIS_URL' if os.getenv('REDIS_URL') else 'fakeredis'}）")
+    print(f"{'實現':<22} | {'往返/頁':>8} | {'送出位元組/頁':>10} | {'值位元組/筆':>10} | {'毫秒/頁':>8}")
+    run("legacy json get", LegacyRedisCache(), pages, records, bulk=False)
+
+    serializers = [("json", JSONSerializer()), ("pickle", PickleSerializer())]
+    if MSGPACK_AVAILABLE:
+        serializers.append(("msgpack", MsgpackSerializer()))
+    for name, serializer in serializers:
+        for threshold in (None, 1024):
+            cache = RedisCache(connection_pool=make_pool(), serializer=serializer, compress_threshold=threshold)
+            label = f"mget {name}{' + zlib' if threshold else ''}"
+            run(label, cache, pages, records, bulk=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+批量任務記憶體基準測試
+以 tracemalloc 比較舊版 dataclass 任務與緊湊任務存儲的每任務記憶體佔用，
+並比較建立耗時與讀取任務資料（緊湊存儲每次讀取都需解碼）的耗時
+
+用法: python scripts/benchmark_task_memory.py [任務數]
+"""
+
+import os
+import sys
+import gc
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from services.batch_processor import BatchTask, TaskPriority, TaskStatus
+from services.task_storage import PayloadStore
+
+@dataclass
+class LegacyBatchTask:
+    """v2.6 的任務資料結構（用於對照）"""
+    id: str
+    task_type: str
+    data: Dict[str, Any]
+    priority: TaskPriority = TaskPriority.NORMAL
+    status: TaskStatus = TaskStatus.PENDING
+    created_at: datetime = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+    progress: float = 0.0
+    retry_count: int = 0
+    max_retries: int = 3
+    timeout_seconds: int = 300
+    dependencies: List[str] = None
+
+    def __post_init__(self):
+        if self.created_at is None:
+            self.created_at = datetime.now()
+        if self.dependencies is None:
+            self.dependencies = []
+
+def task_data(i: int) -> Dict[str, Any]:
+    """模擬匯入的任務數據（每行都是新解析的字串）"""
+    return {
+        "type": "image_generation",
+        "data": {"prompt": f"a watercolor painting of a lighthouse, variation {i}",
+                 "style": "watercolor", "size": "1024x1024"}
+    }
+
+def measure(label: str, task_count: int, build) -> float:
+    """建立任務並返回每任務佔用的位元組數"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    tasks = build(task_count)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per_task = current / task_count
+    print(f"{label}: {current / 1024 / 1024:.1f} MiB（峰值 {peak / 1024 / 1024:.1f} MiB），"
+          f"{per_task:.0f} B/任務，建立耗時 {elapsed:.2f}s")
+    del tasks
+    return per_task
+
+def measure_access(label: str, tasks: list):
+    """讀取每個任務的資料一次"""
+    start = time.perf_counter()
+    for task in tasks:
+        task.data
+    elapsed = time.perf_counter() - start
+    print(f"{label}: 讀取任務資料 {elapsed / len(tasks) * 1e6:.2f} µs/次")
+
+def build_legacy(task_count: int) -> list:
+    tasks = []
+    for i in range(task_count):
+        definition = task_data(i)
+        tasks.append(LegacyBatchTask(
+            id=f"job_bench_task_{i}",
+            task_type=definition["type"],
+            data=definition["data"]
+        ))
+    return tasks
+
+def build_compact(task_count: int) -> tuple:
+    store = PayloadStore()
+    tasks = []
+    for i in range(task_count):
+        definition = task_data(i)
+        tasks.append(BatchTask(
+            id=f"job_bench_task_{i}",
+            task_type=definition["type"],
+            data=definition["data"],
+            payload_store=store
+        ))
+    return tasks, store
+
+def main():
+    task_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    print(f"任務數: {task_count}")
+    legacy = measure("舊版 dataclass", task_count, build_legacy)
+    compact = measure("緊湊存儲      ", task_count, build_compact)
+    print(f"每任務節省: {legacy - compact:.0f} B（{(1 - compact / legacy) * 100:.1f}%）")
+
+    measure_access("舊版 dataclass", build_legacy(task_count))
+    measure_access("緊湊存儲      ", build_compact(task_count)[0])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+"""
+測試共用設定：將 backend 加入導入路徑並提供等待條件成立的輔助函數
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "等待逾時"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def wait_for():
+    """輪詢直至條件成立，逾時則測試失敗"""
+    return _wait_for
@@ -0,0 +1,121 @@
+"""
+服務商 AIMD 併發限制器測試
+"""
+
+import asyncio
+
+import pytest
+
+from services.adaptive_limiter import AdaptiveLimiter, is_overload_error
+from services.retry_policy import RetryableError
+
+
+def _saturated_success(limiter, latency=0.1):
+    """用滿名額後以成功結果釋放一個"""
+    while limiter.try_acquire():
+        pass
+    limiter.release(latency)
+
+
+def test_limit_grows_additively_only_while_saturated():
+    limiter = AdaptiveLimiter("p", initial_limit=2, max_limit=4, check_interval=1000)
+    # 未用滿上限時不增加
+    assert limiter.try_acquire()
+    limiter.release(0.1)
+    assert limiter.limit == 2
+
+    # 每輪約 limit 個成功請求增加一個名額
+    _saturated_success(limiter)
+    assert limiter.limit == 2
+    _saturated_success(limiter)
+    assert limiter.limit == 3
+
+    for _ in range(50):
+        _saturated_success(limiter)
+    assert limiter.limit == 4
+    assert limiter.get_stats()["increases"] == 2
+
+
+def test_overload_halves_limit_once_per_cooldown():
+    limiter = AdaptiveLimiter("p", initial_limit=8, min_limit=2, cooldown=60)
+    overload = RetryableError("rate limited", status_code=429)
+
+    limiter.try_acquire()
+    limiter.release(0.1, overload)
+    assert limiter.limit == 4
+
+    # 冷卻期內同一波過載只削減一次
+    limiter.try_acquire()
+    limiter.release(0.1, overload)
+    assert limiter.limit == 4
+    assert limiter.get_stats()["decreases"] == 1
+    assert limiter.get_stats()["history"][-1]["reason"] == "overload"
+
+
+def test_limit_never_drops_below_min_limit():
+    limiter = AdaptiveLimiter("p", initial_limit=3, min_limit=2, cooldown=0)
+    for _ in range(5):
+        limiter.try_acquire()
+        limiter.release(0.1, TimeoutError())
+    assert limiter.limit == 2
+
+
+def test_ordinary_errors_do_not_reduce_limit():
+    limiter = AdaptiveLimiter("p", initial_limit=4, cooldown=0)
+    limiter.try_acquire()
+    limiter.release(0.1, ValueError("bad prompt"))
+    assert limiter.limit == 4
+    assert limiter.get_stats()["errors"] == 1
+
+
+def test_p95_latency_rise_reduces_limit():
+    limiter = AdaptiveLimiter("p", initial_limit=8, check_interval=5, latency_tolerance=2.0, cooldown=0)
+    for latency in [0.1] * 5 + [1.0] * 5:
+        limiter.try_acquire()
+        limiter.release(latency)
+    assert limiter.limit == 4
+    assert limiter.get_stats()["history"][-1]["reason"] == "latency"
+
+
+@pytest.mark.parametrize("error, expected", [
+    (RetryableError("busy", status_code=503), True),
+    (RetryableError("slow down", retry_after=5), True),
+    (TimeoutError(), True),
+    (Exception("Error 429: Too Many Requests"), True),
+    (RetryableError("bad gateway", status_code=502), False),
+    (ValueError("invalid size"), False),
+    (None, False),
+])
+def test_is_overload_error(error, expected):
+    assert is_overload_error(error) is expected
+
+
+def test_waiters_get_released_slots_in_order_and_cancel_cleanly():
+    async def scenario():
+        limiter = AdaptiveLimiter("p", initial_limit=1, max_limit=1)
+        await limiter.acquire()
+        order = []
+
+        async def worker(name):
+            await limiter.acquire()
+            order.append(name)
+
+        first = asyncio.ensure_future(worker("first"))
+        cancelled = asyncio.ensure_future(worker("cancelled"))
+        second = asyncio.ensure_future(worker("second"))
+        await asyncio.sleep(0)
+        assert limiter.get_stats()["waiting"] == 3
+        assert not limiter.try_acquire()
+
+        cancelled.cancel()
+        limiter.release()
+        await first
+        limiter.release()
+        await second
+        await asyncio.gather(cancelled, return_exceptions=True)
+
+        assert order == ["first", "second"]
+        assert limiter.in_flight == 1
+        assert limiter.get_stats()["waiting"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,72 @@
+"""
+異步處理器併發控制測試
+"""
+
+import asyncio
+
+import pytest
+
+from services.adaptive_limiter import AdaptiveLimiterRegistry
+from services.async_processor import AsyncProcessor
+
+
+def test_task_waiting_for_provider_does_not_hold_global_slot():
+    async def scenario():
+        limiters = AdaptiveLimiterRegistry(max_limit=1)
+        processor = AsyncProcessor(max_concurrent_tasks=2, limiters=limiters)
+        release = asyncio.Event()
+
+        async def provider_call():
+            await release.wait()
+            return "provider"
+
+        async def local_call():
+            return "local"
+
+        await processor.start_processor()
+        try:
+            # 服務商上限為 1：第二個任務等待服務商名額，但不應佔住全局名額
+            first = await processor.create_and_submit_task("a1", provider_call, metadata={"provider": "slow"})
+            second = await processor.create_and_submit_task("a2", provider_call, metadata={"provider": "slow"})
+            local = await processor.create_and_submit_task("b", local_call)
+
+            await asyncio.wait_for(processor.task_done(local), 2)
+            assert processor.get_task_result(local) == "local"
+            assert not processor.task_done(second).done()
+
+            release.set()
+            await asyncio.wait_for(asyncio.gather(processor.task_done(first), processor.task_done(second)), 2)
+            await asyncio.sleep(0)
+            assert limiters.get("slow").in_flight == 0
+            # 名額全部歸還（調度循環空閒時預先持有一個名額等待隊列）
+            assert processor._slots._value == processor.max_concurrent_tasks - 1
+        finally:
+            await processor.stop_processor()
+
+    asyncio.run(scenario())
+
+
+def test_provider_limiter_starts_at_processor_concurrency():
+    processor = AsyncProcessor(max_concurrent_tasks=6, limiters=AdaptiveLimiterRegistry())
+    try:
+        assert processor._provider_limiter("openai").limit == 6
+    finally:
+        processor.thread_executor.shutdown(wait=False)
+
+
+def test_import_does_not_create_global_processor():
+    import services.async_processor as async_processor
+
+    assert async_processor._image_processor is None
+
+
+def test_image_processor_module_attribute_is_created_lazily(monkeypatch):
+    from services import async_processor
+
+    sentinel = object()
+    monkeypatch.setattr(async_processor, "_image_processor", sentinel)
+    assert async_processor.image_processor is sentinel
+    assert "image_processor" not in vars(async_processor)
+
+    with pytest.raises(AttributeError):
+        async_processor.not_a_real_attribute
@@ -0,0 +1,31 @@
+"""
+批量作業預算測試
+"""
+
+import threading
+
+from services.batch_budget import BudgetManager
+
+
+def test_estimate_does_not_wait_for_cost_history():
+    release = threading.Event()
+    calls = []
+
+    def slow_history(provider):
+        calls.append((provider, threading.current_thread().name))
+        release.wait(5)
+        return 0.5
+
+    manager = BudgetManager(cost_history=slow_history, default_cost=0.1)
+    data = {"api_provider": "openai"}
+
+    # 查詢進行中：估算立即返回 default_cost，且同一平台只提交一次查詢
+    assert manager.estimate("image_generation", data) == 0.1
+    assert manager.estimate("image_generation", data) == 0.1
+
+    release.set()
+    manager._history_executor.submit(lambda: None).result()  # 等待背景查詢完成
+
+    assert manager.estimate("image_generation", data) == 0.5
+    assert len(calls) == 1
+    assert calls[0][1].startswith("budget-history")
@@ -0,0 +1,88 @@
+"""
+批量任務依賴圖（DAG）測試
+"""
+
+import asyncio
+
+import pytest
+
+from services.batch_processor import BatchProcessor
+
+
+def _make_processor(order=None):
+    async def record(data):
+        await asyncio.sleep(0.01)
+        if order is not None:
+            order.append(data["name"])
+        return {"name": data["name"]}
+
+    processor = BatchProcessor(max_workers=4)
+    processor.register_task_processor("t", record)
+    return processor
+
+
+def _task(name, dependencies=(), task_type="t"):
+    return {"type": task_type, "data": {"name": name}, "dependencies": list(dependencies)}
+
+
+@pytest.mark.parametrize("tasks_data, message", [
+    ([_task("a", [2]), _task("b", [0]), _task("c", [1])], "循環依賴"),
+    ([_task("a", [0])], "依賴自身"),
+    ([_task("a"), _task("b", [5])], "依賴任務不存在"),
+    ([_task("a", ["job_missing_task_0"])], "依賴任務不存在"),
+])
+def test_invalid_dependency_graph_is_rejected_without_registering_tasks(tasks_data, message):
+    processor = _make_processor()
+    try:
+        with pytest.raises(ValueError, match=message):
+            processor.create_job("dag", tasks_data)
+        assert processor.jobs == {}
+        assert processor.tasks == {}
+    finally:
+        processor.stop_processor()
+
+
+def test_diamond_runs_each_task_after_its_dependencies(wait_for):
+    order = []
+    processor = _make_processor(order)
+    try:
+        job_id = processor.create_job("dag", [
+            _task("root"), _task("left", [0]), _task("right", [0]), _task("join", [1, 2])
+        ])
+        processor.start_job(job_id)
+        wait_for(lambda: processor.jobs[job_id].status.value == "completed")
+
+        assert order[0] == "root"
+        assert order[-1] == "join"
+        assert set(order[1:3]) == {"left", "right"}
+    finally:
+        processor.stop_processor()
+
+
+def test_dependency_on_task_of_earlier_job_is_accepted(wait_for):
+    processor = _make_processor()
+    try:
+        first = processor.create_job("first", [_task("a")])
+        second = processor.create_job("second", [_task("b", [f"{first}_task_0"])])
+        processor.start_job(first)
+        processor.start_job(second)
+        wait_for(lambda: processor.jobs[second].status.value == "completed")
+    finally:
+        processor.stop_processor()
+
+
+def test_failed_dependency_fails_all_downstream_tasks(wait_for):
+    processor = _make_processor()
+    try:
+        # 沒有處理器的任務類型會直接失敗
+        job_id = processor.create_job("dag", [
+            _task("root", task_type="missing"), _task("child", [0]), _task("grandchild", [1]), _task("free")
+        ])
+        processor.start_job(job_id)
+        wait_for(lambda: processor.jobs[job_id].finished_tasks == 4)
+
+        statuses = [task.status.value for task in processor.jobs[job_id].tasks]
+        assert statuses == ["failed", "failed", "failed", "completed"]
+        assert "依賴任務未完成" in processor.jobs[job_id].tasks[2].error
+    finally:
+        processor.stop_processor()
@@ -0,0 +1,39 @@
+"""
+批量事件跨進程轉發測試
+"""
+
+from types import SimpleNamespace
+
+from services.batch_events import BatchEventBroker
+from services.cache_service import LocalInvalidationBus
+
+
+def _job(job_id):
+    return SimpleNamespace(id=job_id, name=job_id, status=SimpleNamespace(value="completed"), progress=100.0,
+                           task_counts={"completed": 1}, completed_at=None)
+
+
+def test_events_from_another_worker_reach_local_subscribers():
+    # 兩個廣播器共用同一頻道，模擬兩個工作進程
+    worker_a = BatchEventBroker(relay=LocalInvalidationBus("test:batch-events"))
+    worker_b = BatchEventBroker(relay=LocalInvalidationBus("test:batch-events"))
+    try:
+        subscription = worker_b.subscribe("job_a")
+        worker_a.publish_job(_job("job_a"))
+
+        events = subscription.get(timeout=1.0)
+        assert [(event.event, event.data["job_id"]) for event in events] == [("job", "job_a")]
+        # 本進程發出的事件不會被重複廣播
+        assert worker_a.get_stats()["published_events"] == 1
+        assert worker_b.get_stats()["relayed_events"] == 1
+    finally:
+        worker_a.relay.close()
+        worker_b.relay.close()
+
+
+def test_last_event_id_from_another_worker_requests_resync():
+    broker = BatchEventBroker()
+    broker.publish_job(_job("job_a"))
+
+    subscription = broker.subscribe(last_event_id=500)
+    assert subscription.take_overflow()
@@ -0,0 +1,75 @@
+"""
+批量作業串流匯入測試
+"""
+
+import json
+
+from services.batch_processor import BatchProcessor, InvalidTaskError
+
+
+async def _echo(data):
+    return {"prompt": data.get("prompt")}
+
+
+def _make_processor():
+    processor = BatchProcessor(max_workers=2)
+    processor.register_task_processor("image_generation", _echo)
+    return processor
+
+
+def test_invalid_row_in_middle_of_jsonl_is_rejected_and_ingest_continues(tmp_path, wait_for):
+    rows = [
+        {"prompt": "a"},
+        {"prompt": "b", "priority": 9},
+        {"prompt": "c", "timeout": "abc"},
+        {"prompt": "d", "deadline": "not-a-date"},
+        {"prompt": "e", "priority": 3},
+    ]
+    source = tmp_path / "prompts.jsonl"
+    source.write_text("\n".join(json.dumps(row) for row in rows), encoding="utf-8")
+
+    processor = _make_processor()
+    try:
+        job_id = processor.ingest_job("ingest", str(source), "jsonl", chunk_size=2)
+        wait_for(lambda: processor.jobs[job_id].status.value == "completed")
+
+        status = processor.get_job_status(job_id)
+        assert status["total_tasks"] == 2
+        assert status["task_statistics"]["completed"] == 2
+        assert status["ingest"]["parsed"] == 5
+        assert status["ingest"]["rejected"] == 3
+        assert status["ingest"]["error"] is None
+        assert [row["row"] for row in status["ingest"]["rejected_rows"]] == [2, 3, 4]
+        assert "優先級" in status["ingest"]["rejected_rows"][0]["reason"]
+    finally:
+        processor.stop_processor()
+
+
+def test_invalid_csv_priority_is_rejected_with_row_number(tmp_path, wait_for):
+    source = tmp_path / "prompts.csv"
+    source.write_text("prompt,priority\na,2\nb,9\nc,1\n", encoding="utf-8")
+
+    processor = _make_processor()
+    try:
+        job_id = processor.ingest_job("ingest", str(source), "csv", auto_start=False)
+        wait_for(lambda: processor.jobs[job_id].ingest_complete)
+
+        ingest = processor.get_job_status(job_id)["ingest"]
+        assert processor.get_job_status(job_id)["total_tasks"] == 2
+        assert ingest["rejected_rows"] == [{"row": 3, "reason": "無效的優先級: 9"}]
+    finally:
+        processor.stop_processor()
+
+
+def test_create_job_rejects_invalid_task_definition():
+    processor = _make_processor()
+    try:
+        try:
+            processor.create_job("job", [{"type": "image_generation", "data": {}, "priority": 9}])
+        except InvalidTaskError as e:
+            assert "任務 0" in str(e)
+        else:
+            raise AssertionError("應拒絕無效的優先級")
+        assert processor.jobs == {}
+    finally:
+        processor.stop_processor()
@@ -0,0 +1,155 @@
+"""
+批量作業日誌重放與恢復測試
+"""
+
+import asyncio
+import json
+
+from services.batch_journal import (
+    BatchJournal, EVENT_JOB_CREATED, EVENT_JOB_INGEST, EVENT_JOB_STATUS, EVENT_TASK_CREATED, EVENT_TASK_STATUS
+)
+from services.batch_processor import BatchProcessor
+
+
+async def _echo(data):
+    await asyncio.sleep(0.01)
+    return {"i": data["i"]}
+
+
+def _make_processor(path, owner_id, **kwargs):
+    processor = BatchProcessor(max_workers=2, journal=BatchJournal(str(path)), owner_id=owner_id, **kwargs)
+    processor.register_task_processor("t", _echo)
+    return processor
+
+
+def _tasks(count):
+    return [{"type": "t", "data": {"i": i}, "dependencies": [i - 1] if i else []} for i in range(count)]
+
+
+def test_replay_keeps_latest_state_and_survives_compaction(tmp_path):
+    journal = BatchJournal(str(tmp_path / "journal.db"))
+    try:
+        journal.append_many([
+            (EVENT_JOB_CREATED, "job_a", None, "pending", {"name": "a"}),
+            (EVENT_TASK_CREATED, "job_a", "job_a_task_0", "pending", {"type": "t", "data": {"i": 0}}),
+            (EVENT_TASK_CREATED, "job_a", "job_a_task_1", "pending", {"type": "t", "data": {"i": 1}}),
+            (EVENT_JOB_CREATED, "job_b", None, "pending", {"name": "b"}),
+        ])
+        journal.append(EVENT_JOB_STATUS, "job_a", None, "processing", {"started_at": "2026-01-01T00:00:00"})
+        journal.append(EVENT_TASK_STATUS, "job_a", "job_a_task_0", "processing", {"retry_count": 0})
+        journal.append(EVENT_TASK_STATUS, "job_a", "job_a_task_0", "completed", {"result": {"i": 0}})
+        journal.append(EVENT_JOB_INGEST, "job_a", None, "processing", {"next_index": 1, "complete": False})
+        journal.append(EVENT_JOB_INGEST, "job_a", None, "processing", {"next_index": 2, "complete": True})
+        # 未知作業的狀態記錄被忽略
+        journal.append(EVENT_TASK_STATUS, "job_gone", "job_gone_task_0", "completed", {})
+        journal.remove_job("job_b")
+
+        snapshots = journal.load()
+        assert [snapshot["job_id"] for snapshot in snapshots] == ["job_a"]
+        job = snapshots[0]
+        assert job["status"] == "processing"
+        assert job["started_at"] == "2026-01-01T00:00:00"
+        assert job["ingest"] == {"next_index": 2, "complete": True}
+        assert job["tasks"]["job_a_task_0"]["status"] == "completed"
+        assert job["tasks"]["job_a_task_0"]["state"] == {"result": {"i": 0}}
+        assert job["tasks"]["job_a_task_1"]["status"] == "pending"
+
+        # 壓縮刪除被覆蓋的狀態記錄，重放結果不變
+        assert journal.compact() == 2
+        assert journal.load() == snapshots
+    finally:
+        journal.close()
+
+
+def test_restarted_worker_resumes_job_and_keeps_completed_results(tmp_path, wait_for):
+    path = tmp_path / "journal.db"
+    first = _make_processor(path, "worker-1")
+    job_id = first.create_job("chain", _tasks(6))
+    first.start_job(job_id)
+    wait_for(lambda: first.jobs[job_id].task_counts["completed"] >= 2)
+    first.stop_processor()
+    first.journal.close()
+    done_before = {task.id: task.result for task in first.jobs[job_id].tasks if task.status.value == "completed"}
+
+    second = _make_processor(path, "worker-1")
+    try:
+        assert second.recover_from_journal()["recovered_jobs"] == 1
+        for task_id, result in done_before.items():
+            assert second.tasks[task_id].result == result
+        wait_for(lambda: second.jobs[job_id].status.value == "completed")
+        assert [task.result["i"] for task in second.jobs[job_id].tasks] == list(range(6))
+    finally:
+        second.stop_processor()
+        second.journal.close()
+
+
+def test_jobs_leased_by_a_live_worker_are_not_recovered_twice(tmp_path, wait_for):
+    path = tmp_path / "journal.db"
+    owner = _make_processor(path, "worker-1", lease_ttl=0.3)
+    job_id = owner.create_job("leased", _tasks(3))
+
+    other = _make_processor(path, "worker-2", lease_ttl=0.3)
+    try:
+        # 持有者仍在續約：其他進程不載入該作業
+        assert other.recover_from_journal()["recovered_jobs"] == 0
+        assert job_id not in other.jobs
+
+        # 持有者中斷（停止續約）：租約過期後由其他進程的續約線程接管並執行
+        owner.stop_processor()
+        other.create_job("own", _tasks(1))  # 取得租約並啟動續約線程
+        wait_for(lambda: job_id in other.jobs, timeout=5)
+        other.start_job(job_id)
+        wait_for(lambda: other.jobs[job_id].status.value == "completed")
+    finally:
+        owner.journal.close()
+        other.stop_processor()
+        other.journal.close()
+
+
+def _interrupted_ingest(wait_for, path, source):
+    """匯入兩筆記錄後因背壓停住（作業未啟動），模擬進程在匯入途中中斷"""
+    source.write_text("\n".join(json.dumps({"type": "t", "data": {"i": i}}) for i in range(6)),
+                      encoding="utf-8")
+    first = _make_processor(path, "worker-1")
+    job_id = first.ingest_job("ingest", str(source), "jsonl", chunk_size=2, window=2, auto_start=False)
+    wait_for(lambda: len(first.jobs[job_id].tasks) == 2)
+    first.journal.flush()
+    first.stop_processor()
+    first.journal.close()
+    assert not first.jobs[job_id].ingest_complete
+    return job_id
+
+
+def test_interrupted_ingest_resumes_from_journaled_position(tmp_path, wait_for):
+    path = tmp_path / "journal.db"
+    job_id = _interrupted_ingest(wait_for, path, tmp_path / "prompts.jsonl")
+
+    second = _make_processor(path, "worker-1")
+    try:
+        second.recover_from_journal()
+        assert len(second.jobs[job_id].tasks) == 2
+        second.start_job(job_id)
+        wait_for(lambda: second.jobs[job_id].status.value == "completed")
+        assert sorted(task.result["i"] for task in second.jobs[job_id].tasks) == list(range(6))
+    finally:
+        second.stop_processor()
+        second.journal.close()
+
+
+def test_interrupted_ingest_without_source_fails_instead_of_completing(tmp_path, wait_for):
+    path = tmp_path / "journal.db"
+    source = tmp_path / "prompts.jsonl"
+    job_id = _interrupted_ingest(wait_for, path, source)
+    source.unlink()
+
+    second = _make_processor(path, "worker-1")
+    try:
+        second.recover_from_journal()
+        second.start_job(job_id)
+        wait_for(lambda: second.jobs[job_id].status.value == "failed")
+        status = second.get_job_status(job_id)
+        assert status["total_tasks"] == 2
+        assert "來源不可用" in status["ingest"]["error"]
+    finally:
+        second.stop_processor()
+        second.journal.close()
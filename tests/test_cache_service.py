@@ -0,0 +1,100 @@
+"""
+緩存服務測試
+"""
+
+import time
+import threading
+
+import pytest
+
+from services import cache_service as cs
+
+
+@pytest.fixture
+def redis_cache(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    import redis
+
+    connection_class = getattr(fakeredis, "FakeRedisConnection", None) or fakeredis.FakeConnection
+    pool = redis.ConnectionPool(connection_class=connection_class, server=fakeredis.FakeServer())
+    cache = cs.RedisCache(connection_pool=pool)
+    assert cache.is_available
+
+    # fakeredis 未安裝 Lua 支援時以等效的比較後刪除代替釋放腳本
+    def release_lock(name, token):
+        if cache.redis_client.get(name) == token.encode():
+            return bool(cache.redis_client.delete(name))
+        return False
+    monkeypatch.setattr(cache, "release_lock", release_lock)
+
+    service = cs.CacheService(use_redis=False, invalidation_bus=cs.LocalInvalidationBus())
+    service.redis_cache = cache
+    monkeypatch.setattr(cs, "cache_service", service)
+    return cache
+
+
+def test_waiter_takes_over_when_holder_releases_without_result(redis_cache):
+    calls = []
+
+    @cs.cached(ttl=60, key_prefix="handoff", distributed_lock=True, lock_timeout=30)
+    def compute(x):
+        calls.append(x)
+        return {"x": x}
+
+    # 模擬另一進程持有鎖後失敗：釋放鎖但沒有寫入緩存
+    lock_name = f"lock:{cs.cache_service._generate_key('handoff:compute', 1)}"
+    token = redis_cache.acquire_lock(lock_name, 30)
+    threading.Timer(0.2, redis_cache.release_lock, (lock_name, token)).start()
+
+    started = time.time()
+    assert compute(1) == {"x": 1}
+    assert time.time() - started < 2
+    assert calls == [1]
+    assert cs.get_cached_stats()["lock_handoffs"] >= 1
+
+
+def test_waiter_gives_up_well_before_lock_ttl(redis_cache):
+    @cs.cached(ttl=60, key_prefix="stuck", distributed_lock=True, lock_timeout=30, lock_wait=0.3)
+    def compute(x):
+        return x
+
+    # 持有者中斷且鎖未過期：等待上限遠小於鎖的持有上限
+    lock_name = f"lock:{cs.cache_service._generate_key('stuck:compute', 2)}"
+    assert redis_cache.acquire_lock(lock_name, 30) is not None
+
+    started = time.time()
+    assert compute(2) == 2
+    assert time.time() - started < 2
+
+
+def test_codec_rejects_pickle_unless_allowed():
+    from services.cache_serializers import (CacheCodec, JSONSerializer, PickleSerializer,
+                                            UndecodableValueError)
+
+    pickled = CacheCodec(PickleSerializer()).encode({"x": 1})
+    with pytest.raises(UndecodableValueError):
+        CacheCodec(JSONSerializer()).decode(pickled)
+    assert CacheCodec(JSONSerializer(), allowed_readers={"pickle"}).decode(pickled) == {"x": 1}
+
+
+def test_codec_reads_legacy_json_and_rejects_unknown_codes():
+    from services.cache_serializers import CacheCodec, JSONSerializer, UndecodableValueError
+
+    codec = CacheCodec(JSONSerializer())
+    assert codec.decode(b'{"old": true}') == {"old": True}
+    assert codec.decode('[1, 2]') == [1, 2]
+    for data in (b'\x7fgarbage', b'\x05{}', b''):
+        with pytest.raises(UndecodableValueError):
+            codec.decode(data)
+
+
+def test_redis_cache_treats_disallowed_values_as_miss(redis_cache):
+    from services.cache_serializers import CacheCodec, PickleSerializer
+
+    redis_cache.redis_client.set("pickled", CacheCodec(PickleSerializer()).encode({"x": 1}))
+    redis_cache.redis_client.set("garbage", b"\x7f\x00\x01")
+    redis_cache.set("good", {"x": 2}, 60)
+
+    assert redis_cache.get("pickled") is None
+    assert redis_cache.get_many(["pickled", "garbage", "good"]) == {"good": {"x": 2}}
+    assert redis_cache.get_stats()["undecodable"] == 3
@@ -0,0 +1,122 @@
+"""
+截止時間調度測試（least-slack 排序與提早識別逾期）
+"""
+
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.batch_processor import BatchProcessor, BatchTask, FairShareScheduler, TaskPriority
+from services.deadline_scheduling import NO_DEADLINE, InvalidDeadlineError, TaskDurationEstimator, parse_deadline
+
+
+def test_parse_deadline_formats():
+    assert parse_deadline(None) is None
+    assert parse_deadline("") is None
+    assert parse_deadline("2026-05-01T12:30:00") == datetime(2026, 5, 1, 12, 30)
+    assert parse_deadline(1_700_000_000) == datetime.fromtimestamp(1_700_000_000)
+    # 帶時區的時間轉換為本地時間
+    utc = datetime(2026, 5, 1, 12, 0, tzinfo=timezone.utc)
+    assert parse_deadline("2026-05-01T12:00:00Z") == utc.astimezone().replace(tzinfo=None)
+    with pytest.raises(InvalidDeadlineError):
+        parse_deadline("tomorrow")
+
+
+def test_estimator_falls_back_and_tracks_minimum():
+    estimator = TaskDurationEstimator(smoothing=0.5, default_estimate=30.0)
+    assert estimator.estimate("a") == 30.0
+    assert estimator.lower_bound("a") == 0.0
+
+    estimator.observe("a", 10.0)
+    estimator.observe("a", 20.0)
+    assert estimator.estimate("a") == 15.0
+    assert estimator.lower_bound("a") == 10.0
+    # 沒有觀測的類型使用全體平均
+    assert estimator.estimate("b") == 15.0
+
+    assert estimator.slack_key("a", None) == NO_DEADLINE
+    assert estimator.slack_key("a", 1000.0) == 985.0
+
+
+def test_scheduler_runs_least_slack_first_and_deadlines_before_others():
+    scheduler = FairShareScheduler(max_concurrent_jobs=5)
+    scheduler.register_job("a", concurrent_limit=10)
+    scheduler.register_job("b", concurrent_limit=10)
+
+    def push(job_id, name, urgency, priority=TaskPriority.NORMAL):
+        scheduler.push(job_id, BatchTask(id=name, task_type="t", data={}, priority=priority), urgency)
+
+    push("a", "a_urgent_none", NO_DEADLINE, TaskPriority.URGENT)
+    push("a", "a_late", 300.0)
+    push("b", "b_none", NO_DEADLINE)
+    push("b", "b_soon", 100.0)
+    push("a", "a_mid", 200.0)
+
+    order = [scheduler.pop()[1] for _ in range(5)]
+    assert order[:3] == ["b_soon", "a_mid", "a_late"]
+    assert set(order[3:]) == {"a_urgent_none", "b_none"}
+
+
+def _deadline_processor(calls):
+    async def record(data):
+        calls.append(data["name"])
+        return {}
+
+    processor = BatchProcessor(max_workers=2)
+    processor.register_task_processor("t", record)
+    # 觀測到該類型最短耗時 60 秒
+    processor.duration_estimator.observe("t", 60.0)
+    return processor
+
+
+def test_task_that_cannot_meet_deadline_is_failed_before_running(wait_for):
+    calls = []
+    processor = _deadline_processor(calls)
+    try:
+        deadline = (datetime.now() + timedelta(seconds=5)).isoformat()
+        job_id = processor.create_job("deadline", [
+            {"type": "t", "data": {"name": "doomed"}, "deadline": deadline},
+            {"type": "t", "data": {"name": "child"}, "dependencies": [0]},
+            {"type": "t", "data": {"name": "free"}},
+        ])
+        processor.start_job(job_id)
+        wait_for(lambda: processor.jobs[job_id].finished_tasks == 3)
+
+        doomed, child, free = processor.jobs[job_id].tasks
+        assert calls == ["free"]
+        assert doomed.status.value == "failed"
+        assert "截止時間" in doomed.error
+        assert child.status.value == "failed"
+        assert free.status.value == "completed"
+        assert processor.stats["deadline_skipped"] == 1
+    finally:
+        processor.stop_processor()
+
+
+def test_at_risk_task_is_flagged_and_still_runs_when_skipping_is_disabled(wait_for):
+    release = threading.Event()
+
+    async def hold(data):
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        return {}
+
+    processor = BatchProcessor(max_workers=2, skip_missed_deadlines=False)
+    processor.register_task_processor("t", hold)
+    processor.duration_estimator.observe("t", 60.0)
+    try:
+        job_id = processor.create_job("deadline", [{"type": "t", "data": {}}], deadline=time.time() + 5)
+        processor.start_job(job_id)
+        task_id = processor.jobs[job_id].tasks[0].id
+        wait_for(lambda: processor.get_task_status(task_id)["status"] == "processing")
+        assert processor.get_task_status(task_id)["deadline_at_risk"] is True
+
+        release.set()
+        wait_for(lambda: processor.jobs[job_id].status.value == "completed")
+        assert task_id not in processor.deadline_at_risk
+    finally:
+        release.set()
+        processor.stop_processor()
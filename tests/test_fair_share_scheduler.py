@@ -0,0 +1,76 @@
+"""
+公平共享調度器（DRR）測試
+"""
+
+from services.batch_processor import BatchTask, FairShareScheduler, TaskPriority
+
+
+def _push(scheduler, job_id, count, priority=TaskPriority.NORMAL):
+    for i in range(count):
+        scheduler.push(job_id, BatchTask(id=f"{job_id}_task_{i}", task_type="t", data={}, priority=priority))
+
+
+def _pop_jobs(scheduler, count):
+    """取出 count 個任務（每個任務立即結束），返回所屬作業序列"""
+    jobs = []
+    for _ in range(count):
+        job_id, _task_id = scheduler.pop()
+        scheduler.task_started(job_id)
+        scheduler.task_finished(job_id)
+        jobs.append(job_id)
+    return jobs
+
+
+def test_equal_priority_jobs_share_slots_in_weighted_rounds():
+    scheduler = FairShareScheduler(max_concurrent_jobs=5)
+    for job_id in ("a", "b"):
+        scheduler.register_job(job_id, concurrent_limit=10)
+        _push(scheduler, job_id, 6)
+
+    # NORMAL 權重為 2：每輪每個作業取出兩個任務
+    assert _pop_jobs(scheduler, 8) == ["a", "a", "b", "b", "a", "a", "b", "b"]
+
+
+def test_share_follows_head_task_priority_weight():
+    scheduler = FairShareScheduler(max_concurrent_jobs=5)
+    scheduler.register_job("high", concurrent_limit=10)
+    scheduler.register_job("low", concurrent_limit=10)
+    _push(scheduler, "high", 20, TaskPriority.HIGH)
+    _push(scheduler, "low", 20, TaskPriority.LOW)
+
+    jobs = _pop_jobs(scheduler, 16)
+    assert jobs.count("high") == 12
+    assert jobs.count("low") == 4
+
+
+def test_job_at_concurrent_limit_yields_to_other_jobs():
+    scheduler = FairShareScheduler(max_concurrent_jobs=5)
+    scheduler.register_job("limited", concurrent_limit=1)
+    scheduler.register_job("other", concurrent_limit=10)
+    _push(scheduler, "limited", 3)
+
+    job_id, _ = scheduler.pop()
+    scheduler.task_started(job_id)
+    assert scheduler.pop() is None
+
+    _push(scheduler, "other", 1)
+    assert scheduler.pop()[0] == "other"
+
+    scheduler.task_finished("limited")
+    assert scheduler.pop()[0] == "limited"
+
+
+def test_jobs_beyond_max_concurrent_jobs_wait_for_admission():
+    scheduler = FairShareScheduler(max_concurrent_jobs=1)
+    scheduler.register_job("first", concurrent_limit=10)
+    scheduler.register_job("second", concurrent_limit=10)
+    _push(scheduler, "first", 1)
+    _push(scheduler, "second", 1)
+
+    assert scheduler.pop()[0] == "first"
+    scheduler.task_started("first")
+    assert scheduler.pop() is None
+
+    # 第一個作業沒有剩餘工作後讓出名額
+    scheduler.task_finished("first")
+    assert scheduler.pop()[0] == "second"
@@ -0,0 +1,111 @@
+"""
+重試退避與 Retry-After 測試
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import pytest
+
+from services import retry_policy
+from services.batch_processor import BatchProcessor
+from services.retry_policy import RetryableError, RetryDelayStats, RetryPolicy, get_retry_after, parse_retry_after
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(retry_policy.random, "random", lambda: 0.0)
+    monkeypatch.setattr(retry_policy.random, "uniform", lambda low, high: low)
+
+
+def test_backoff_grows_exponentially_up_to_max_delay(no_jitter):
+    policy = RetryPolicy(base_delay=1.0, max_delay=10.0, multiplier=2.0)
+    assert [policy.compute_delay(n) for n in range(1, 6)] == [1.0, 2.0, 4.0, 8.0, 10.0]
+
+
+def test_jitter_keeps_delay_within_equal_jitter_range(monkeypatch):
+    policy = RetryPolicy(base_delay=4.0, max_delay=60.0, jitter=0.5)
+    monkeypatch.setattr(retry_policy.random, "random", lambda: 0.999)
+    assert policy.compute_delay(1) == pytest.approx(2.0, abs=0.01)
+    monkeypatch.setattr(retry_policy.random, "random", lambda: 0.0)
+    assert policy.compute_delay(1) == 4.0
+
+
+def test_retry_after_is_a_floor_and_may_exceed_max_delay(no_jitter):
+    policy = RetryPolicy(base_delay=1.0, max_delay=10.0)
+    assert policy.compute_delay(1, RetryableError("429", retry_after=30)) == 30.0
+    # 退避延遲較長時不會被縮短
+    assert policy.compute_delay(4, RetryableError("429", retry_after="0.5")) == 8.0
+
+
+@pytest.mark.parametrize("value, expected", [
+    (12, 12.0),
+    ("7", 7.0),
+    (" 2.5 ", 2.5),
+    (-3, 0.0),
+    ("soon", None),
+    (None, None),
+])
+def test_parse_retry_after_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=120)
+    assert parse_retry_after(format_datetime(retry_at, usegmt=True)) == pytest.approx(120, abs=2)
+    past = datetime.now(timezone.utc) - timedelta(seconds=120)
+    assert parse_retry_after(format_datetime(past, usegmt=True)) == 0.0
+
+
+def test_retry_after_is_found_on_response_headers_and_cause_chain():
+    http_error = Exception("503")
+    http_error.response = SimpleNamespace(headers={"Retry-After": "9"})
+    assert get_retry_after(http_error) == 9.0
+
+    try:
+        try:
+            raise http_error
+        except Exception as e:
+            raise RuntimeError("服務商調用失敗") from e
+    except RuntimeError as wrapped:
+        assert get_retry_after(wrapped) == 9.0
+
+    assert get_retry_after(ValueError("no hint")) is None
+
+
+def test_delay_stats_histogram():
+    stats = RetryDelayStats()
+    for delay, honored in [(0.5, False), (3, False), (30, True), (90, True)]:
+        stats.record(delay, honored_retry_after=honored)
+
+    result = stats.to_dict()
+    assert result["scheduled_retries"] == 4
+    assert result["retry_after_honored"] == 2
+    assert result["max_delay_seconds"] == 90
+    assert result["delay_histogram"] == {"<1s": 1, "1-5s": 1, "5-15s": 0, "15-60s": 1, ">=60s": 1}
+
+
+def test_batch_task_waits_for_retry_after_before_retrying(wait_for):
+    calls = []
+
+    async def flaky(data):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise RetryableError("429", retry_after=0.3, status_code=429)
+        return {"ok": True}
+
+    processor = BatchProcessor(max_workers=1, retry_policy=RetryPolicy(base_delay=0.01, jitter=0.0))
+    processor.register_task_processor("t", flaky)
+    try:
+        job_id = processor.create_job("retry", [{"type": "t", "data": {}}])
+        processor.start_job(job_id)
+        wait_for(lambda: processor.jobs[job_id].status.value == "completed")
+
+        task = processor.jobs[job_id].tasks[0]
+        assert task.retry_count == 1
+        assert calls[1] - calls[0] >= 0.3
+        assert processor.retry_stats.to_dict()["retry_after_honored"] == 1
+    finally:
+        processor.stop_processor()
@@ -0,0 +1,28 @@
+"""
+同鍵請求合併測試
+"""
+
+
+from services.singleflight import generation_request_key
+
+
+def test_key_covers_every_field_that_affects_output():
+    base = generation_request_key("prompt_optimization", {"prompt": "cat", "style": "anime"})
+
+    assert base != generation_request_key("prompt_optimization", {"prompt": "cat", "style": "photo"})
+    assert base != generation_request_key("prompt_optimization",
+                                          {"prompt": "cat", "style": "anime", "target_language": "ja"})
+    assert base != generation_request_key("image_generation", {"prompt": "cat", "style": "anime"})
+
+
+def test_key_ignores_field_order_and_non_output_fields():
+    key = generation_request_key("t", {"prompt": "cat", "size": "1024x1024"})
+
+    assert key == generation_request_key("t", {"size": "1024x1024", "prompt": "cat",
+                                               "coalesce": True, "estimated_cost": 0.04})
+
+
+def test_requests_that_must_not_coalesce_have_no_key():
+    assert generation_request_key("t", {"prompt": ""}) is None
+    assert generation_request_key("t", {"prompt": "cat", "coalesce": False}) is None
+    assert generation_request_key("t", {"prompt": "cat", "seed": 7}) is None
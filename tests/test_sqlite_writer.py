@@ -0,0 +1,43 @@
+"""
+SQLite 分組提交寫入器測試（BatchJournal 與 TaskArchive）
+"""
+
+
+from services.batch_journal import BatchJournal, EVENT_JOB_CREATED, EVENT_TASK_CREATED, EVENT_TASK_STATUS
+from services.task_archive import TaskArchive
+
+
+def test_journal_keeps_order_between_rows_and_removal(tmp_path):
+    journal = BatchJournal(str(tmp_path / "journal.db"))
+    try:
+        journal.append(EVENT_JOB_CREATED, "job_a", payload={"name": "a"})
+        journal.append(EVENT_JOB_CREATED, "job_b", payload={"name": "b"})
+        journal.append_many([
+            (EVENT_TASK_CREATED, "job_b", "job_b_task_0", None, {"type": "x"}),
+            (EVENT_TASK_STATUS, "job_b", "job_b_task_0", "completed", {"cost": 0.1}),
+        ])
+        journal.remove_job("job_a")
+        journal.append(EVENT_JOB_CREATED, "job_a", payload={"name": "a2"})
+
+        snapshots = {snapshot["job_id"]: snapshot for snapshot in journal.load()}
+        assert snapshots["job_a"]["job"] == {"name": "a2"}
+        assert snapshots["job_b"]["tasks"]["job_b_task_0"]["status"] == "completed"
+        assert journal.get_stats()["records_written"] == 5
+    finally:
+        journal.close()
+
+
+def test_archive_round_trip(tmp_path):
+    archive = TaskArchive(str(tmp_path / "archive.db"))
+    try:
+        for index in range(3):
+            archive.add({"id": f"t{index}", "name": "task", "status": "completed",
+                         "created_at": f"2026-01-0{index + 1}T00:00:00"})
+        assert archive.flush()
+
+        assert archive.count() == 3
+        assert archive.get("t1")["archived"] is True
+        assert [record["id"] for record in archive.query(limit=2)] == ["t2", "t1"]
+        assert archive.get_stats()["records_purged"] == 0
+    finally:
+        archive.close()
@@ -0,0 +1,93 @@
+"""
+任務成本記錄測試
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from services.batch_processor import BatchProcessor, ExecutionLane
+from services.task_cost import CHAT_TOKEN_PRICES, record_task_cost
+
+
+def _run_job(wait_for, processor, task_type, tasks_data, budget=1.0):
+    job_id = processor.create_job("cost", [{"type": task_type, "data": data} for data in tasks_data],
+                                  budget=budget)
+    processor.start_job(job_id)
+    wait_for(lambda: processor.jobs[job_id].status.value in ("completed", "failed"))
+    return job_id
+
+
+def _billed_thread_processor(data):
+    record_task_cost(0.02)
+    return {"prompt": data["prompt"]}
+
+
+def _billed_process_processor(data):
+    return {"prompt": data["prompt"], "cost": 0.05}
+
+
+class _FakeCompletions:
+    def __init__(self, prompt_tokens, completion_tokens):
+        self.usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def create(self, **kwargs):
+        message = SimpleNamespace(content=json.dumps({"optimized_prompt": "optimized"}))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=self.usage)
+
+
+def test_prompt_optimization_records_token_cost(wait_for):
+    pytest.importorskip("openai")
+    pytest.importorskip("cv2")
+    from services.ai_assistant import AIAssistantService
+
+    service = AIAssistantService()
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=_FakeCompletions(1000, 500)))
+    service.rate_limit_delay = 0
+
+    async def prompt_optimization_processor(task_data):
+        return await service.enhance_prompt(task_data.get("prompt", ""))
+
+    processor = BatchProcessor(max_workers=2)
+    processor.register_task_processor("prompt_optimization", prompt_optimization_processor)
+    try:
+        job_id = _run_job(wait_for, processor, "prompt_optimization", [{"prompt": "a cat"}, {"prompt": "a dog"}])
+
+        input_price, output_price = CHAT_TOKEN_PRICES["gpt-4o-mini"]
+        expected = (1000 * input_price + 500 * output_price) / 1_000_000
+        job = processor.jobs[job_id]
+        assert job.status.value == "completed"
+        for task in job.tasks:
+            assert task.cost == pytest.approx(expected)
+        assert processor.budget.get_job_budget(job_id)["spent"] == pytest.approx(2 * expected, abs=1e-4)
+        assert processor.budget.get_stats()["actual_total"] == pytest.approx(2 * expected)
+    finally:
+        processor.stop_processor()
+
+
+def test_thread_lane_processor_records_cost_on_task(wait_for):
+    processor = BatchProcessor(max_workers=2)
+    processor.register_task_processor("image_generation", _billed_thread_processor, lane=ExecutionLane.THREAD)
+    try:
+        job_id = _run_job(wait_for, processor, "image_generation", [{"prompt": "a"}, {"prompt": "b"}])
+
+        for task in processor.jobs[job_id].tasks:
+            assert task.cost == pytest.approx(0.02)
+        assert processor.budget.get_job_budget(job_id)["spent"] == pytest.approx(0.04)
+    finally:
+        processor.stop_processor()
+
+
+def test_process_lane_cost_is_taken_from_result(wait_for):
+    processor = BatchProcessor(max_workers=2)
+    processor.register_task_processor("image_post_processing", _billed_process_processor,
+                                      lane=ExecutionLane.PROCESS)
+    try:
+        job_id = _run_job(wait_for, processor, "image_post_processing", [{"prompt": "a"}])
+
+        task = processor.jobs[job_id].tasks[0]
+        assert processor.get_task_status(task.id)["cost"] == pytest.approx(0.05)
+        assert processor.budget.get_job_budget(job_id)["spent"] == pytest.approx(0.05)
+    finally:
+        processor.stop_processor()